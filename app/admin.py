@@ -1,37 +1,268 @@
+from django import forms
 from django.contrib import admin
+from django.contrib.admin.utils import get_fields_from_path
+from django.contrib.admin.views.main import ChangeList, ORDER_VAR, PAGE_VAR
+from django.contrib.admin.widgets import AutocompleteSelect
+from django.core.exceptions import FieldDoesNotExist, PermissionDenied
+from django.core.paginator import InvalidPage
+from django.db.models.expressions import RawSQL
 from django.http import HttpRequest
+from django.template.response import TemplateResponse
+from django.urls import path
+from django.utils.translation import gettext_lazy as _
+from .pagination import EstimatedCountPaginator, KeysetPaginator, KEYSET_ORDERING
+from . import exports, notifications, rollups, search, totals
 from .models import (
     Categoria, Marca, Produto, Cliente, Venda, ItemVenda, Pagamento,
     EnderecoEntrega, Avaliacao, Comentario, Cupom, Carrinho, 
-    ItemCarrinho, Desejo, ItemDesejo, Notificacao, Log
+    ItemCarrinho, Desejo, ItemDesejo, Notificacao, Campanha, Log
 )
 
+
+# Caminhos de select_related e de only() necessários para exibir o __str__
+# de um modelo, a partir da lista str_fields declarada nele. Ex: para
+# ItemCarrinho com prefix='item__', ['quantidade', 'carrinho__cliente__nome']
+# gera select_related ['item__carrinho', 'item__carrinho__cliente'].
+def str_dependencies(model, prefix=''):
+    select_related, only = [], []
+    for path in getattr(model, 'str_fields', None) or []:
+        parts = path.split('__')
+        current = model
+        for index, part in enumerate(parts):
+            field = current._meta.get_field(part)
+            name = prefix + '__'.join(parts[:index + 1])
+            only.append(name)
+            if field.is_relation:
+                select_related.append(name)
+                current = field.related_model
+    return list(dict.fromkeys(select_related)), list(dict.fromkeys(only))
+
+
+# Filtro de chave estrangeira com campo de busca (autocomplete) no lugar da
+# lista com todos os objetos relacionados. As opções são buscadas sob demanda,
+# paginadas, pela view de autocomplete do admin, que usa o search_fields do
+# admin do modelo relacionado. Só o objeto selecionado é carregado na página.
+class AutocompleteFilter(admin.FieldListFilter):
+    template = 'admin/autocomplete_filter.html'
+
+    def __init__(self, field, request, params, model, model_admin, field_path):
+        self.lookup_kwarg = f'{field_path}__{field.target_field.name}__exact'
+        lookup_val = params.get(self.lookup_kwarg)
+        self.lookup_val = lookup_val[-1] if lookup_val else None
+        super().__init__(field, request, params, model, model_admin, field_path)
+
+        related_model = field.related_model
+        select_related, only = str_dependencies(related_model)
+        queryset = related_model._default_manager.all()
+        if select_related:
+            queryset = queryset.select_related(*select_related)
+        if only:
+            queryset = queryset.only(*only)
+
+        self.widget = forms.ModelChoiceField(
+            queryset=queryset,
+            required=False,
+            widget=AutocompleteSelect(field, model_admin.admin_site, attrs={
+                'class': 'autocomplete-filter',
+                'data-placeholder': _('All'),
+                'data-allow-clear': 'true',
+            }),
+        ).widget
+
+    def expected_parameters(self):
+        return [self.lookup_kwarg]
+
+    def choices(self, changelist):
+        yield {
+            'selected': self.lookup_val is None,
+            'query_string': changelist.get_query_string(remove=[self.lookup_kwarg]),
+            'display': _('All'),
+        }
+
+    # Campo de busca já preenchido com o objeto selecionado
+    def widget_html(self):
+        return self.widget.render(self.lookup_kwarg, self.lookup_val)
+
+    def get_facet_counts(self, pk_attname, filtered_qs):
+        return {}
+
+
+# Scripts do select2 necessários quando algum filtro usa o AutocompleteFilter
+def autocomplete_filter_media(model_admin, list_filter):
+    for item in list_filter:
+        if isinstance(item, (list, tuple)) and item[1] is AutocompleteFilter:
+            field = get_fields_from_path(model_admin.model, item[0])[-1]
+            return AutocompleteSelect(field, model_admin.admin_site).media
+    return forms.Media()
+
+
+# Ação do admin que exporta os objetos selecionados (ou todos, com "selecionar
+# todos") em streaming, sem carregar as linhas em memória (ver exports.py)
+def export_action(fmt, compress=False):
+    def action(modeladmin, request, queryset):
+        return exports.export_response(queryset, fmt, compress)
+
+    action.__name__ = f'export_{fmt}_gzip' if compress else f'export_{fmt}'
+    description = f'Exportar selecionados em {fmt.upper()}' + (' (gzip)' if compress else '')
+    return admin.action(description=description)(action)
+
+
+EXPORT_ACTIONS = [export_action('csv'), export_action('csv', compress=True), export_action('jsonl', compress=True)]
+
+
+@admin.action(description='Exportar itens das vendas selecionadas em CSV')
+def export_sale_items(modeladmin, request, queryset):
+    return exports.export_response(ItemVenda.objects.filter(venda__in=queryset.values('pk')), 'csv')
+
+
+# ChangeList que carrega apenas as colunas exibidas na listagem. O only()
+# é aplicado só aos resultados da página, e não às ações em lote.
+class BaseChangeList(ChangeList):
+
+    def get_results(self, request):
+        self.queryset = self.get_list_queryset(request)
+        super().get_results(request)
+
+    def get_list_queryset(self, request):
+        only = self.model_admin.get_list_only(request)
+        if only:
+            return self.queryset.only(*only)
+        return self.queryset
+
+
+# ChangeList paginada por cursor (ver KeysetPaginator) na ordenação padrão
+# (-criado_em, -id): páginas distantes custam o mesmo que a primeira. O
+# cursor usa o próprio parâmetro de página (p). Ao ordenar por uma coluna, a
+# listagem volta à paginação por número de página.
+class KeysetChangeList(BaseChangeList):
+    keyset_page = None
+
+    def get_results(self, request):
+        if ORDER_VAR in self.params:
+            return super().get_results(request)
+
+        queryset = self.get_list_queryset(request)
+        paginator = KeysetPaginator(queryset, self.list_per_page)
+        try:
+            page = paginator.page(request.GET.get(PAGE_VAR))
+        except InvalidPage:
+            page = paginator.page()
+
+        self.keyset_page = page
+        self.result_count = EstimatedCountPaginator(queryset, self.list_per_page).count
+        self.show_full_result_count = False
+        self.show_admin_actions = True
+        self.full_result_count = None
+        self.result_list = page.object_list
+        # A navegação é feita pelos cursores (ver admin/app/pagination.html)
+        self.can_show_all = False
+        self.multi_page = False
+        self.paginator = paginator
+
+    def first_page_url(self):
+        return self.get_query_string(remove=[PAGE_VAR])
+
+    def next_page_url(self):
+        return self.get_query_string({PAGE_VAR: self.keyset_page.next_cursor})
+
+    def previous_page_url(self):
+        return self.get_query_string({PAGE_VAR: self.keyset_page.previous_cursor})
+
+
 class BaseAdmin(admin.ModelAdmin):
     date_hierarchy = 'criado_em'
     list_filter = ['criado_em', 'modificado_em']
+    # Ordem estável para a paginação da listagem e do autocomplete
+    ordering = ['-pk']
+    # Evita um COUNT(*) sem filtros a cada página (ver EstimatedCountPaginator)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    show_facets = admin.ShowFacets.NEVER
+
+    def __init__(self, model, admin_site):
+        super().__init__(model, admin_site)
+        # Campos de busca declarados no modelo. Os modelos com todos os campos
+        # em texto usam a busca textual (registrada em AppConfig.ready)
+        if not self.search_fields:
+            self.search_fields = getattr(model, 'search_fields', ())
+        self.full_text_search = search.is_registered(model)
+
+    # Busca pelo índice de trigramas (ver search.py) quando disponível; termos
+    # com menos de 3 caracteres continuam usando a busca padrão do Django
+    def get_search_results(self, request, queryset, search_term):
+        if self.full_text_search and search.is_available():
+            sql = search.match_sql(self.model, search.split_terms(search_term))
+            if sql is not None:
+                return queryset.filter(pk__in=RawSQL(*sql)), False
+        return super().get_search_results(request, queryset, search_term)
 
     def get_list_display(self, request):
         return ['id'] + getattr(self, 'custom_list_display', []) + ['criado_em', 'modificado_em']
 
+    # Listagens grandes usam a paginação por cursor (keyset_pagination = True)
+    keyset_pagination = False
+
+    def get_changelist(self, request, **kwargs):
+        return KeysetChangeList if self.keyset_pagination else BaseChangeList
+
+    # Deriva select_related e only() das colunas exibidas e do __str__ do
+    # modelo e das relações exibidas (o __str__ do próprio objeto aparece no
+    # checkbox de ações), de forma que a listagem faça um número constante
+    # de consultas, independente da quantidade de linhas por página
+    def get_list_dependencies(self, request):
+        select_related, only = str_dependencies(self.model)
+        for name in self.get_list_display(request):
+            try:
+                field = self.model._meta.get_field(name)
+            except FieldDoesNotExist:
+                # Colunas calculadas podem acessar qualquer campo
+                return select_related, None
+            only.append(name)
+            if field.is_relation:
+                related_select, related_only = str_dependencies(field.related_model, prefix=f'{name}__')
+                select_related += [name] + related_select
+                only += related_only
+        return list(dict.fromkeys(select_related)), list(dict.fromkeys(only))
+
+    def get_list_select_related(self, request):
+        select_related, _ = self.get_list_dependencies(request)
+        return select_related or super().get_list_select_related(request)
+
+    def get_list_only(self, request):
+        _, only = self.get_list_dependencies(request)
+        return only
+
+    # Filtros por chave estrangeira usam o AutocompleteFilter
+    def get_list_filter(self, request):
+        list_filter = []
+        for item in super().get_list_filter(request):
+            if isinstance(item, str) and get_fields_from_path(self.model, item)[-1].is_relation:
+                item = (item, AutocompleteFilter)
+            list_filter.append(item)
+        return list_filter
+
+    @property
+    def media(self):
+        return super().media + autocomplete_filter_media(self, self.get_list_filter(None))
+
 
 @admin.register(Categoria)
 class CategoriaAdmin(BaseAdmin):
     custom_list_display = ['nome', 'slug']
-    search_fields = ['nome', 'slug']
     prepopulated_fields = {'slug': ('nome',)}
 
 
 @admin.register(Marca)
 class MarcaAdmin(BaseAdmin):
     custom_list_display = ['nome', 'slug']
-    search_fields = ['nome', 'slug']
     prepopulated_fields = {'slug': ('nome',)}
 
 
 @admin.register(Produto)
 class ProdutoAdmin(BaseAdmin):
+    ordering = KEYSET_ORDERING
+    keyset_pagination = True
     custom_list_display = ['nome', 'slug', 'marca', 'categoria', 'preco']
-    search_fields = ['nome', 'slug', 'marca__nome', 'categoria__nome']
     list_filter = BaseAdmin.list_filter + ['marca', 'categoria']
     prepopulated_fields = {'slug': ('nome',)}
 
@@ -39,7 +270,6 @@ class ProdutoAdmin(BaseAdmin):
 @admin.register(Cliente)
 class ClienteAdmin(BaseAdmin):
     custom_list_display = ['nome', 'email', 'cpf']
-    search_fields = ['nome', 'email', 'cpf']
 
 
 class ItemVendaInline(admin.TabularInline):
@@ -47,90 +277,147 @@ class ItemVendaInline(admin.TabularInline):
     extra = 1
 
 
+# Vendas ativas com pagamento pendente (usa o índice venda_em_aberto_idx)
+class EmAbertoFilter(admin.SimpleListFilter):
+    title = 'pagamento'
+    parameter_name = 'em_aberto'
+
+    def lookups(self, request, model_admin):
+        return [('1', 'Em aberto')]
+
+    def queryset(self, request, queryset):
+        if self.value() == '1':
+            return queryset.filter(totals.UNPAID)
+        return queryset
+
+
 @admin.register(Venda)
 class VendaAdmin(BaseAdmin):
-    custom_list_display = ['cliente']
-    search_fields = ['cliente__nome']
-    list_filter = BaseAdmin.list_filter + ['cliente']
+    ordering = KEYSET_ORDERING
+    keyset_pagination = True
+    actions = EXPORT_ACTIONS + [export_sale_items]
+    custom_list_display = ['cliente', 'total', 'valor_pago']
+    readonly_fields = ['subtotal', 'total', 'valor_pago']
+    list_filter = BaseAdmin.list_filter + ['cliente', EmAbertoFilter]
     inlines = [ItemVendaInline]
 
+    # Painel de vendas, lido das tabelas de rollup (ver rollups.py)
+    def get_urls(self):
+        return [
+            path('dashboard/', self.admin_site.admin_view(self.dashboard_view), name='app_venda_dashboard'),
+        ] + super().get_urls()
+
+    def dashboard_view(self, request):
+        if not self.has_view_permission(request):
+            raise PermissionDenied
+        context = {
+            **self.admin_site.each_context(request),
+            **rollups.dashboard(),
+            'opts': self.model._meta,
+            'title': 'Painel de vendas',
+        }
+        return TemplateResponse(request, 'admin/app/venda/dashboard.html', context)
+
 
 @admin.register(Pagamento)
 class PagamentoAdmin(BaseAdmin):
+    actions = EXPORT_ACTIONS
     custom_list_display = ['venda', 'valor']
-    search_fields = ['venda__id', 'valor']
     list_filter = BaseAdmin.list_filter + ['venda']
 
 
 @admin.register(EnderecoEntrega)
 class EnderecoEntregaAdmin(BaseAdmin):
     custom_list_display = ['venda', 'rua', 'numero', 'bairro', 'cidade', 'estado', 'cep']
-    search_fields = ['venda__cliente__nome', 'rua', 'cidade', 'estado', 'cep']
     list_filter = BaseAdmin.list_filter + ['venda__cliente']
 
 
 @admin.register(Avaliacao)
 class AvaliacaoAdmin(BaseAdmin):
     custom_list_display = ['produto', 'cliente', 'estrelas']
-    search_fields = ['cliente__nome', 'produto__nome', 'estrelas']
     list_filter = BaseAdmin.list_filter + ['cliente', 'produto']
 
 
 @admin.register(Comentario)
 class ComentarioAdmin(BaseAdmin):
     custom_list_display = ['avaliacao', 'texto']
-    search_fields = ['avaliacao__cliente__nome', 'avaliacao__produto__nome', 'texto']
     list_filter = BaseAdmin.list_filter + ['avaliacao__cliente', 'avaliacao__produto']
 
 
 @admin.register(Cupom)
 class CupomAdmin(BaseAdmin):
-    custom_list_display = ['codigo', 'desconto']
-    search_fields = ['codigo']
+    custom_list_display = ['codigo', 'desconto', 'usos', 'limite_usos', 'valido_ate']
+    readonly_fields = ['usos']
     list_filter = BaseAdmin.list_filter
 
 
 @admin.register(Carrinho)
 class CarrinhoAdmin(BaseAdmin):
     custom_list_display = ['cliente']
-    search_fields = ['cliente__nome']
     list_filter = BaseAdmin.list_filter + ['cliente']
 
 
 @admin.register(ItemCarrinho)
 class ItemCarrinhoAdmin(BaseAdmin):
     custom_list_display = ['carrinho', 'produto', 'quantidade']
-    search_fields = ['carrinho__id', 'produto__nome', 'quantidade']
     list_filter = BaseAdmin.list_filter + ['carrinho', 'produto']
 
 
 @admin.register(Desejo)
 class DesejoAdmin(BaseAdmin):
     custom_list_display = ['cliente']
-    search_fields = ['cliente__nome']
     list_filter = BaseAdmin.list_filter + ['cliente']
 
 
 @admin.register(ItemDesejo)
 class ItemDesejoAdmin(BaseAdmin):
     custom_list_display = ['desejo', 'produto']
-    search_fields = ['desejo__id', 'produto__nome']
     list_filter = BaseAdmin.list_filter + ['desejo', 'produto']
 
 
 @admin.register(Notificacao)
 class NotificacaoAdmin(BaseAdmin):
-    custom_list_display = ['cliente', 'texto']
-    search_fields = ['cliente__nome', 'texto']
-    list_filter = BaseAdmin.list_filter + ['cliente']
+    custom_list_display = ['cliente', 'texto', 'lida']
+    list_filter = BaseAdmin.list_filter + ['cliente', 'campanha', 'lida']
+
+
+# Envia as campanhas selecionadas (em lotes, ver notifications.py). Para
+# bases grandes, prefira o comando send_campaign.
+@admin.action(description='Enviar campanhas selecionadas')
+def send_campaigns(modeladmin, request, queryset):
+    for campanha in queryset.filter(ativo=True):
+        sent = notifications.send_campaign(campanha)
+        modeladmin.message_user(request, f'{campanha}: {sent} notificação(ões) enviada(s).')
+
+
+@admin.register(Campanha)
+class CampanhaAdmin(BaseAdmin):
+    actions = [send_campaigns]
+    custom_list_display = ['nome', 'destinatarios', 'enviada_em']
+    readonly_fields = ['destinatarios', 'enviada_em']
 
 
 @admin.register(Log)
 class LogAdmin(admin.ModelAdmin):
-    custom_list_display = ['tabela', 'objeto', 'campo', 'valor_antigo', 'valor_novo', 'acao', 'usuario']
+    list_select_related = ['usuario']
+    ordering = KEYSET_ORDERING
+    actions = EXPORT_ACTIONS
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    custom_list_display = ['tabela', 'objeto', 'campo', 'acao', 'usuario']
     search_fields = ['tabela', 'objeto', 'campo', 'acao', 'usuario__username']
-    list_filter = ['tabela', 'acao', 'usuario', 'criado_em']
-    readonly_fields = ['tabela', 'objeto', 'campo', 'valor_antigo', 'valor_novo', 'acao', 'usuario', 'criado_em']
+    list_filter = ['tabela', 'acao', ('usuario', AutocompleteFilter), 'criado_em']
+    readonly_fields = ['tabela', 'objeto', 'campo', 'alteracoes', 'acao', 'usuario', 'criado_em']
+
+    @property
+    def media(self):
+        return super().media + autocomplete_filter_media(self, self.list_filter)
+
+    def get_changelist(self, request, **kwargs):
+        return KeysetChangeList
+
+    def get_list_only(self, request):
+        return None
 
     def has_add_permission(self, request, obj=None):
         return False
@@ -8,3 +8,7 @@ class AppConfig(AppConfig):
 
     def ready(self):
         import app.signals
+        from app import search
+
+        # Busca textual dos modelos que declaram search_fields (ver search.py)
+        search.register_models(self.get_models())
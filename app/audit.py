@@ -0,0 +1,287 @@
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import close_old_connections, transaction
+from django.dispatch import Signal
+
+
+###########################################################################
+# AUDITORIA: USUÁRIO RESPONSÁVEL E GRAVAÇÃO DOS LOGS (SÍNCRONA OU EM LOTE) #
+###########################################################################
+
+
+logger = logging.getLogger(__name__)
+
+
+# Usuário da requisição atual, preenchido pelo AuditUserMiddleware. Por ser
+# uma ContextVar, o valor é isolado por requisição tanto em WSGI (threads)
+# quanto em ASGI (tarefas e sync_to_async).
+current_user = ContextVar('audit_current_user', default=None)
+
+DEFAULT_USER_CACHE_KEY = 'audit:default_user_id'
+
+# Logs acumulados dentro de um bloco batched_logs() (None fora dele)
+_pending_logs = ContextVar('audit_pending_logs', default=None)
+
+# Pks dos objetos excluídos dentro de um bloco deleting() ({modelo: {pk}})
+_deleting = ContextVar('audit_deleting', default=None)
+
+# Sinais enviados pelas operações em lote do AuditQuerySet, que não disparam
+# pre_save/post_save. post_bulk_update recebe changes={pk: {campo: [antigo, novo]}}
+# e post_bulk_create recebe objs (a lista de objetos criados).
+post_bulk_update = Signal()
+post_bulk_create = Signal()
+
+
+# Define o usuário responsável pelas alterações feitas dentro do bloco
+# (útil em comandos e tarefas que rodam fora de uma requisição)
+@contextmanager
+def audit_user(user):
+    token = current_user.set(user)
+    try:
+        yield
+    finally:
+        current_user.reset(token)
+
+
+# Usuário padrão dos logs (primeiro superusuário), mantido em cache e
+# invalidado pelos sinais de alteração de usuários (ver app/signals.py). O
+# tempo finito cobre as invalidações que não chegam a este processo (cache
+# de um único processo) e os usuários alterados sem sinais (ex: update()).
+def get_default_user_id():
+    return cache.get_or_set(
+        DEFAULT_USER_CACHE_KEY,
+        lambda: get_user_model().objects.filter(is_superuser=True).order_by('pk').values_list('pk', flat=True).first(),
+        timeout=settings.AUDIT_DEFAULT_USER_CACHE_TIMEOUT,
+    )
+
+
+def invalidate_default_user():
+    cache.delete(DEFAULT_USER_CACHE_KEY)
+
+
+# Retorna o id do usuário que está realizando a alteração: o usuário
+# autenticado da requisição atual ou, na falta dele, o usuário padrão
+def get_audit_user_id():
+    user = current_user.get()
+    if user is not None and user.is_authenticated:
+        return user.pk
+    return get_default_user_id()
+
+
+# Escritor assíncrono de logs: os registros são colocados em uma fila em
+# memória e gravados em lotes (bulk_create) por uma thread de fundo.
+# A fila tem tamanho máximo; quando ela enche, o log é gravado na própria
+# requisição, de forma que a memória usada fica sempre limitada.
+class AsyncLogWriter:
+
+    def __init__(self, batch_size, flush_interval, max_size):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue(maxsize=max_size)
+        self.pid = os.getpid()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self.run, name='audit-log-writer', daemon=True)
+
+    def start(self):
+        self._thread.start()
+        atexit.register(self.stop)
+
+    # Coloca um log na fila sem esperar (a requisição não fica bloqueada
+    # pela thread de fundo); se ela estiver cheia, grava imediatamente
+    def enqueue(self, log):
+        try:
+            self.queue.put_nowait(log)
+        except queue.Full:
+            logger.warning('Fila de auditoria cheia, gravando log de forma síncrona')
+            log.save()
+
+    # Laço da thread de fundo: junta os logs da fila em lotes e grava cada
+    # lote quando ele atinge batch_size ou quando o intervalo expira
+    def run(self):
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while not (self._stop.is_set() and self.queue.empty()):
+            try:
+                batch.append(self.queue.get(timeout=max(deadline - time.monotonic(), 0)))
+            except queue.Empty:
+                pass
+
+            if len(batch) >= self.batch_size or time.monotonic() >= deadline:
+                self.write(batch)
+                batch = []
+                deadline = time.monotonic() + self.flush_interval
+
+        self.write(batch)
+
+    def write(self, batch):
+        if not batch:
+            return
+        from .models import Log
+
+        try:
+            Log.objects.bulk_create(batch, batch_size=self.batch_size)
+        except Exception:
+            logger.exception('Falha ao gravar %d logs de auditoria em lote, gravando um a um', len(batch))
+            self.write_each(batch)
+        finally:
+            for _ in batch:
+                self.queue.task_done()
+            close_old_connections()
+
+    # Grava os logs um a um: um log inválido não descarta o lote inteiro,
+    # apenas ele mesmo
+    def write_each(self, batch):
+        for log in batch:
+            # O bulk_create desfeito pode ter preenchido o id de parte dos logs
+            log.pk = None
+            log._state.adding = True
+            try:
+                log.save()
+            except Exception:
+                logger.exception('Log de auditoria descartado (%s %s)', log.tabela, log.objeto)
+
+    # Aguarda até que todos os logs enfileirados tenham sido gravados
+    def flush(self):
+        self.queue.join()
+
+    # Interrompe a thread após gravar o que ainda estiver na fila
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join(timeout)
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+# Retorna o escritor assíncrono do processo atual (criado sob demanda,
+# e recriado após um fork, já que a thread não sobrevive ao fork)
+def get_writer():
+    global _writer
+    if _writer is None or _writer.pid != os.getpid():
+        with _writer_lock:
+            if _writer is None or _writer.pid != os.getpid():
+                _writer = AsyncLogWriter(
+                    batch_size=settings.AUDIT_LOG_BATCH_SIZE,
+                    flush_interval=settings.AUDIT_LOG_FLUSH_INTERVAL,
+                    max_size=settings.AUDIT_LOG_QUEUE_SIZE,
+                )
+                _writer.start()
+    return _writer
+
+
+# Monta (sem gravar) o registro de log de uma alteração
+def make_log(model, pk, changes, action, user_id):
+    from .models import Log
+
+    return Log(
+        tabela=model._meta.model_name,
+        objeto=pk,
+        campo=', '.join(changes)[:255],
+        alteracoes=changes,
+        acao=action,
+        usuario_id=user_id
+    )
+
+
+# Registro único para uma operação em lote (ex: importação de catálogo), sem
+# objeto específico: alteracoes guarda o resumo da operação
+def make_batch_log(model, action, summary, user_id):
+    from .models import Log
+
+    return Log(
+        tabela=model._meta.model_name,
+        objeto=None,
+        alteracoes=summary,
+        acao=action,
+        usuario_id=user_id
+    )
+
+
+# Agrupa os logs gerados dentro do bloco e os grava com um único
+# bulk_create no final (usado em exclusões em cascata e operações em lote).
+# Se o bloco terminar com erro, nada é gravado.
+@contextmanager
+def batched_logs():
+    if _pending_logs.get() is not None:
+        yield
+        return
+
+    logs = []
+    token = _pending_logs.set(logs)
+    try:
+        yield
+    finally:
+        _pending_logs.reset(token)
+    write_logs(logs)
+
+
+# Registra os objetos excluídos dentro do bloco (exclusões em cascata e em
+# lote), para que os sinais dos objetos filhos saibam se o pai também está
+# sendo excluído. O Collector envia o pre_delete de todos os objetos antes
+# do post_delete do primeiro: is_deleted() só é confiável no post_delete.
+@contextmanager
+def deleting():
+    if _deleting.get() is not None:
+        yield
+        return
+
+    token = _deleting.set({})
+    try:
+        yield
+    finally:
+        _deleting.reset(token)
+
+
+def mark_deleted(instance):
+    deleted = _deleting.get()
+    if deleted is not None:
+        deleted.setdefault(type(instance), set()).add(instance.pk)
+
+
+def is_deleted(model, pk):
+    deleted = _deleting.get()
+    return deleted is not None and pk in deleted.get(model, ())
+
+
+# Grava um log de auditoria. Dentro de batched_logs() o log é apenas
+# acumulado. No modo assíncrono (AUDIT_LOG_ASYNC), o log só é enfileirado
+# após o commit da transação atual, então alterações desfeitas por
+# rollback nunca são registradas.
+def write_log(log):
+    write_logs([log])
+
+
+def write_logs(logs):
+    if not logs:
+        return
+
+    pending = _pending_logs.get()
+    if pending is not None:
+        pending.extend(logs)
+        return
+
+    if not settings.AUDIT_LOG_ASYNC:
+        from .models import Log
+
+        Log.objects.bulk_create(logs, batch_size=settings.AUDIT_LOG_BATCH_SIZE)
+        return
+
+    writer = get_writer()
+
+    def enqueue():
+        for log in logs:
+            writer.enqueue(log)
+
+    transaction.on_commit(enqueue)
@@ -0,0 +1,313 @@
+import time
+import tracemalloc
+from datetime import date
+from decimal import Decimal
+from itertools import count
+
+from django.contrib import admin
+from django.contrib.auth.models import User
+from django.db import connection
+from django.db.models import F
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from . import cart, catalog, coupons
+from .checkout import checkout
+from .models import (
+    Categoria, Marca, Produto, Cliente, Venda, ItemVenda, Pagamento, Avaliacao,
+    Comentario, Cupom, Carrinho, ItemCarrinho, Desejo, ItemDesejo, Notificacao, Log
+)
+
+
+###########################################################################
+# BENCHMARKS DOS CAMINHOS MAIS USADOS                                     #
+# Cada benchmark mede uma operação (save/update/delete auditados, página  #
+# de listagem do admin, catálogo, carrinho e checkout) sobre os mesmos    #
+# dados (ver fixtures): quantidade de queries, pico de memória alocada    #
+# (tracemalloc) e mediana do tempo. O preparo (setup) de cada execução    #
+# não entra nas medições. Os resultados são comparados com uma baseline   #
+# em JSON pelo comando benchmark.                                         #
+###########################################################################
+
+
+# Linhas de cada modelo nos dados dos benchmarks
+ROWS = 50
+
+ENDERECO = {'rua': 'Rua A', 'numero': '123', 'bairro': 'Centro', 'cidade': 'São Paulo', 'estado': 'SP', 'cep': '01000-000'}
+
+# Folga absoluta das comparações: variações menores que isso são ruído
+TIME_SLACK_MS = 2.0
+MEMORY_SLACK_KB = 16.0
+
+
+class Benchmark:
+
+    def __init__(self, name, run, setup=None):
+        self.name = name
+        self.run = run
+        self.setup = setup
+
+
+_registry = []
+_serial = count()
+
+
+# Registra a função como benchmark. setup(fixtures) prepara cada execução
+# e o seu retorno é passado para a função medida: run(fixtures, prepared).
+def benchmark(name, setup=None):
+    def decorator(run):
+        _registry.append(Benchmark(name, run, setup))
+        return run
+    return decorator
+
+
+# Benchmarks registrados, mais um por listagem de modelo do admin
+def registered_benchmarks():
+    changelists = [
+        Benchmark(f'admin: listagem de {model._meta.model_name}', changelist(model))
+        for model in admin.site._registry if model._meta.app_label == 'app'
+    ]
+    return _registry + changelists
+
+
+def produto(fixtures, **values):
+    n = next(_serial)
+    return Produto(
+        nome=f'Benchmark {n}', descricao='Benchmark', preco=Decimal('10.00'), fabricacao=date(2024, 1, 1),
+        validade=date(2030, 1, 1), categoria=fixtures['categoria'], marca=fixtures['marca'],
+        slug=f'benchmark-{n}', **values,
+    )
+
+
+# Dados usados pelos benchmarks, criados pelos managers auditados (os
+# sinais mantêm as tabelas derivadas, como em produção)
+def fixtures():
+    categoria = Categoria.objects.create(nome='Benchmark', descricao='Benchmark', slug='benchmark')
+    marca = Marca.objects.create(nome='Benchmark', descricao='Benchmark', slug='benchmark')
+    data = {'categoria': categoria, 'marca': marca}
+    produtos = Produto.objects.bulk_create([produto(data) for _ in range(ROWS)])
+    clientes = Cliente.objects.bulk_create([
+        Cliente(nome=f'Benchmark {n}', email=f'{n}@benchmark.teste', senha='x') for n in range(ROWS)
+    ])
+    vendas = Venda.objects.bulk_create([Venda(cliente=cliente) for cliente in clientes])
+    ItemVenda.objects.bulk_create([
+        ItemVenda(venda=venda, produto=item, quantidade=1, preco=item.preco) for venda, item in zip(vendas, produtos)
+    ])
+    Pagamento.objects.bulk_create([Pagamento(venda=venda, valor=Decimal('10.00')) for venda in vendas])
+    avaliacoes = Avaliacao.objects.bulk_create([
+        Avaliacao(produto=item, cliente=cliente, estrelas=n % 5 + 1)
+        for n, (item, cliente) in enumerate(zip(produtos, clientes))
+    ])
+    Comentario.objects.bulk_create([Comentario(avaliacao=avaliacao, texto='Benchmark') for avaliacao in avaliacoes])
+    carrinhos = Carrinho.objects.bulk_create([Carrinho(cliente=cliente) for cliente in clientes])
+    ItemCarrinho.objects.bulk_create([
+        ItemCarrinho(carrinho=carrinho, produto=item, quantidade=1) for carrinho, item in zip(carrinhos, produtos)
+    ])
+    desejos = Desejo.objects.bulk_create([Desejo(cliente=cliente) for cliente in clientes])
+    ItemDesejo.objects.bulk_create([
+        ItemDesejo(desejo=desejo, produto=item, quantidade=1) for desejo, item in zip(desejos, produtos)
+    ])
+    Notificacao.objects.bulk_create([Notificacao(cliente=cliente, texto='Benchmark') for cliente in clientes])
+    Log.objects.bulk_create([Log(tabela='benchmark', objeto=n, acao='UPDATE') for n in range(ROWS)])
+    cupom = Cupom.objects.create(codigo='benchmark', desconto=Decimal('5.00'))
+
+    client = Client()
+    client.force_login(User.objects.create_superuser('benchmark', 'benchmark@benchmark.teste', 'benchmark'))
+    return data | {
+        'produtos': produtos, 'clientes': clientes, 'vendas': vendas, 'cupom': cupom, 'client': client,
+    }
+
+
+###########################################################################
+# MEDIÇÃO                                                                 #
+###########################################################################
+
+
+# Executa o benchmark uma vez sem medir (aquece caches e templates), uma
+# vez contando as queries, uma vez com o tracemalloc e `repeticoes` vezes
+# medindo o tempo. Retorna {'queries', 'memoria_kb', 'tempo_ms'}.
+def measure(bench, fixtures, repeticoes):
+    def prepare():
+        return bench.setup(fixtures) if bench.setup else None
+
+    bench.run(fixtures, prepare())
+
+    prepared = prepare()
+    with CaptureQueriesContext(connection) as context:
+        bench.run(fixtures, prepared)
+    queries = len(context.captured_queries)
+
+    prepared = prepare()
+    tracing = tracemalloc.is_tracing()
+    if not tracing:
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+    before = tracemalloc.get_traced_memory()[0]
+    try:
+        bench.run(fixtures, prepared)
+        peak = tracemalloc.get_traced_memory()[1] - before
+    finally:
+        if not tracing:
+            tracemalloc.stop()
+
+    tempos = []
+    for _ in range(repeticoes):
+        prepared = prepare()
+        inicio = time.perf_counter()
+        bench.run(fixtures, prepared)
+        tempos.append(time.perf_counter() - inicio)
+    return {
+        'queries': queries,
+        'memoria_kb': round(max(peak, 0) / 1024, 1),
+        'tempo_ms': round(sorted(tempos)[len(tempos) // 2] * 1000, 3),
+    }
+
+
+# Compara o resultado com a baseline e retorna as regressões (textos).
+# Queries não têm tolerância: qualquer query a mais é uma regressão.
+def regressions(result, baseline, tolerancia, tolerancia_memoria):
+    found = []
+    if result['queries'] > baseline['queries']:
+        found.append(f'queries {baseline["queries"]} -> {result["queries"]}')
+    if result['tempo_ms'] > baseline['tempo_ms'] * (1 + tolerancia) + TIME_SLACK_MS:
+        found.append(f'tempo {baseline["tempo_ms"]:.2f} -> {result["tempo_ms"]:.2f} ms')
+    if result['memoria_kb'] > baseline['memoria_kb'] * (1 + tolerancia_memoria) + MEMORY_SLACK_KB:
+        found.append(f'memória {baseline["memoria_kb"]:.1f} -> {result["memoria_kb"]:.1f} KB')
+    return found
+
+
+###########################################################################
+# SAVE, UPDATE E DELETE AUDITADOS                                         #
+###########################################################################
+
+
+@benchmark('orm: produto criado')
+def create_product(fixtures, prepared):
+    produto(fixtures).save()
+
+
+@benchmark('orm: produto alterado')
+def update_product(fixtures, prepared):
+    item = fixtures['produtos'][0]
+    item.preco += 1
+    item.save()
+
+
+@benchmark('orm: produto excluído', setup=lambda fixtures: Produto.objects.bulk_create([produto(fixtures)])[0])
+def delete_product(fixtures, prepared):
+    prepared.delete()
+
+
+@benchmark('orm: update em lote de produtos')
+def bulk_update_products(fixtures, prepared):
+    Produto.objects.filter(pk__in=[item.pk for item in fixtures['produtos']]).update(preco=F('preco') + 1)
+
+
+@benchmark('orm: item de venda criado')
+def create_sale_item(fixtures, prepared):
+    ItemVenda.objects.create(
+        venda=fixtures['vendas'][0], produto=fixtures['produtos'][0], quantidade=1, preco=Decimal('10.00'),
+    )
+
+
+@benchmark('orm: avaliação criada')
+def create_review(fixtures, prepared):
+    Avaliacao.objects.create(produto=fixtures['produtos'][0], cliente=fixtures['clientes'][0], estrelas=4)
+
+
+def sale_with_items(fixtures):
+    venda = Venda.objects.create(cliente=fixtures['clientes'][0])
+    ItemVenda.objects.bulk_create([
+        ItemVenda(venda=venda, produto=item, quantidade=1, preco=item.preco) for item in fixtures['produtos'][:3]
+    ])
+    Pagamento.objects.create(venda=venda, valor=Decimal('10.00'))
+    return venda
+
+
+@benchmark('orm: venda excluída (em cascata)', setup=sale_with_items)
+def delete_sale(fixtures, prepared):
+    prepared.delete()
+
+
+###########################################################################
+# ADMIN                                                                   #
+###########################################################################
+
+
+def get(fixtures, url, **params):
+    response = fixtures['client'].get(url, params)
+    if response.status_code != 200:
+        raise AssertionError(f'{url}: status {response.status_code}')
+    return response
+
+
+def changelist(model):
+    def run(fixtures, prepared):
+        get(fixtures, reverse(f'admin:app_{model._meta.model_name}_changelist'))
+    return run
+
+
+@benchmark('admin: dashboard de vendas')
+def sales_dashboard(fixtures, prepared):
+    get(fixtures, reverse('admin:app_venda_dashboard'))
+
+
+@benchmark('admin: busca de produtos')
+def product_search(fixtures, prepared):
+    get(fixtures, reverse('admin:app_produto_changelist'), q='benchmark')
+
+
+###########################################################################
+# CATÁLOGO, CARRINHO E CHECKOUT                                           #
+###########################################################################
+
+
+def clear_cache(fixtures):
+    catalog.cache.clear()
+
+
+@benchmark('catálogo: listagem da categoria (cache vazio)', setup=clear_cache)
+def listing_cold(fixtures, prepared):
+    get(fixtures, reverse('catalogo_categoria', args=[fixtures['categoria'].slug]))
+
+
+@benchmark('catálogo: listagem da categoria (cache)')
+def listing_warm(fixtures, prepared):
+    get(fixtures, reverse('catalogo_categoria', args=[fixtures['categoria'].slug]))
+
+
+@benchmark('catálogo: produto (cache vazio)', setup=clear_cache)
+def product_cold(fixtures, prepared):
+    get(fixtures, reverse('catalogo_produto', args=[fixtures['produtos'][0].slug]))
+
+
+@benchmark('catálogo: mais avaliados (cache vazio)', setup=clear_cache)
+def top_rated_cold(fixtures, prepared):
+    get(fixtures, reverse('catalogo_mais_avaliados'))
+
+
+@benchmark('carrinho: produto adicionado')
+def cart_add(fixtures, prepared):
+    cart.add(fixtures['clientes'][0].pk, fixtures['produtos'][0].pk)
+
+
+def dirty_carts(fixtures):
+    for cliente, item in zip(fixtures['clientes'], fixtures['produtos']):
+        cart.add(cliente.pk, item.pk)
+
+
+@benchmark(f'carrinho: gravação de {ROWS} carrinhos', setup=dirty_carts)
+def cart_flush(fixtures, prepared):
+    cart.flush()
+
+
+@benchmark('cupom: validação (cache)')
+def coupon_validate(fixtures, prepared):
+    coupons.validate(fixtures['cupom'].codigo)
+
+
+@benchmark('checkout: 3 itens com cupom')
+def checkout_with_coupon(fixtures, prepared):
+    items = {item.pk: 1 for item in fixtures['produtos'][:3]}
+    checkout(fixtures['clientes'][0].pk, ENDERECO, cupom=fixtures['cupom'].codigo, items=items)
@@ -0,0 +1,51 @@
+import time
+import uuid
+from contextlib import contextmanager
+
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+
+
+###########################################################################
+# CACHE COMPARTILHADO ENTRE PROCESSOS                                     #
+# Carrinhos, catálogo e usuário padrão dos logs são lidos e invalidados   #
+# por processos diferentes (workers do gunicorn, comandos e o admin). Com #
+# um cache que pertence a um único processo (LocMemCache), um processo    #
+# não vê o que o outro gravou nem as invalidações feitas pelo outro (ver  #
+# CACHES em settings.py).                                                 #
+###########################################################################
+
+
+# Tempo máximo de espera por uma trava e tempo de vida da trava (se o
+# processo que a pegou morrer, ela expira sozinha)
+LOCK_WAIT = 5
+LOCK_TIMEOUT = 10
+
+
+class LockTimeout(RuntimeError):
+    pass
+
+
+# Cache que existe apenas na memória do processo atual (ou que não guarda nada)
+def is_process_local(alias='default'):
+    return isinstance(caches[alias], (LocMemCache, DummyCache))
+
+
+# Trava entre processos feita com cache.add (atômico no Redis, no
+# Memcached e no DatabaseCache, que depende da chave primária da tabela)
+@contextmanager
+def lock(key, wait=LOCK_WAIT, timeout=LOCK_TIMEOUT, alias='default'):
+    cache = caches[alias]
+    token = uuid.uuid4().hex
+    deadline = time.monotonic() + wait
+    while not cache.add(key, token, timeout):
+        if time.monotonic() > deadline:
+            raise LockTimeout(f'Trava {key} ocupada há mais de {wait} s')
+        time.sleep(0.005)
+    try:
+        yield
+    finally:
+        # Não apaga a trava de outro processo se esta já tiver expirado
+        if cache.get(key) == token:
+            cache.delete(key)
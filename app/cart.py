@@ -0,0 +1,267 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.connection import ConnectionProxy
+
+from . import audit, caching
+from .models import Produto, Carrinho, ItemCarrinho
+
+
+###########################################################################
+# CARRINHOS EM CACHE (WRITE-BEHIND)                                       #
+# O carrinho ativo de cada cliente fica no cache como {produto_id: qtd}.  #
+# Com um cache fora do banco (ex: Redis), ler ou alterar o carrinho não   #
+# consulta o banco (apenas a primeira leitura, quando o carrinho não está #
+# no cache). As alterações de um cliente são feitas sob uma trava no      #
+# cache, para que requisições simultâneas não percam itens. Os clientes   #
+# com carrinho alterado entram em uma fila no cache, gravada depois em    #
+# lotes (comando flush_carts), com um upsert em ItemCarrinho por          #
+# (carrinho, produto). Os carrinhos ficam em um cache próprio, que deve   #
+# ser compartilhado entre os processos e não descartar entradas (ver      #
+# CACHES['carrinhos'] em settings.py): um carrinho descartado antes da    #
+# gravação seria perdido.                                                 #
+###########################################################################
+
+
+# Cache dos carrinhos, da fila e das travas (como o django.core.cache.cache,
+# acompanha as alterações de CACHES feitas nos testes)
+CACHE_ALIAS = 'carrinhos'
+cache = ConnectionProxy(caches, CACHE_ALIAS)
+
+# Números da fila: o último usado e o próximo a gravar
+QUEUE_END = 'carrinho:fila:fim'
+QUEUE_START = 'carrinho:fila:inicio'
+
+# Número da fila que faltava na última gravação (ver pending)
+QUEUE_MISSING = 'carrinho:fila:faltando'
+
+# Impede duas gravações da fila ao mesmo tempo
+FLUSH_LOCK = 'carrinho:fila:gravando'
+FLUSH_LOCK_TIMEOUT = 60 * 10
+
+# Trava do número da fila (o incr do DatabaseCache não é atômico)
+QUEUE_LOCK = 'carrinho:fila:trava'
+
+
+def _timeout():
+    return settings.CART_CACHE_TIMEOUT
+
+
+def cart_key(cliente_id):
+    return f'carrinho:{cliente_id}'
+
+
+# Marca de carrinho alterado e ainda não gravado (evita repetir o cliente na fila)
+def dirty_key(cliente_id):
+    return f'carrinho:alterado:{cliente_id}'
+
+
+def queue_key(number):
+    return f'carrinho:fila:{number}'
+
+
+def lock_key(cliente_id):
+    return f'carrinho:trava:{cliente_id}'
+
+
+# Carrinho ativo mais recente de cada cliente ({cliente_id: carrinho_id})
+def active_carts(cliente_ids):
+    return dict(
+        Carrinho.objects.filter(cliente_id__in=cliente_ids, ativo=True)
+        .values('cliente_id').annotate(carrinho_id=Max('pk')).values_list('cliente_id', 'carrinho_id')
+    )
+
+
+# Itens do carrinho ativo do cliente, lidos do banco
+def load(cliente_id):
+    carrinho_id = active_carts([cliente_id]).get(cliente_id)
+    if carrinho_id is None:
+        return {}
+    return dict(
+        ItemCarrinho.objects.filter(carrinho_id=carrinho_id, ativo=True, quantidade__gt=0)
+        .values_list('produto_id', 'quantidade')
+    )
+
+
+###########################################################################
+# OPERAÇÕES DO CARRINHO                                                   #
+###########################################################################
+
+
+# Itens do carrinho ({produto_id: quantidade})
+def get(cliente_id):
+    items = cache.get(cart_key(cliente_id))
+    if items is None:
+        items = load(cliente_id)
+        # add: não sobrescreve um carrinho gravado no cache por outra requisição
+        cache.add(cart_key(cliente_id), items, _timeout())
+    return items
+
+
+def add(cliente_id, produto_id, quantidade=1):
+    _validate(quantidade)
+    return _set(cliente_id, produto_id, lambda atual: atual + quantidade)
+
+
+# Define a quantidade do produto no carrinho (0 remove o produto)
+def update(cliente_id, produto_id, quantidade):
+    _validate(quantidade)
+    return _set(cliente_id, produto_id, lambda atual: quantidade)
+
+
+def remove(cliente_id, produto_id):
+    return update(cliente_id, produto_id, 0)
+
+
+def clear(cliente_id):
+    with caching.lock(lock_key(cliente_id), alias=CACHE_ALIAS):
+        _save(cliente_id, {})
+
+
+def _validate(quantidade):
+    if not isinstance(quantidade, int) or quantidade < 0:
+        raise ValueError('A quantidade deve ser um número inteiro não negativo')
+
+
+# Lê, altera e grava o carrinho sob a trava do cliente. quantity recebe a
+# quantidade atual do produto e retorna a nova.
+def _set(cliente_id, produto_id, quantity):
+    with caching.lock(lock_key(cliente_id), alias=CACHE_ALIAS):
+        items = dict(get(cliente_id))
+        quantidade = quantity(items.get(produto_id, 0))
+        if quantidade:
+            items[produto_id] = quantidade
+        else:
+            items.pop(produto_id, None)
+        _save(cliente_id, items)
+    return items
+
+
+def _save(cliente_id, items):
+    cache.set(cart_key(cliente_id), items, _timeout())
+    _mark_dirty(cliente_id)
+
+
+# Coloca o cliente na fila, se o carrinho ainda não estava pendente
+def _mark_dirty(cliente_id):
+    if cache.add(dirty_key(cliente_id), True, _timeout()):
+        with caching.lock(QUEUE_LOCK, alias=CACHE_ALIAS):
+            cache.add(QUEUE_END, 0, None)
+            number = cache.incr(QUEUE_END)
+        cache.set(queue_key(number), cliente_id, _timeout())
+
+
+###########################################################################
+# GRAVAÇÃO NO BANCO                                                       #
+###########################################################################
+
+
+# Próximos clientes da fila. Uma entrada ausente pode ainda estar sendo
+# gravada (entre o incr e o set de _mark_dirty): a leitura para nela e a
+# tenta de novo na próxima gravação; se continuar ausente, é descartada.
+def pending(limit):
+    start = cache.get_or_set(QUEUE_START, 1, None)
+    end = cache.get(QUEUE_END) or 0
+    numbers = range(start, min(end, start + limit - 1) + 1)
+    entries = cache.get_many([queue_key(number) for number in numbers])
+
+    cliente_ids, next_start = [], start
+    for number in numbers:
+        key = queue_key(number)
+        if key not in entries and cache.get(QUEUE_MISSING) != number:
+            cache.set(QUEUE_MISSING, number, None)
+            break
+        if key in entries:
+            cliente_ids.append(entries[key])
+        next_start = number + 1
+    return cliente_ids, numbers[:next_start - start], next_start
+
+
+# Grava a fila inteira, em lotes. Retorna a quantidade de carrinhos gravados.
+def flush(batch_size=None):
+    batch_size = batch_size or settings.CART_FLUSH_BATCH_SIZE
+    if not cache.add(FLUSH_LOCK, True, FLUSH_LOCK_TIMEOUT):
+        return 0
+
+    written = 0
+    try:
+        while True:
+            cliente_ids, numbers, next_start = pending(batch_size)
+            written += write(set(cliente_ids))
+            cache.set(QUEUE_START, next_start, None)
+            cache.delete_many([queue_key(number) for number in numbers])
+            # Lote incompleto: fim da fila ou parada em uma entrada ausente
+            if len(numbers) < batch_size:
+                break
+    finally:
+        cache.delete(FLUSH_LOCK)
+    return written
+
+
+# Grava agora o carrinho de um cliente (ex: antes de fechar o pedido)
+def sync(cliente_id):
+    return write([cliente_id])
+
+
+# Grava os carrinhos dos clientes: cria os carrinhos que ainda não existem,
+# faz o upsert dos itens e desativa os itens removidos. As alterações são
+# registradas em um único log. Se a gravação falhar, os clientes voltam
+# para a fila.
+def write(cliente_ids):
+    # A marca é retirada antes da leitura: alterações feitas durante a
+    # gravação colocam o cliente de novo na fila
+    cache.delete_many([dirty_key(cliente_id) for cliente_id in cliente_ids])
+    found = cache.get_many([cart_key(cliente_id) for cliente_id in cliente_ids])
+    carts = {
+        cliente_id: found[cart_key(cliente_id)]
+        for cliente_id in cliente_ids if cart_key(cliente_id) in found
+    }
+    if not carts:
+        return 0
+
+    try:
+        with transaction.atomic():
+            _write(carts)
+    except Exception:
+        for cliente_id in carts:
+            _mark_dirty(cliente_id)
+        raise
+    return len(carts)
+
+
+def _write(carts):
+    carrinhos = active_carts(list(carts))
+    Carrinho.objects.bulk_create([
+        Carrinho(cliente_id=cliente_id) for cliente_id, items in carts.items()
+        if cliente_id not in carrinhos and items
+    ])
+    carrinhos = active_carts(list(carts))
+
+    # Produtos excluídos depois de entrar no carrinho são ignorados
+    produto_ids = {produto_id for items in carts.values() for produto_id in items}
+    produto_ids = set(Produto._base_manager.filter(pk__in=produto_ids).values_list('pk', flat=True))
+
+    # Todos os itens dos carrinhos do lote são desativados em um único
+    # UPDATE e o upsert reativa os que continuam no carrinho. O
+    # _base_manager não gera um log por item: a gravação inteira é
+    # registrada em um único log.
+    ItemCarrinho._base_manager.filter(carrinho_id__in=list(carrinhos.values()), ativo=True).update(
+        ativo=False, modificado_em=timezone.now(),
+    )
+    ItemCarrinho._base_manager.bulk_create(
+        [
+            ItemCarrinho(carrinho_id=carrinhos[cliente_id], produto_id=produto_id, quantidade=quantidade)
+            for cliente_id, items in carts.items()
+            for produto_id, quantidade in items.items() if produto_id in produto_ids
+        ],
+        update_conflicts=True,
+        unique_fields=['carrinho', 'produto'],
+        update_fields=['quantidade', 'ativo', 'modificado_em'],
+        batch_size=settings.CART_FLUSH_BATCH_SIZE,
+    )
+
+    audit.write_log(audit.make_batch_log(ItemCarrinho, 'SYNC', {
+        'carrinhos': sorted(carrinhos.values()),
+    }, audit.get_audit_user_id()))
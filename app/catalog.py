@@ -0,0 +1,322 @@
+import json
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils.connection import ConnectionProxy
+
+from . import caching
+from .models import Categoria, Marca, Produto, Avaliacao, AvaliacaoResumo
+
+
+###########################################################################
+# CATÁLOGO DE PRODUTOS EM CACHE                                           #
+# Os cartões dos produtos são guardados no cache já serializados em JSON, #
+# um por produto, e as listagens (por categoria ou marca) guardam apenas  #
+# os ids dos produtos. Cada listagem tem uma versão no cache: alterar a   #
+# listagem é trocar a versão, sem precisar apagar chaves por padrão. As   #
+# invalidações são feitas pelos sinais (ver signals.py) após o commit.    #
+###########################################################################
+
+
+PAGE_SIZE = 24
+
+# Ranking dos mais bem avaliados: tamanho e quantidade mínima de avaliações
+TOP_RATED_SIZE = 24
+TOP_RATED_MIN_REVIEWS = 3
+
+# Campos que alteram quais produtos aparecem em uma listagem (ou a ordem)
+LISTING_FIELDS = {'nome', 'ativo', 'categoria', 'marca'}
+
+# Campos de categoria/marca exibidos no cabeçalho da listagem e nos cartões
+GROUP_FIELDS = {'nome', 'descricao', 'slug', 'ativo'}
+
+# Campos da avaliação que alteram a nota exibida no cartão do produto
+RATING_FIELDS = {'produto', 'estrelas', 'ativo'}
+
+# Cache do catálogo, fora do banco (ver CACHES['catalogo'] em settings.py)
+CACHE_ALIAS = 'catalogo'
+cache = ConnectionProxy(caches, CACHE_ALIAS)
+
+# Modelos das listagens, pelo nome usado nas chaves e nas URLs
+GROUP_MODELS = {'categoria': Categoria, 'marca': Marca}
+
+# Valor guardado para slugs que não existem, evitando consultar o banco a
+# cada requisição por um slug inválido
+MISSING = 0
+
+
+# Com um cache de um único processo (LocMemCache), as invalidações feitas
+# em outro processo não chegam a este: as entradas duram pouco, para que
+# dados alterados em outro worker apareçam logo (ver CACHES em settings.py)
+def _timeout():
+    if caching.is_process_local(CACHE_ALIAS):
+        return settings.CATALOG_LOCAL_CACHE_TIMEOUT
+    return settings.CATALOG_CACHE_TIMEOUT
+
+
+def card_key(pk):
+    return f'catalogo:cartao:{pk}'
+
+
+def detail_key(pk):
+    return f'catalogo:detalhe:{pk}'
+
+
+def slug_key(kind, slug):
+    return f'catalogo:slug:{kind}:{slug}'
+
+
+def version_key(kind, pk):
+    return f'catalogo:versao:{kind}:{pk}'
+
+
+def _dumps(data):
+    return json.dumps(data, cls=DjangoJSONEncoder, ensure_ascii=False)
+
+
+###########################################################################
+# LEITURA                                                                 #
+###########################################################################
+
+
+# Versão atual de uma listagem. Se a chave de versão sumiu do cache, uma
+# nova versão é criada, o que descarta qualquer listagem antiga.
+def get_version(kind, pk):
+    key = version_key(kind, pk)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, uuid.uuid4().hex, _timeout())
+        version = cache.get(key)
+    return version
+
+
+# Id do objeto com o slug informado (None se não existir ou estiver inativo)
+def resolve_slug(kind, slug):
+    key = slug_key(kind, slug)
+    pk = cache.get(key)
+    if pk is None:
+        model = Produto if kind == 'produto' else GROUP_MODELS[kind]
+        pk = model.objects.filter(slug=slug, ativo=True).values_list('pk', flat=True).first() or MISSING
+        cache.set(key, pk, _timeout())
+    return pk or None
+
+
+# Nota do produto, lida do resumo das avaliações (ver ratings.py)
+def _rating(produto, histogram=False):
+    try:
+        resumo = produto.resumo_avaliacoes
+    except AvaliacaoResumo.DoesNotExist:
+        resumo = AvaliacaoResumo(produto=produto)
+    rating = {
+        'total': resumo.total,
+        'media': round(resumo.media, 2) if resumo.media is not None else None,
+    }
+    if histogram:
+        rating['estrelas'] = resumo.histograma
+    return rating
+
+
+def _products_queryset(pks):
+    return Produto.objects.filter(pk__in=pks).select_related('categoria', 'marca', 'resumo_avaliacoes')
+
+
+def build_card(produto):
+    return _dumps({
+        'id': produto.pk,
+        'nome': produto.nome,
+        'slug': produto.slug,
+        'preco': produto.preco,
+        'categoria': {'nome': produto.categoria.nome, 'slug': produto.categoria.slug},
+        'marca': {'nome': produto.marca.nome, 'slug': produto.marca.slug},
+        'avaliacoes': _rating(produto),
+    })
+
+
+def build_detail(produto):
+    return _dumps({
+        'id': produto.pk,
+        'nome': produto.nome,
+        'slug': produto.slug,
+        'descricao': produto.descricao,
+        'preco': produto.preco,
+        'fabricacao': produto.fabricacao,
+        'validade': produto.validade,
+        'categoria': {'nome': produto.categoria.nome, 'slug': produto.categoria.slug},
+        'marca': {'nome': produto.marca.nome, 'slug': produto.marca.slug},
+        'avaliacoes': _rating(produto, histogram=True),
+    })
+
+
+# Cartões (JSON) dos produtos, na ordem dos ids. Os que não estão no cache
+# são montados em uma única consulta e guardados.
+def get_cards(pks):
+    keys = {pk: card_key(pk) for pk in pks}
+    cached = cache.get_many(keys.values())
+    missing = [pk for pk in pks if keys[pk] not in cached]
+    if missing:
+        built = {card_key(produto.pk): build_card(produto) for produto in _products_queryset(missing)}
+        cache.set_many(built, _timeout())
+        cached.update(built)
+    return [cached[keys[pk]] for pk in pks if keys[pk] in cached]
+
+
+# Listagem de uma categoria ou marca: {'cabecalho': json, 'produtos': [ids]}
+def _get_listing(kind, pk):
+    key = f'catalogo:lista:{kind}:{pk}:{get_version(kind, pk)}'
+    listing = cache.get(key)
+    if listing is None:
+        group = GROUP_MODELS[kind].objects.get(pk=pk)
+        produtos = Produto.objects.filter(**{kind: pk}, ativo=True).order_by('nome', 'pk')
+        listing = {
+            'cabecalho': _dumps({'nome': group.nome, 'slug': group.slug, 'descricao': group.descricao}),
+            'produtos': list(produtos.values_list('pk', flat=True)),
+        }
+        cache.set(key, listing, _timeout())
+    return listing
+
+
+# JSON de uma página da listagem de uma categoria ou marca (None se não existir)
+def listing_json(kind, slug, page=1):
+    pk = resolve_slug(kind, slug)
+    if pk is None:
+        return None
+
+    listing = _get_listing(kind, pk)
+    total = len(listing['produtos'])
+    start = (page - 1) * PAGE_SIZE
+    cards = get_cards(listing['produtos'][start:start + PAGE_SIZE])
+    return (
+        f'{{"{kind}": {listing["cabecalho"]}, "pagina": {page}, '
+        f'"total": {total}, "produtos": [{", ".join(cards)}]}}'
+    )
+
+
+# Produtos ativos mais bem avaliados (usa o índice de media/total do resumo)
+def top_rated_json():
+    key = f'catalogo:ranking:{get_version("ranking", 0)}'
+    pks = cache.get(key)
+    if pks is None:
+        resumos = (
+            AvaliacaoResumo.objects.filter(total__gte=TOP_RATED_MIN_REVIEWS, produto__ativo=True)
+            .order_by('-media', '-total', 'produto_id')
+        )
+        pks = list(resumos.values_list('produto_id', flat=True)[:TOP_RATED_SIZE])
+        cache.set(key, pks, _timeout())
+    return f'{{"produtos": [{", ".join(get_cards(pks))}]}}'
+
+
+# JSON do detalhe de um produto (None se não existir ou estiver inativo)
+def product_json(slug):
+    pk = resolve_slug('produto', slug)
+    if pk is None:
+        return None
+
+    key = detail_key(pk)
+    detail = cache.get(key)
+    if detail is None:
+        produto = _products_queryset([pk]).first()
+        if produto is None:
+            return None
+        detail = build_detail(produto)
+        cache.set(key, detail, _timeout())
+    return detail
+
+
+###########################################################################
+# INVALIDAÇÃO                                                             #
+# Recebem as alterações no formato da auditoria, {pk: {campo: [antigo,    #
+# novo]}}; None indica objeto criado, excluído ou alteração desconhecida. #
+###########################################################################
+
+
+def _old_value(fields, name):
+    if fields and name in fields:
+        return fields[name][0]
+    return None
+
+
+# Agenda a remoção de chaves e a troca de versões para depois do commit, para
+# que uma leitura concorrente não guarde no cache dados ainda não gravados
+def _invalidate(keys, versions):
+    keys = list(keys)
+    versions = list(versions)
+
+    def run():
+        cache.delete_many(keys)
+        cache.set_many({version_key(kind, pk): uuid.uuid4().hex for kind, pk in versions}, _timeout())
+
+    if keys or versions:
+        transaction.on_commit(run)
+
+
+# rows: (pk, slug, categoria_id, marca_id) dos produtos alterados
+def invalidate_products(rows, changes):
+    keys, versions = set(), set()
+    for pk, slug, categoria_id, marca_id in rows:
+        fields = changes.get(pk)
+        keys.update([card_key(pk), detail_key(pk), slug_key('produto', slug)])
+        old_slug = _old_value(fields, 'slug')
+        if old_slug:
+            keys.add(slug_key('produto', old_slug))
+
+        if fields is None or LISTING_FIELDS.intersection(fields):
+            versions.add(('ranking', 0))
+            for kind, current in (('categoria', categoria_id), ('marca', marca_id)):
+                versions.add((kind, current))
+                old = _old_value(fields, kind)
+                if old is not None:
+                    versions.add((kind, old))
+    _invalidate(keys, versions)
+
+
+# rows: (pk, slug) das categorias ou marcas alteradas
+def invalidate_groups(kind, rows, changes):
+    keys, versions, renamed = set(), set(), []
+    for pk, slug in rows:
+        fields = changes.get(pk)
+        if fields is not None and not GROUP_FIELDS.intersection(fields):
+            continue
+        keys.add(slug_key(kind, slug))
+        old_slug = _old_value(fields, 'slug')
+        if old_slug:
+            keys.add(slug_key(kind, old_slug))
+        versions.add((kind, pk))
+        if fields is not None and {'nome', 'slug'}.intersection(fields):
+            renamed.append(pk)
+
+    # Os cartões exibem o nome e o slug da categoria/marca
+    if renamed:
+        for pk in Produto._base_manager.filter(**{f'{kind}__in': renamed}).values_list('pk', flat=True):
+            keys.update([card_key(pk), detail_key(pk)])
+    _invalidate(keys, versions)
+
+
+# rows: (pk, produto_id) das avaliações alteradas
+def invalidate_ratings(rows, changes):
+    keys = set()
+    for pk, produto_id in rows:
+        fields = changes.get(pk)
+        if fields is not None and not RATING_FIELDS.intersection(fields):
+            continue
+        for produto in (produto_id, _old_value(fields, 'produto')):
+            if produto is not None:
+                keys.update([card_key(produto), detail_key(produto)])
+    _invalidate(keys, [('ranking', 0)] if keys else [])
+
+
+# Invalidação após operações em lote (update/bulk_update/bulk_create), que
+# não têm as instâncias: os dados atuais são lidos em uma consulta
+def invalidate(model, changes):
+    pks = list(changes)
+    if model is Produto:
+        rows = Produto._base_manager.filter(pk__in=pks).values_list('pk', 'slug', 'categoria_id', 'marca_id')
+        invalidate_products(rows, changes)
+    elif model in GROUP_MODELS.values():
+        rows = model._base_manager.filter(pk__in=pks).values_list('pk', 'slug')
+        invalidate_groups(model._meta.model_name, rows, changes)
+    elif model is Avaliacao:
+        rows = Avaliacao._base_manager.filter(pk__in=pks).values_list('pk', 'produto_id')
+        invalidate_ratings(rows, changes)
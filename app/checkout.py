@@ -0,0 +1,94 @@
+from decimal import Decimal
+
+from django.db import transaction
+
+from . import cart, coupons
+from .models import (
+    Produto, Venda, ItemVenda, Pagamento, EnderecoEntrega, Carrinho
+)
+
+
+###########################################################################
+# FECHAMENTO DO PEDIDO (CHECKOUT)                                         #
+# Converte o carrinho do cliente em uma Venda, com itens, endereço de     #
+# entrega e pagamento, em uma única transação. Os produtos são travados   #
+# (SELECT ... FOR UPDATE) sempre em ordem crescente de pk e o uso do      #
+# cupom é contado no fim (ver coupons.redeem), de forma que checkouts     #
+# concorrentes esperem uns pelos outros em vez de entrarem em deadlock e  #
+# a linha do cupom fique travada pelo menor tempo possível. Os registros  #
+# são criados com bulk_create (auditado em lote) e os totais da venda são #
+# mantidos pelos sinais de criação em lote (ver totals.py).               #
+# No SQLite não há travas por linha (select_for_update é ignorado): o     #
+# banco inteiro é travado para escrita e os checkouts concorrentes são    #
+# executados um de cada vez (ver o comando load_test_checkout).           #
+###########################################################################
+
+
+ADDRESS_FIELDS = ['rua', 'numero', 'bairro', 'cidade', 'estado', 'cep']
+
+
+class CheckoutError(ValueError):
+    pass
+
+
+# Fecha o pedido do carrinho do cliente e retorna a venda criada. items
+# ({produto_id: quantidade}) substitui o carrinho em cache, se informado.
+def checkout(cliente_id, endereco, cupom=None, items=None):
+    items = cart.get(cliente_id) if items is None else items
+    items = {produto_id: quantidade for produto_id, quantidade in items.items() if quantidade > 0}
+    if not items:
+        raise CheckoutError('O carrinho está vazio')
+    missing = [name for name in ADDRESS_FIELDS if not endereco.get(name)]
+    if missing:
+        raise CheckoutError(f'Endereço incompleto: {", ".join(missing)}')
+
+    try:
+        # Cupom do cache em memória: inexistente ou fora da validade não
+        # chega a abrir a transação
+        cupom = coupons.validate(cupom) if cupom else None
+    except coupons.CouponError as error:
+        raise CheckoutError(str(error))
+
+    with transaction.atomic():
+        precos = lock_products(items)
+        subtotal = sum(quantidade * precos[produto_id] for produto_id, quantidade in items.items())
+        desconto = min(cupom['desconto'], subtotal) if cupom else Decimal('0.00')
+        total = subtotal - desconto
+
+        # Os totais (subtotal, total e valor_pago) são somados pelos sinais
+        # ao criar os itens e o pagamento
+        [venda] = Venda.objects.bulk_create([Venda(cliente_id=cliente_id, desconto=desconto)])
+        ItemVenda.objects.bulk_create([
+            ItemVenda(venda=venda, produto_id=produto_id, quantidade=quantidade, preco=precos[produto_id])
+            for produto_id, quantidade in sorted(items.items())
+        ])
+        EnderecoEntrega.objects.bulk_create([
+            EnderecoEntrega(venda=venda, **{name: endereco[name] for name in ADDRESS_FIELDS})
+        ])
+        if total:
+            Pagamento.objects.bulk_create([Pagamento(venda=venda, valor=total)])
+        Carrinho.objects.filter(cliente_id=cliente_id, ativo=True).update(ativo=False)
+        if cupom:
+            try:
+                coupons.redeem(cupom)
+            except coupons.CouponError as error:
+                raise CheckoutError(str(error))
+
+        # O carrinho em cache só é esvaziado se o pedido for gravado
+        transaction.on_commit(lambda: cart.clear(cliente_id))
+
+    return venda
+
+
+# Trava os produtos em ordem de pk e retorna os preços ({produto_id: preco})
+def lock_products(items):
+    rows = (
+        Produto._base_manager.select_for_update().filter(pk__in=items, ativo=True)
+        .order_by('pk').values_list('pk', 'preco')
+    )
+    precos = dict(rows)
+    unavailable = sorted(set(items) - set(precos))
+    if unavailable:
+        raise CheckoutError(f'Produto(s) indisponível(is): {", ".join(map(str, unavailable))}')
+    return precos
+
@@ -0,0 +1,126 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db.models import F, Q
+from django.db.models.functions import Lower
+from django.utils import timezone
+
+from .models import Cupom
+
+
+###########################################################################
+# VALIDAÇÃO E USO DE CUPONS                                               #
+# Os cupons ativos ficam em um cache LRU na memória do processo, pelo     #
+# código em minúsculas, por COUPON_CACHE_TTL segundos (códigos que não    #
+# existem também, para não consultar o banco a cada tentativa). O cache   #
+# é limpo pelos sinais quando um cupom é alterado (ver signals.py); nos   #
+# demais processos, a alteração aparece ao fim do TTL.                    #
+# O limite de usos não depende do cache: o uso é contado com um único     #
+# UPDATE ... WHERE usos < limite_usos, sem ler o cupom antes, de forma    #
+# que usos simultâneos não ultrapassam o limite.                          #
+###########################################################################
+
+
+# Valor guardado para códigos que não existem (ou de cupons inativos)
+MISSING = object()
+
+# Campos do cupom guardados no cache
+FIELDS = ['pk', 'codigo', 'desconto', 'valido_de', 'valido_ate', 'limite_usos']
+
+
+class CouponError(ValueError):
+    pass
+
+
+# Cache LRU com tempo de expiração, seguro para uso entre threads
+class LRUCache:
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+_cache = LRUCache(settings.COUPON_CACHE_SIZE, settings.COUPON_CACHE_TTL)
+
+
+def normalize(codigo):
+    return codigo.strip().lower()
+
+
+# Cupons ativos pelo código, sem diferenciar maiúsculas e minúsculas (usa o
+# índice único cupom_codigo_unico)
+def by_code(codigo):
+    return Cupom._base_manager.alias(codigo_normalizado=Lower('codigo')).filter(
+        codigo_normalizado=normalize(codigo), ativo=True,
+    )
+
+
+# Dados do cupom ativo ({campo: valor}), do cache ou do banco
+def lookup(codigo):
+    key = normalize(codigo)
+    coupon = _cache.get(key)
+    if coupon is None:
+        coupon = by_code(codigo).values(*FIELDS).first() or MISSING
+        _cache.set(key, coupon)
+    return None if coupon is MISSING else coupon
+
+
+def invalidate():
+    _cache.clear()
+
+
+# Valida o código e o período de validade do cupom e retorna os seus dados.
+# O limite de usos só é conferido no uso (ver redeem).
+def validate(codigo, now=None):
+    coupon = lookup(codigo)
+    if coupon is None:
+        raise CouponError(f'Cupom inválido: {codigo}')
+    now = now or timezone.now()
+    if coupon['valido_de'] and now < coupon['valido_de']:
+        raise CouponError(f'O cupom {coupon["codigo"]} ainda não está válido')
+    if coupon['valido_ate'] and now >= coupon['valido_ate']:
+        raise CouponError(f'O cupom {coupon["codigo"]} expirou')
+    return coupon
+
+
+# Conta um uso do cupom, se ele ainda estiver ativo, válido e abaixo do
+# limite. Em uma transação, a linha fica travada apenas do UPDATE até o
+# commit (por isso é bom usar o cupom no fim da transação).
+def redeem(coupon, now=None):
+    now = now or timezone.now()
+    used = (
+        Cupom._base_manager.filter(pk=coupon['pk'], ativo=True)
+        .filter(Q(valido_de__isnull=True) | Q(valido_de__lte=now))
+        .filter(Q(valido_ate__isnull=True) | Q(valido_ate__gt=now))
+        .filter(Q(limite_usos__isnull=True) | Q(usos__lt=F('limite_usos')))
+        .update(usos=F('usos') + 1)
+    )
+    if not used:
+        raise CouponError(f'O cupom {coupon["codigo"]} não está mais disponível')
@@ -0,0 +1,117 @@
+import csv
+import json
+import zlib
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+from .models import Venda, ItemVenda, Pagamento, Log
+
+
+###########################################################################
+# EXPORTAÇÃO EM CSV / JSONL (COM GZIP OPCIONAL)                           #
+# As linhas são lidas com iterator(chunk_size=...) (cursor no servidor no #
+# PostgreSQL) e escritas uma a uma, compactadas à medida que são geradas. #
+# A memória usada não depende da quantidade de linhas exportadas.         #
+###########################################################################
+
+
+# Linhas lidas do banco por vez
+CHUNK_SIZE = 2000
+
+# Tamanho aproximado (em bytes) dos blocos enviados na resposta
+BUFFER_SIZE = 64 * 1024
+
+# Colunas exportadas de cada modelo (campos ou caminhos de relações)
+EXPORT_FIELDS = {
+    Venda: [
+        'id', 'data', 'cliente_id', 'cliente__nome', 'cliente__email', 'subtotal', 'desconto', 'total',
+        'valor_pago', 'criado_em', 'modificado_em',
+    ],
+    ItemVenda: ['id', 'venda_id', 'produto_id', 'produto__nome', 'quantidade', 'preco', 'criado_em'],
+    Pagamento: ['id', 'venda_id', 'valor', 'data', 'criado_em', 'modificado_em'],
+    Log: ['id', 'tabela', 'objeto', 'campo', 'alteracoes', 'acao', 'usuario__username', 'data', 'criado_em'],
+}
+
+FORMATS = {
+    'csv': 'text/csv',
+    'jsonl': 'application/x-ndjson',
+}
+
+
+# Buffer de escrita que apenas devolve o texto, para usar o csv.writer
+# linha a linha sem acumular o arquivo em memória
+class Echo:
+    def write(self, value):
+        return value
+
+
+def iter_rows(queryset, fields):
+    return queryset.order_by('pk').values_list(*fields).iterator(chunk_size=CHUNK_SIZE)
+
+
+# Campos JSON (ex: Log.alteracoes) são escritos no CSV como texto JSON
+def csv_value(value):
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, cls=DjangoJSONEncoder, ensure_ascii=False)
+    return value
+
+
+def csv_lines(queryset, fields):
+    writer = csv.writer(Echo())
+    yield writer.writerow(fields)
+    for row in iter_rows(queryset, fields):
+        yield writer.writerow([csv_value(value) for value in row])
+
+
+def jsonl_lines(queryset, fields):
+    for row in iter_rows(queryset, fields):
+        yield json.dumps(dict(zip(fields, row)), cls=DjangoJSONEncoder, ensure_ascii=False) + '\n'
+
+
+# Junta as linhas em blocos de ~BUFFER_SIZE bytes
+def buffered(lines):
+    buffer, size = [], 0
+    for line in lines:
+        data = line.encode('utf-8')
+        buffer.append(data)
+        size += len(data)
+        if size >= BUFFER_SIZE:
+            yield b''.join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield b''.join(buffer)
+
+
+# Compacta os blocos em formato gzip à medida que são gerados
+def gzip_stream(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+# Blocos de bytes da exportação do queryset no formato informado
+def export_chunks(queryset, fmt='csv', compress=False, fields=None):
+    fields = fields or EXPORT_FIELDS[queryset.model]
+    lines = csv_lines(queryset, fields) if fmt == 'csv' else jsonl_lines(queryset, fields)
+    chunks = buffered(lines)
+    return gzip_stream(chunks) if compress else chunks
+
+
+def export_filename(model, fmt, compress):
+    name = f'{model._meta.model_name}-{timezone.now():%Y%m%d-%H%M%S}.{fmt}'
+    return f'{name}.gz' if compress else name
+
+
+def export_response(queryset, fmt='csv', compress=False):
+    response = StreamingHttpResponse(
+        export_chunks(queryset, fmt, compress),
+        content_type='application/gzip' if compress else f'{FORMATS[fmt]}; charset=utf-8',
+    )
+    filename = export_filename(queryset.model, fmt, compress)
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
@@ -0,0 +1,139 @@
+import gzip
+import heapq
+import json
+import os
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Min
+from django.utils import timezone
+
+from app import partitions
+from app.models import Log
+
+
+# Linhas lidas/removidas por vez, para manter a memória e os bloqueios pequenos
+CHUNK_SIZE = 5000
+
+# Meses de partições criadas à frente do mês atual
+MONTHS_AHEAD = 2
+
+
+class Command(BaseCommand):
+    help = (
+        'Arquiva em arquivos JSONL compactados (gzip) os logs mais antigos que o '
+        'período de retenção e os remove da tabela. No PostgreSQL, remove as '
+        'partições mensais arquivadas e cria as partições dos próximos meses.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--meses-retencao', type=int, default=settings.AUDIT_LOG_RETENTION_MONTHS,
+            help='Quantidade de meses mantidos na tabela (além do mês atual)',
+        )
+        parser.add_argument(
+            '--destino', default=settings.AUDIT_LOG_ARCHIVE_DIR,
+            help='Diretório onde os arquivos log-AAAA-MM.jsonl.gz são gravados',
+        )
+        parser.add_argument('--dry-run', action='store_true', help='Apenas lista os meses que seriam arquivados')
+
+    def handle(self, *args, **options):
+        partitioned = partitions.is_partitioned()
+        current_month = partitions.month_start(timezone.now().date())
+
+        if partitioned and not options['dry_run']:
+            created = partitions.create_partitions(
+                current_month, partitions.add_months(current_month, MONTHS_AHEAD)
+            )
+            for name in created:
+                self.stdout.write(f'Partição criada: {name}')
+
+        cutoff = partitions.add_months(current_month, -options['meses_retencao'])
+
+        oldest = Log.objects.aggregate(oldest=Min('criado_em'))['oldest']
+        if oldest is None:
+            self.stdout.write('Nenhum log para arquivar.')
+            return
+
+        destination = Path(options['destino'])
+        # Os meses são contados em UTC, como os limites das partições
+        month = partitions.month_start(oldest.date())
+        while month < cutoff:
+            if not self.month_queryset(month).exists():
+                if partitioned and not options['dry_run']:
+                    partitions.drop_partition(month)
+            elif options['dry_run']:
+                self.stdout.write(f'Seria arquivado: {month:%Y-%m}')
+            else:
+                path, count = self.archive_month(month, destination)
+                self.remove_month(month, partitioned)
+                self.stdout.write(f'{month:%Y-%m}: {count} logs arquivados em {path}')
+            month = partitions.next_month(month)
+
+    def month_queryset(self, month):
+        return Log.objects.filter(
+            criado_em__gte=partitions.month_bound(month),
+            criado_em__lt=partitions.month_bound(partitions.next_month(month)),
+        )
+
+    # Grava os logs do mês, em ordem de id, em um arquivo JSONL compactado.
+    # O arquivo é escrito em um temporário, gravado no disco (fsync) e só
+    # então renomeado, e as linhas só são removidas depois disso. Assim,
+    # repetir o arquivamento de um mês (ex: após uma falha no meio da
+    # remoção) reescreve o mesmo arquivo, sem logs repetidos nem perdidos.
+    def archive_month(self, month, destination):
+        destination.mkdir(parents=True, exist_ok=True)
+        path = destination / f'log-{month:%Y-%m}.jsonl.gz'
+        temporary = path.with_name(f'{path.name}.tmp')
+
+        count = 0
+        with open(temporary, 'wb') as raw:
+            with gzip.open(raw, 'wt', encoding='utf-8') as file:
+                for line in self.archive_lines(month, path):
+                    file.write(line)
+                    file.write('\n')
+                    count += 1
+            raw.flush()
+            os.fsync(raw.fileno())
+        os.replace(temporary, path)
+        return path, count
+
+    # Linhas do arquivo do mês: as da tabela e as de um arquivo anterior do
+    # mesmo mês (cujas linhas podem já ter sido removidas da tabela), em
+    # ordem de id e sem repetir ids. Na repetição, vale a linha da tabela.
+    def archive_lines(self, month, path):
+        rows = self.month_queryset(month).order_by('id').values().iterator(chunk_size=CHUNK_SIZE)
+        table = ((row['id'], 0, json.dumps(row, cls=DjangoJSONEncoder, ensure_ascii=False)) for row in rows)
+
+        last_id = None
+        for log_id, _, line in heapq.merge(table, self.read_archive(path)):
+            if log_id != last_id:
+                yield line
+            last_id = log_id
+
+    @staticmethod
+    def read_archive(path):
+        if not path.exists():
+            return
+        with gzip.open(path, 'rt', encoding='utf-8') as file:
+            for line in file:
+                line = line.rstrip('\n')
+                if line:
+                    yield json.loads(line)['id'], 1, line
+
+    # Remove os logs do mês: no PostgreSQL a partição inteira é descartada
+    # (linhas que caíram na partição padrão são removidas em lotes); no
+    # SQLite as linhas são removidas em lotes usando o índice de criado_em
+    def remove_month(self, month, partitioned):
+        if partitioned:
+            partitions.drop_partition(month)
+
+        queryset = self.month_queryset(month)
+        while True:
+            ids = list(queryset.values_list('pk', flat=True)[:CHUNK_SIZE])
+            if not ids:
+                break
+            Log.objects.filter(pk__in=ids).delete()
+
@@ -0,0 +1,89 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from app import coupons, totals
+from app.pagination import KeysetPaginator, KEYSET_ORDERING
+from app.models import (
+    Produto, Venda, ItemVenda, Pagamento, Avaliacao, ItemCarrinho, ItemDesejo, Log
+)
+
+
+# Consulta de uma página seguinte da paginação por cursor
+def keyset_page(model):
+    paginator = KeysetPaginator(model.objects.all(), 20)
+    ordering = list(KEYSET_ORDERING)
+    return model.objects.filter(paginator.seek_filter(ordering, [timezone.now(), 1])).order_by(*ordering)[:21]
+
+
+# Catálogo das consultas mais frequentes da aplicação. Os valores usados nos
+# filtros não precisam existir no banco: apenas o plano de execução importa.
+QUERY_CATALOG = [
+    ('produtos ativos por categoria', lambda: Produto.objects.filter(ativo=True, categoria_id=1)),
+    ('produtos ativos por categoria e marca', lambda: Produto.objects.filter(ativo=True, categoria_id=1, marca_id=1)),
+    ('produtos ativos por marca', lambda: Produto.objects.filter(ativo=True, marca_id=1)),
+    ('produto por slug', lambda: Produto.objects.filter(slug='default')),
+    ('vendas do cliente por data', lambda: Venda.objects.filter(cliente_id=1).order_by('-data')),
+    ('itens da venda', lambda: ItemVenda.objects.filter(venda_id=1)),
+    ('pagamentos da venda', lambda: Pagamento.objects.filter(venda_id=1)),
+    ('avaliações ativas do produto', lambda: Avaliacao.objects.filter(produto_id=1, ativo=True).order_by('-data')),
+    ('cupom por código', lambda: coupons.by_code('DEFAULT')),
+    ('itens do carrinho', lambda: ItemCarrinho.objects.filter(carrinho_id=1)),
+    ('logs por tabela e período', lambda: Log.objects.filter(tabela='produto', criado_em__gte=timezone.now() - timedelta(days=7))),
+    ('página de logs por cursor', lambda: keyset_page(Log)),
+    ('página de produtos por cursor', lambda: keyset_page(Produto)),
+    ('página de vendas por cursor', lambda: keyset_page(Venda)),
+    ('vendas em aberto', lambda: totals.unpaid()[:20]),
+    ('desejos ativos dos produtos', lambda: ItemDesejo.objects.filter(produto_id__in=[1, 2], ativo=True, desejo__ativo=True)),
+]
+
+
+# Indica se o plano de execução contém uma leitura completa de tabela
+def has_sequential_scan(plan):
+    for line in plan.splitlines():
+        if connection.vendor == 'postgresql' and 'Seq Scan' in line:
+            return True
+        # No SQLite, "SCAN tabela" sem "USING INDEX" percorre a tabela inteira
+        if connection.vendor == 'sqlite' and 'SCAN ' in line and 'USING' not in line:
+            return True
+    return False
+
+
+class Command(BaseCommand):
+    help = (
+        'Executa EXPLAIN nas consultas representativas da aplicação e aponta as '
+        'que fazem leitura sequencial da tabela (sem índice).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--fail-on-scan', action='store_true',
+            help='Termina com erro se alguma consulta fizer leitura sequencial',
+        )
+        parser.add_argument('--verbose-plan', action='store_true', help='Exibe o plano completo de cada consulta')
+
+    def handle(self, *args, **options):
+        flagged = []
+
+        with transaction.atomic():
+            # No PostgreSQL, tabelas pequenas são lidas sequencialmente mesmo
+            # com índice; desativar o seq scan mostra se existe índice utilizável
+            if connection.vendor == 'postgresql':
+                with connection.cursor() as cursor:
+                    cursor.execute('SET LOCAL enable_seqscan = off')
+
+            for name, build in QUERY_CATALOG:
+                plan = build().explain()
+                scan = has_sequential_scan(plan)
+                status = self.style.ERROR('SCAN') if scan else self.style.SUCCESS('OK')
+                self.stdout.write(f'[{status}] {name}')
+                if options['verbose_plan'] or scan:
+                    for line in plan.splitlines():
+                        self.stdout.write(f'        {line}')
+                if scan:
+                    flagged.append(name)
+
+        if flagged and options['fail_on_scan']:
+            raise CommandError(f'{len(flagged)} consulta(s) sem índice: {", ".join(flagged)}')
@@ -0,0 +1,92 @@
+import json
+import platform
+from pathlib import Path
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import override_settings
+
+from app import benchmarks, coupons
+
+
+class Command(BaseCommand):
+    help = (
+        'Executa os benchmarks de save/update/delete auditados, listagens do '
+        'admin, catálogo, carrinho e checkout (ver app/benchmarks.py) e '
+        'compara queries, memória e tempo com a baseline em JSON. Falha se '
+        'algum benchmark regredir. Os dados criados são desfeitos ao final.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('nomes', nargs='*', help='Executa apenas os benchmarks cujo nome contém um dos textos')
+        parser.add_argument('--baseline', default=settings.BENCHMARK_BASELINE, help='Arquivo JSON da baseline')
+        parser.add_argument('--gravar', action='store_true', help='Grava os resultados na baseline em vez de comparar')
+        parser.add_argument('--repeticoes', type=int, default=5, help='Medições de tempo por benchmark (é usada a mediana)')
+        parser.add_argument('--tolerancia', type=float, default=1.0, help='Aumento de tempo aceito (1.0 = 100%%)')
+        parser.add_argument('--tolerancia-memoria', type=float, default=0.25, help='Aumento de memória aceito (0.25 = 25%%)')
+
+    def handle(self, *args, **options):
+        if options['repeticoes'] < 1:
+            raise CommandError('--repeticoes deve ser maior que zero')
+        selected = [
+            bench for bench in benchmarks.registered_benchmarks()
+            if not options['nomes'] or any(nome in bench.name for nome in options['nomes'])
+        ]
+        if not selected:
+            raise CommandError('Nenhum benchmark encontrado')
+
+        path = Path(options['baseline'])
+        baseline = json.loads(path.read_text()) if path.exists() else {'benchmarks': {}}
+        if not options['gravar'] and not baseline['benchmarks']:
+            self.stdout.write(self.style.WARNING(f'Baseline {path} vazia: use --gravar para criá-la'))
+
+        results = self.run(selected, options['repeticoes'])
+
+        if options['gravar']:
+            baseline['ambiente'] = {
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'banco': connection.vendor,
+                'maquina': platform.machine(),
+            }
+            baseline['benchmarks'].update(results)
+            path.write_text(json.dumps(baseline, indent=2, ensure_ascii=False, sort_keys=True) + '\n')
+            self.stdout.write(self.style.SUCCESS(f'{len(results)} benchmark(s) gravado(s) em {path}'))
+            return
+
+        self.stdout.write(f'{"benchmark":<52}{"queries":>9}{"memória (KB)":>14}{"tempo (ms)":>12}  resultado')
+        failed = 0
+        for name, result in results.items():
+            expected = baseline['benchmarks'].get(name)
+            if expected is None:
+                status = self.style.WARNING('sem baseline')
+            else:
+                found = benchmarks.regressions(result, expected, options['tolerancia'], options['tolerancia_memoria'])
+                failed += bool(found)
+                status = self.style.ERROR('; '.join(found)) if found else self.style.SUCCESS('ok')
+            self.stdout.write(
+                f'{name:<52}{result["queries"]:>9}{result["memoria_kb"]:>14.1f}{result["tempo_ms"]:>12.2f}  {status}'
+            )
+        if failed:
+            raise CommandError(f'{failed} benchmark(s) com regressão em relação a {path}')
+
+    # Executa os benchmarks em uma transação desfeita ao final, com um cache
+    # local vazio (o cache da aplicação não é alterado)
+    def run(self, selected, repeticoes):
+        results = {}
+        with override_settings(
+            CACHES={
+                alias: {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': f'benchmark-{alias}'}
+                for alias in settings.CACHES
+            },
+            ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'],
+        ), transaction.atomic():
+            coupons.invalidate()
+            fixtures = benchmarks.fixtures()
+            for bench in selected:
+                results[bench.name] = benchmarks.measure(bench, fixtures, repeticoes)
+            transaction.set_rollback(True)
+        coupons.invalidate()
+        return results
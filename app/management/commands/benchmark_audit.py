@@ -0,0 +1,94 @@
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from app import signals
+from app.models import (
+    Categoria, Marca, Produto, Cliente, Venda, ItemVenda, Pagamento,
+    Carrinho, ItemCarrinho, Log
+)
+
+
+# Estratégia antiga de auditoria: um INSERT na tabela de logs por campo
+def legacy_save_log(instance, changes, action, user_id):
+    for field_name, (old_value, new_value) in changes.items():
+        Log.objects.create(
+            tabela=instance._meta.model_name,
+            objeto=instance.pk,
+            campo=field_name,
+            alteracoes={field_name: [old_value, new_value]},
+            acao=action,
+            usuario_id=user_id
+        )
+
+
+class Command(BaseCommand):
+    help = (
+        'Compara o custo da auditoria por campo (legado) com a auditoria '
+        'agrupada em um registro por save. Todas as escritas são desfeitas ao final.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeticoes', type=int, default=200, help='Quantidade de saves por modelo')
+
+    def handle(self, *args, **options):
+        repeticoes = options['repeticoes']
+
+        with transaction.atomic():
+            fixtures = self.criar_fixtures(repeticoes)
+            # ItemCarrinho é único por (carrinho, produto): cada item usa um produto
+            produtos = iter(fixtures['produtos'])
+            cenarios = [
+                ('ItemCarrinho', lambda: ItemCarrinho(carrinho=fixtures['carrinho'], produto=next(produtos), quantidade=1), 'quantidade'),
+                ('ItemVenda', lambda: ItemVenda(venda=fixtures['venda'], produto=fixtures['produto'], quantidade=1, preco=10), 'quantidade'),
+                ('Pagamento', lambda: Pagamento(venda=fixtures['venda'], valor=10), 'valor'),
+            ]
+
+            self.stdout.write(f'{"modelo":<14}{"estratégia":<12}{"queries":>10}{"logs":>10}{"tempo (s)":>12}')
+            for nome, fabrica, campo in cenarios:
+                for estrategia, save_log in (('por campo', legacy_save_log), ('agrupado', signals.save_log)):
+                    queries, logs, tempo = self.medir(fabrica, campo, save_log, repeticoes)
+                    self.stdout.write(f'{nome:<14}{estrategia:<12}{queries:>10}{logs:>10}{tempo:>12.4f}')
+
+            transaction.set_rollback(True)
+
+    # Um produto por item de carrinho criado (repetições das duas estratégias)
+    def criar_fixtures(self, repeticoes):
+        categoria = Categoria.objects.create(nome='Benchmark', descricao='Benchmark', slug='benchmark-audit')
+        marca = Marca.objects.create(nome='Benchmark', descricao='Benchmark', slug='benchmark-audit')
+        produtos = Produto.objects.bulk_create([
+            Produto(
+                nome=f'Benchmark {n}', descricao='Benchmark', preco=10, fabricacao=date(2024, 1, 1),
+                validade=date(2025, 1, 1), categoria=categoria, marca=marca, slug=f'benchmark-audit-{n}'
+            )
+            for n in range(repeticoes * 2)
+        ])
+        cliente = Cliente.objects.create(nome='Benchmark', email='benchmark@benchmark.com', senha='benchmark')
+        return {
+            'produto': produtos[0],
+            'produtos': produtos,
+            'venda': Venda.objects.create(cliente=cliente),
+            'carrinho': Carrinho.objects.create(cliente=cliente),
+        }
+
+    # Cria e em seguida altera um único campo de cada instância,
+    # contando as queries executadas e os registros de log gerados
+    def medir(self, fabrica, campo, save_log, repeticoes):
+        original = signals.save_log
+        signals.save_log = save_log
+        logs_antes = Log.objects.count()
+        try:
+            with CaptureQueriesContext(connection) as contexto:
+                inicio = time.perf_counter()
+                for _ in range(repeticoes):
+                    instance = fabrica()
+                    instance.save()
+                    setattr(instance, campo, getattr(instance, campo) + 1)
+                    instance.save()
+                tempo = time.perf_counter() - inicio
+        finally:
+            signals.save_log = original
+        return len(contexto.captured_queries), Log.objects.count() - logs_antes, tempo
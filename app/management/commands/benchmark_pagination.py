@@ -0,0 +1,66 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.core.paginator import Paginator
+from django.db import transaction
+
+from app.models import Log
+from app.pagination import KeysetPaginator, KEYSET_ORDERING
+
+
+# Páginas medidas, da primeira até a mais distante
+PAGINAS = [1, 10, 100, 1000, 10000]
+
+
+class Command(BaseCommand):
+    help = (
+        'Compara o tempo de páginas distantes da listagem de logs com OFFSET '
+        '(Paginator do Django) e com cursor (KeysetPaginator). Os logs de '
+        'teste são criados em uma transação desfeita ao final.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--por-pagina', type=int, default=20, help='Linhas por página')
+        parser.add_argument('--repeticoes', type=int, default=5, help='Medições por página (é usada a mediana)')
+
+    def handle(self, *args, **options):
+        por_pagina = options['por_pagina']
+        linhas = max(PAGINAS) * por_pagina
+
+        with transaction.atomic():
+            self.criar_logs(linhas)
+            queryset = Log.objects.order_by(*KEYSET_ORDERING)
+            offset = Paginator(queryset, por_pagina)
+            keyset = KeysetPaginator(queryset, por_pagina)
+
+            self.stdout.write(f'{linhas} logs, {por_pagina} por página')
+            self.stdout.write(f'{"página":>8}{"offset (ms)":>14}{"cursor (ms)":>14}')
+            for pagina in PAGINAS:
+                cursor = self.cursor_da_pagina(keyset, queryset, pagina, por_pagina)
+                tempo_offset = self.medir(lambda: list(offset.page(pagina).object_list), options['repeticoes'])
+                tempo_cursor = self.medir(lambda: keyset.page(cursor).object_list, options['repeticoes'])
+                self.stdout.write(f'{pagina:>8}{tempo_offset * 1000:>14.2f}{tempo_cursor * 1000:>14.2f}')
+
+            transaction.set_rollback(True)
+
+    def criar_logs(self, linhas):
+        Log.objects.bulk_create(
+            (Log(tabela='benchmark', objeto=n, acao='UPDATE') for n in range(linhas)),
+            batch_size=5000,
+        )
+
+    # Cursor que leva à página informada: o da última linha da página anterior
+    # (obtido fora da medição, como se o usuário tivesse navegado até ali)
+    def cursor_da_pagina(self, keyset, queryset, pagina, por_pagina):
+        if pagina == 1:
+            return None
+        anterior = queryset[(pagina - 1) * por_pagina - 1]
+        return keyset.encode_cursor('n', anterior)
+
+    def medir(self, funcao, repeticoes):
+        tempos = []
+        for _ in range(repeticoes):
+            inicio = time.perf_counter()
+            funcao()
+            tempos.append(time.perf_counter() - inicio)
+        return sorted(tempos)[len(tempos) // 2]
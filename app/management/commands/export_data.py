@@ -0,0 +1,48 @@
+import sys
+from datetime import datetime, time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from app import exports
+
+
+class Command(BaseCommand):
+    help = (
+        'Exporta vendas, itens de venda, pagamentos ou logs em CSV ou JSONL, '
+        'em streaming (memória constante), com compactação gzip opcional.'
+    )
+
+    def add_arguments(self, parser):
+        models = sorted(model._meta.model_name for model in exports.EXPORT_FIELDS)
+        parser.add_argument('modelo', choices=models, help='Modelo exportado')
+        parser.add_argument('--formato', choices=sorted(exports.FORMATS), default='csv')
+        parser.add_argument('--gzip', action='store_true', help='Compacta a saída em gzip')
+        parser.add_argument('--saida', help='Arquivo de saída (padrão: saída padrão)')
+        parser.add_argument('--desde', type=self.parse_date, help='Apenas registros criados a partir desta data (AAAA-MM-DD)')
+        parser.add_argument('--ate', type=self.parse_date, help='Apenas registros criados antes desta data (AAAA-MM-DD)')
+
+    def parse_date(self, value):
+        try:
+            day = datetime.strptime(value, '%Y-%m-%d').date()
+        except ValueError:
+            raise CommandError(f'Data inválida: {value}')
+        return timezone.make_aware(datetime.combine(day, time.min))
+
+    def handle(self, *args, **options):
+        model = next(model for model in exports.EXPORT_FIELDS if model._meta.model_name == options['modelo'])
+        queryset = model._default_manager.all()
+        if options['desde']:
+            queryset = queryset.filter(criado_em__gte=options['desde'])
+        if options['ate']:
+            queryset = queryset.filter(criado_em__lt=options['ate'])
+
+        chunks = exports.export_chunks(queryset, options['formato'], options['gzip'])
+        if options['saida']:
+            with open(options['saida'], 'wb') as file:
+                for chunk in chunks:
+                    file.write(chunk)
+        else:
+            for chunk in chunks:
+                sys.stdout.buffer.write(chunk)
+            sys.stdout.buffer.flush()
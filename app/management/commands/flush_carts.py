@@ -0,0 +1,25 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from app import caching, cart
+
+
+class Command(BaseCommand):
+    help = (
+        'Grava no banco, em lotes, os carrinhos alterados no cache (ver cart.py). '
+        'Deve ser agendado em intervalos curtos (ex: cron a cada minuto).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=settings.CART_FLUSH_BATCH_SIZE, help='Carrinhos gravados por vez')
+
+    def handle(self, *args, **options):
+        # Os carrinhos ficam no cache dos processos web: com um cache local,
+        # este processo não veria nenhum carrinho
+        if caching.is_process_local(cart.CACHE_ALIAS):
+            raise CommandError(
+                f'O cache dos carrinhos ({settings.CACHES[cart.CACHE_ALIAS]["BACKEND"]}) pertence a um único processo: '
+                f'configure um cache compartilhado em CACHES["{cart.CACHE_ALIAS}"] (ver settings.py).'
+            )
+        written = cart.flush(options['lote'])
+        self.stdout.write(f'{written} carrinho(s) gravado(s).')
@@ -0,0 +1,183 @@
+import csv
+import gzip
+import json
+from datetime import date
+from decimal import Decimal, InvalidOperation
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils.text import slugify
+
+from app import audit, wishlist
+from app.models import Categoria, Marca, Produto
+
+
+# Produtos gravados por lote (um INSERT ... ON CONFLICT e um log por lote)
+BATCH_SIZE = 5000
+
+# Campos atualizados quando o slug do produto já existe
+UPDATE_FIELDS = ['nome', 'descricao', 'preco', 'fabricacao', 'validade', 'categoria', 'marca', 'ativo', 'modificado_em']
+
+TRUE_VALUES = {'1', 'true', 'sim', 's', 'yes'}
+
+
+# Erro em uma linha do arquivo (a linha é ignorada e a importação continua)
+class RowError(ValueError):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Importa um catálogo de produtos de um arquivo CSV ou JSONL (opcionalmente '
+        '.gz), em lotes: categorias e marcas são resolvidas pelo slug (e criadas '
+        'se não existirem) e os produtos são inseridos ou atualizados pelo slug '
+        'com bulk_create(update_conflicts=True). Cada lote gera um único log.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('arquivo', help='Arquivo .csv, .jsonl, .csv.gz ou .jsonl.gz')
+        parser.add_argument('--lote', type=int, default=BATCH_SIZE, help='Produtos gravados por lote')
+
+    def handle(self, *args, **options):
+        path = Path(options['arquivo'])
+        if not path.exists():
+            raise CommandError(f'Arquivo não encontrado: {path}')
+
+        # Mapas slug -> id em memória, completados à medida que surgem slugs novos
+        self.categorias = dict(Categoria.objects.values_list('slug', 'pk'))
+        self.marcas = dict(Marca.objects.values_list('slug', 'pk'))
+        self.user_id = audit.get_audit_user_id()
+
+        totals = {'criados': 0, 'atualizados': 0, 'erros': 0}
+        batch = []
+        for number, row in enumerate(self.read_rows(path), start=1):
+            try:
+                batch.append(self.parse_row(row))
+            except RowError as error:
+                totals['erros'] += 1
+                self.stderr.write(f'Registro {number}: {error}')
+                continue
+            if len(batch) >= options['lote']:
+                self.save_batch(batch, path.name, totals)
+                batch = []
+        if batch:
+            self.save_batch(batch, path.name, totals)
+
+        self.stdout.write(
+            f'{totals["criados"]} produto(s) criado(s), {totals["atualizados"]} atualizado(s), '
+            f'{totals["erros"]} linha(s) com erro.'
+        )
+
+    # Lê o arquivo linha a linha, sem carregá-lo inteiro em memória
+    def read_rows(self, path):
+        suffixes = path.suffixes
+        compressed = suffixes[-1:] == ['.gz']
+        fmt = (suffixes[-2] if compressed and len(suffixes) > 1 else path.suffix).lstrip('.')
+        if fmt not in ('csv', 'jsonl'):
+            raise CommandError('Formato não suportado: use .csv ou .jsonl (opcionalmente .gz)')
+
+        opener = gzip.open if compressed else open
+        with opener(path, 'rt', encoding='utf-8', newline='') as file:
+            if fmt == 'csv':
+                yield from csv.DictReader(file)
+            else:
+                for line in file:
+                    if line.strip():
+                        yield json.loads(line)
+
+    def parse_row(self, row):
+        def required(name):
+            value = str(row.get(name) or '').strip()
+            if not value:
+                raise RowError(f'campo obrigatório ausente: {name}')
+            return value
+
+        nome = required('nome')
+        preco, fabricacao, validade = required('preco'), required('fabricacao'), required('validade')
+        try:
+            preco = Decimal(preco)
+            fabricacao = date.fromisoformat(fabricacao)
+            validade = date.fromisoformat(validade)
+        except (InvalidOperation, ValueError):
+            raise RowError('preço ou data inválida')
+
+        # O slug identifica o produto no upsert: sem ele, linhas diferentes
+        # (ex: nomes só com símbolos) atualizariam o mesmo produto
+        slug = slugify(row.get('slug') or nome)
+        if not slug:
+            raise RowError('slug vazio: informe um slug ou um nome com letras ou números')
+
+        return {
+            'nome': nome,
+            'slug': slug,
+            'descricao': str(row.get('descricao') or ''),
+            'preco': preco,
+            'fabricacao': fabricacao,
+            'validade': validade,
+            'categoria': (required('categoria'), row.get('categoria_nome')),
+            'marca': (required('marca'), row.get('marca_nome')),
+            'ativo': str(row.get('ativo', '1')).strip().lower() in TRUE_VALUES,
+        }
+
+    # Cria as categorias/marcas cujos slugs ainda não estão no mapa (antes,
+    # relê os slugs do banco, caso tenham sido criados por outro processo)
+    def resolve(self, model, mapping, values):
+        missing = {slug: nome for slug, nome in values if slug not in mapping}
+        if not missing:
+            return
+        mapping.update(model.objects.filter(slug__in=missing).values_list('slug', 'pk'))
+        created = model.objects.bulk_create([
+            model(nome=nome or slug, descricao='', slug=slug)
+            for slug, nome in missing.items() if slug not in mapping
+        ])
+        mapping.update((obj.slug, obj.pk) for obj in created)
+
+    def save_batch(self, rows, filename, totals):
+        # Slugs repetidos no mesmo lote: vale a última linha
+        rows = list({row['slug']: row for row in rows}.values())
+
+        with transaction.atomic():
+            self.resolve(Categoria, self.categorias, [row['categoria'] for row in rows])
+            self.resolve(Marca, self.marcas, [row['marca'] for row in rows])
+
+            # Preço e situação atuais dos produtos que serão atualizados, para
+            # os avisos da lista de desejos (ver wishlist.py)
+            slugs = [row['slug'] for row in rows]
+            existing = {
+                slug: {'preco': preco, 'ativo': ativo}
+                for slug, preco, ativo in Produto.objects.filter(slug__in=slugs).values_list('slug', 'preco', 'ativo')
+            }
+            objs = [
+                Produto(
+                    **{name: value for name, value in row.items() if name not in ('categoria', 'marca')},
+                    categoria_id=self.categorias[row['categoria'][0]],
+                    marca_id=self.marcas[row['marca'][0]],
+                )
+                for row in rows
+            ]
+
+            # O _base_manager não gera um log por produto: o lote inteiro é
+            # registrado em um único log e o sinal de criação em lote mantém
+            # a busca e o cache do catálogo atualizados
+            objs = Produto._base_manager.bulk_create(
+                objs, update_conflicts=True, unique_fields=['slug'], update_fields=UPDATE_FIELDS,
+            )
+            created = [obj.pk for obj in objs if obj.slug not in existing]
+            updated = [obj.pk for obj in objs if obj.slug in existing]
+            audit.write_log(audit.make_batch_log(Produto, 'IMPORT', {
+                'arquivo': filename,
+                'criados': created,
+                'atualizados': updated,
+            }, self.user_id))
+            audit.post_bulk_create.send(sender=Produto, objs=objs, using=Produto.objects.db)
+            wishlist.watch({
+                obj.pk: {
+                    name: [old, getattr(obj, name)]
+                    for name, old in existing[obj.slug].items() if old != getattr(obj, name)
+                }
+                for obj in objs if obj.slug in existing
+            })
+
+        totals['criados'] += len(created)
+        totals['atualizados'] += len(updated)
@@ -0,0 +1,139 @@
+import random
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection
+
+from app import cart, totals
+from app.checkout import CheckoutError, checkout
+from app.models import Categoria, Marca, Produto, Cliente, Venda, Cupom
+
+
+ENDERECO = {'rua': 'Rua A', 'numero': '123', 'bairro': 'Centro', 'cidade': 'São Paulo', 'estado': 'SP', 'cep': '01000-000'}
+
+# Identifica os registros criados pelo teste (removidos ao final)
+PREFIXO = 'carga-checkout'
+
+DEGRADACAO_SQLITE = (
+    'SQLite: não há travas por linha (select_for_update é ignorado) e cada '
+    'transação trava o banco inteiro para escrita (BEGIN IMMEDIATE, ver '
+    'settings.py). Os checkouts são executados um de cada vez e os demais '
+    'esperam na fila: a vazão é a de um único escritor e o p95 cresce com a '
+    'concorrência. Sem o modo IMMEDIATE, transações que leem e depois '
+    'escrevem falham na hora com "database is locked" (são repetidas com '
+    'espera). Use PostgreSQL para medir a concorrência real.'
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Teste de carga do checkout: executa centenas de checkouts concorrentes '
+        '(threads, cada uma com sua conexão) sobre um conjunto pequeno de '
+        'produtos, para provocar disputa pelas mesmas linhas, e confere os '
+        'totais das vendas criadas. Os dados do teste são removidos ao final.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--checkouts', type=int, default=300, help='Quantidade de checkouts')
+        parser.add_argument('--concorrencia', type=int, default=50, help='Checkouts simultâneos (threads)')
+        parser.add_argument('--produtos', type=int, default=10, help='Produtos disputados pelos checkouts')
+        parser.add_argument('--itens', type=int, default=3, help='Produtos por carrinho')
+        parser.add_argument('--tentativas', type=int, default=5, help='Tentativas por checkout em caso de trava/deadlock')
+        parser.add_argument('--cupom', action='store_true', help='Todos os checkouts usam o mesmo cupom')
+        parser.add_argument('--manter', action='store_true', help='Não remove os dados do teste')
+
+    def handle(self, *args, **options):
+        if connection.vendor == 'sqlite':
+            if connection.settings_dict['NAME'] in ('', ':memory:'):
+                raise CommandError('O teste precisa de um banco SQLite em arquivo (as threads usam conexões próprias).')
+            self.stdout.write(self.style.WARNING(DEGRADACAO_SQLITE))
+        if options['itens'] > options['produtos']:
+            raise CommandError('--itens não pode ser maior que --produtos')
+
+        self.options = options
+        self.produtos, self.clientes = self.criar_dados(options)
+        try:
+            inicio = time.perf_counter()
+            with ThreadPoolExecutor(options['concorrencia']) as pool:
+                resultados = list(pool.map(self.executar, range(options['checkouts'])))
+            duracao = time.perf_counter() - inicio
+            self.relatorio(resultados, duracao)
+        finally:
+            if not options['manter']:
+                self.remover_dados()
+
+    def criar_dados(self, options):
+        categoria = Categoria.objects.create(nome=PREFIXO, descricao=PREFIXO, slug=PREFIXO)
+        marca = Marca.objects.create(nome=PREFIXO, descricao=PREFIXO, slug=PREFIXO)
+        produtos = Produto.objects.bulk_create([
+            Produto(
+                nome=f'{PREFIXO} {n}', descricao='', preco=Decimal('9.90') + n, fabricacao=date(2024, 1, 1),
+                validade=date(2030, 1, 1), categoria=categoria, marca=marca, slug=f'{PREFIXO}-{n}',
+            )
+            for n in range(options['produtos'])
+        ])
+        clientes = Cliente.objects.bulk_create([
+            Cliente(nome=f'{PREFIXO} {n}', email=f'{n}@{PREFIXO}.teste', senha='x')
+            for n in range(options['checkouts'])
+        ])
+        if options['cupom']:
+            Cupom.objects.create(codigo=PREFIXO, desconto=Decimal('5.00'))
+        return [produto.pk for produto in produtos], [cliente.pk for cliente in clientes]
+
+    def remover_dados(self):
+        Cliente.objects.filter(email__endswith=f'@{PREFIXO}.teste').delete()
+        Categoria.objects.filter(slug=PREFIXO).delete()
+        Marca.objects.filter(slug=PREFIXO).delete()
+        Cupom.objects.filter(codigo=PREFIXO).delete()
+
+    # Monta o carrinho e fecha o pedido de um cliente. Retorna o resultado,
+    # o tempo do checkout e as tentativas extras.
+    def executar(self, numero):
+        cliente_id = self.clientes[numero]
+        sorteio = random.Random(numero)
+        try:
+            for produto_id in sorteio.sample(self.produtos, self.options['itens']):
+                cart.update(cliente_id, produto_id, sorteio.randint(1, 3))
+
+            cupom = PREFIXO if self.options['cupom'] else None
+            for tentativa in range(self.options['tentativas']):
+                inicio = time.perf_counter()
+                try:
+                    checkout(cliente_id, ENDERECO, cupom=cupom)
+                    return 'ok', time.perf_counter() - inicio, tentativa
+                except OperationalError as erro:
+                    resultado = f'{type(erro).__name__}: {erro}'
+                    time.sleep(0.01 * 2 ** tentativa * (1 + sorteio.random()))
+                except CheckoutError as erro:
+                    return str(erro), time.perf_counter() - inicio, tentativa
+            return resultado, time.perf_counter() - inicio, tentativa
+        finally:
+            connection.close()
+
+    def relatorio(self, resultados, duracao):
+        tempos = sorted(tempo for resultado, tempo, _ in resultados if resultado == 'ok')
+        falhas = Counter(resultado for resultado, _, _ in resultados if resultado != 'ok')
+        repeticoes = sum(tentativas for _, _, tentativas in resultados)
+
+        self.stdout.write(f'{len(tempos)} checkout(s) concluído(s) em {duracao:.2f} s ({len(tempos) / duracao:.1f}/s)')
+        if tempos:
+            def percentil(p):
+                return tempos[min(len(tempos) - 1, int(len(tempos) * p))] * 1000
+            self.stdout.write(f'Tempo: p50 {percentil(0.5):.1f} ms, p95 {percentil(0.95):.1f} ms, máx {tempos[-1] * 1000:.1f} ms')
+        self.stdout.write(f'{repeticoes} tentativa(s) repetida(s) por trava/deadlock')
+        for resultado, quantidade in falhas.most_common():
+            self.stdout.write(self.style.ERROR(f'{quantidade} falha(s): {resultado}'))
+
+        # Confere os totais gravados com os recalculados a partir dos itens
+        vendas = dict(
+            Venda.objects.filter(cliente_id__in=self.clientes)
+            .values_list('pk', 'subtotal')
+        )
+        esperado = totals.compute(list(vendas))
+        divergentes = [pk for pk, subtotal in vendas.items() if subtotal != esperado[pk]['subtotal']]
+        estilo = self.style.ERROR if divergentes or len(vendas) != len(tempos) else self.style.SUCCESS
+        self.stdout.write(estilo(f'{len(vendas)} venda(s) gravada(s), {len(divergentes)} com total divergente'))
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from app import search
+
+
+class Command(BaseCommand):
+    help = (
+        'Reconstrói o índice da busca textual do admin (tabela app_busca) '
+        'para todos os modelos registrados ou apenas para os informados.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('modelos', nargs='*', help='Nomes dos modelos (ex: produto comentario)')
+
+    def handle(self, *args, **options):
+        if not search.is_available():
+            raise CommandError('A busca textual não está disponível neste banco de dados.')
+
+        models = {model._meta.model_name: model for model in search.registered_models()}
+        names = options['modelos'] or list(models)
+        unknown = [name for name in names if name not in models]
+        if unknown:
+            raise CommandError(f'Modelo(s) sem busca textual: {", ".join(unknown)}')
+
+        for name in names:
+            search.rebuild(models[name])
+            self.stdout.write(f'{name}: índice reconstruído')
@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from app import totals
+from app.models import Venda
+
+
+class Command(BaseCommand):
+    help = (
+        'Recalcula, em lotes de vendas, o subtotal, o total e o valor pago a '
+        'partir dos itens e pagamentos e corrige as vendas divergentes.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=totals.CHUNK_SIZE, help='Vendas recalculadas por vez')
+        parser.add_argument('--dry-run', action='store_true', help='Apenas conta as vendas divergentes')
+
+    def handle(self, *args, **options):
+        venda_ids = Venda._base_manager.order_by('pk').values_list('pk', flat=True)
+        chunk, fixed = [], 0
+        for venda_id in venda_ids.iterator(chunk_size=options['lote']):
+            chunk.append(venda_id)
+            if len(chunk) == options['lote']:
+                fixed += self.reconcile(chunk, options['dry_run'])
+                chunk = []
+        if chunk:
+            fixed += self.reconcile(chunk, options['dry_run'])
+
+        action = 'divergentes' if options['dry_run'] else 'corrigidas'
+        self.stdout.write(f'{fixed} venda(s) {action}.')
+
+    # Compara os totais gravados com os recalculados e grava as diferenças
+    def reconcile(self, venda_ids, dry_run):
+        with transaction.atomic():
+            expected = totals.compute(venda_ids)
+            vendas = (
+                Venda._base_manager.select_for_update().filter(pk__in=venda_ids)
+                .values_list('pk', 'subtotal', 'total', 'desconto', 'valor_pago')
+            )
+            wrong = [
+                pk for pk, subtotal, total, desconto, valor_pago in vendas
+                if (subtotal, valor_pago) != (expected[pk]['subtotal'], expected[pk]['valor_pago'])
+                or total != max(subtotal - desconto, 0)
+            ]
+            if not dry_run:
+                for pk in wrong:
+                    Venda._base_manager.filter(pk=pk).update(**expected[pk])
+                totals.apply_discount(wrong)
+        return len(wrong)
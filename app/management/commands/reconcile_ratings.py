@@ -0,0 +1,73 @@
+import math
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from app import ratings
+from app.models import AvaliacaoResumo, Produto
+
+
+FIELDS = ['total', 'soma', 'estrelas_1', 'estrelas_2', 'estrelas_3', 'estrelas_4', 'estrelas_5', 'media']
+
+# Os contadores são comparados exatamente; a média (float) é comparada com
+# tolerância, pois a calculada no banco (signals) e a calculada em Python
+# podem diferir nos últimos dígitos
+COUNT_FIELDS = [name for name in FIELDS if name != 'media']
+
+
+def diverges(resumo, values):
+    if any(getattr(resumo, name) != values[name] for name in COUNT_FIELDS):
+        return True
+    if resumo.media is None or values['media'] is None:
+        return resumo.media != values['media']
+    return not math.isclose(resumo.media, values['media'], rel_tol=1e-9)
+
+
+class Command(BaseCommand):
+    help = (
+        'Recalcula, em lotes de produtos, os resumos das avaliações a partir '
+        'da tabela de avaliações e corrige os que estiverem divergentes.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=ratings.CHUNK_SIZE, help='Produtos recalculados por vez')
+        parser.add_argument('--dry-run', action='store_true', help='Apenas conta os resumos divergentes')
+
+    def handle(self, *args, **options):
+        produto_ids = Produto._base_manager.order_by('pk').values_list('pk', flat=True)
+        chunk, fixed = [], 0
+        for produto_id in produto_ids.iterator(chunk_size=options['lote']):
+            chunk.append(produto_id)
+            if len(chunk) == options['lote']:
+                fixed += self.reconcile(chunk, options['dry_run'])
+                chunk = []
+        if chunk:
+            fixed += self.reconcile(chunk, options['dry_run'])
+
+        action = 'divergentes' if options['dry_run'] else 'corrigidos'
+        self.stdout.write(f'{fixed} resumo(s) {action}.')
+
+    # Compara os resumos gravados com os recalculados e grava as diferenças
+    # (produtos sem avaliações contadas ficam com o resumo zerado)
+    def reconcile(self, produto_ids, dry_run):
+        expected = ratings.compute(produto_ids)
+        empty = dict.fromkeys(FIELDS, 0) | {'media': None}
+
+        with transaction.atomic():
+            existing = AvaliacaoResumo.objects.select_for_update().in_bulk(produto_ids, field_name='produto_id')
+            to_create, to_update = [], []
+            for produto_id in produto_ids:
+                values = expected.get(produto_id, empty)
+                resumo = existing.get(produto_id)
+                if resumo is None:
+                    if values['total']:
+                        to_create.append(AvaliacaoResumo(produto_id=produto_id, **values))
+                elif diverges(resumo, values):
+                    for name in FIELDS:
+                        setattr(resumo, name, values[name])
+                    to_update.append(resumo)
+
+            if not dry_run:
+                AvaliacaoResumo.objects.bulk_create(to_create)
+                AvaliacaoResumo.objects.bulk_update(to_update, FIELDS)
+        return len(to_create) + len(to_update)
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from app import rollups
+
+
+class Command(BaseCommand):
+    help = (
+        'Atualiza os rollups diários de vendas (por produto, categoria e marca) '
+        'e de pagamentos, recalculando apenas os dias alterados desde a última '
+        'execução. Pode ser agendado (ex: cron a cada 5 minutos).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--completo', action='store_true', help='Recalcula todos os dias')
+
+    def handle(self, *args, **options):
+        days = rollups.run(full=options['completo'])
+        if days:
+            self.stdout.write(f'{len(days)} dia(s) recalculado(s): de {days[0]:%d/%m/%Y} a {days[-1]:%d/%m/%Y}.')
+        else:
+            self.stdout.write('Nenhum dia alterado.')
@@ -0,0 +1,398 @@
+import multiprocessing
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from datetime import date, timedelta
+from decimal import Decimal
+from itertools import accumulate
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections, models, transaction
+from django.utils import timezone
+
+from app import catalog
+from app.models import (
+    Categoria, Marca, Produto, Cliente, Venda, ItemVenda, Pagamento, EnderecoEntrega,
+    Avaliacao, Comentario, Cupom, Carrinho, ItemCarrinho, Desejo, ItemDesejo,
+    Notificacao, NotificacoesNaoLidas, Log
+)
+
+
+###########################################################################
+# DADOS SINTÉTICOS PARA TESTES DE CARGA                                   #
+# Gera dados consistentes (todas as chaves estrangeiras existem) em       #
+# volume proporcional a --scale. As tabelas base (categorias, marcas,     #
+# produtos, clientes e cupons) são criadas primeiro; as demais são        #
+# divididas em grupos independentes, que podem ser gerados em processos   #
+# separados. Cada grupo tem o seu próprio gerador aleatório (semente +    #
+# nome do grupo): a mesma semente gera os mesmos dados com qualquer       #
+# número de processos (as datas são relativas ao dia da geração).         #
+# Os registros são criados com _base_manager.bulk_create, em lotes, sem   #
+# auditoria e sem sinais; as tabelas derivadas (resumos das avaliações,   #
+# rollups de vendas e índice da busca) são recalculadas no final.         #
+###########################################################################
+
+
+# Quantidades por unidade de --scale
+VOLUMES = {
+    'clientes': 1000,
+    'produtos': 500,
+    'vendas': 2000,
+    'avaliacoes': 5000,
+    'logs': 20000,
+}
+CATEGORIAS = 20
+MARCAS = 40
+CUPONS = 10
+
+# Proporções dos registros dependentes
+ITENS_POR_VENDA = (1, 5)
+VENDAS_PAGAS = 0.9
+VENDAS_COM_DESCONTO = 0.1
+AVALIACOES_COMENTADAS = 0.3
+CLIENTES_COM_CARRINHO = 0.2
+CLIENTES_COM_DESEJOS = 0.1
+NOTIFICACOES_POR_CLIENTE = (0, 4)
+NOTIFICACOES_LIDAS = 0.6
+
+# Peso das notas de 1 a 5 estrelas
+PESOS_ESTRELAS = [5, 8, 15, 32, 40]
+
+NOMES = ['Ana', 'Bruno', 'Carla', 'Diego', 'Elisa', 'Fábio', 'Gabriela', 'Heitor', 'Isabela', 'João', 'Larissa', 'Marcos', 'Natália', 'Otávio', 'Paula', 'Rafael', 'Sofia', 'Tiago', 'Vitória', 'Yuri']
+SOBRENOMES = ['Silva', 'Santos', 'Oliveira', 'Souza', 'Lima', 'Pereira', 'Costa', 'Rodrigues', 'Almeida', 'Nascimento', 'Carvalho', 'Ribeiro', 'Gomes', 'Martins', 'Rocha']
+PRODUTOS = ['Arroz', 'Feijão', 'Café', 'Açúcar', 'Leite', 'Biscoito', 'Macarrão', 'Azeite', 'Sabonete', 'Shampoo', 'Detergente', 'Suco', 'Chocolate', 'Farinha', 'Molho']
+VARIACOES = ['Tradicional', 'Integral', 'Light', 'Premium', 'Orgânico', 'Zero', 'Extra', 'Especial']
+COMENTARIOS = ['Ótimo produto, recomendo.', 'Chegou antes do prazo.', 'Não gostei da embalagem.', 'Bom custo-benefício.', 'Compraria de novo.', 'Veio diferente da foto.']
+NOTIFICACOES = ['Seu pedido foi enviado.', 'Seu pedido foi entregue.', 'Aproveite as ofertas da semana.', 'Avalie a sua última compra.']
+ENDERECOS = [
+    ('Centro', 'São Paulo', 'SP'), ('Savassi', 'Belo Horizonte', 'MG'), ('Copacabana', 'Rio de Janeiro', 'RJ'),
+    ('Batel', 'Curitiba', 'PR'), ('Moinhos de Vento', 'Porto Alegre', 'RS'), ('Pituba', 'Salvador', 'BA'),
+]
+TABELAS_LOG = ['produto', 'categoria', 'marca', 'cliente', 'venda', 'itemvenda', 'pagamento', 'avaliacao']
+ACOES_LOG = ['CREATE', 'UPDATE', 'UPDATE', 'UPDATE', 'DELETE']
+
+DEGRADACAO_SQLITE = (
+    'SQLite: o banco inteiro é travado para escrita, então os processos '
+    'gravam um de cada vez (o ganho fica na geração dos dados em Python). '
+    'Use PostgreSQL para gravar as tabelas em paralelo.'
+)
+
+
+# Desliga auto_now/auto_now_add dos modelos enquanto o bloco executa, para
+# gravar as datas sorteadas (no passado) em vez da data atual
+@contextmanager
+def explicit_dates(*models_list):
+    fields = [
+        field for model in models_list for field in model._meta.concrete_fields
+        if isinstance(field, models.DateField) and (field.auto_now or field.auto_now_add)
+    ]
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def stamp(model, moment):
+    return {
+        field.name: moment for field in model._meta.concrete_fields
+        if field.name in ('data', 'criado_em', 'modificado_em')
+    }
+
+
+# Momento aleatório nos últimos `dias` dias
+def moment(rng, now, dias):
+    return now - timedelta(seconds=rng.randrange(dias * 86400))
+
+
+def chunks(total, size):
+    for start in range(0, total, size):
+        yield start, min(size, total - start)
+
+
+def create(model, objs, lote):
+    return model._base_manager.bulk_create(objs, batch_size=lote)
+
+
+###########################################################################
+# GRUPOS DE TABELAS DEPENDENTES                                           #
+# Cada grupo recebe o contexto (semente, volumes, pks das tabelas base) e #
+# retorna {tabela: registros criados}. Os produtos mais populares são     #
+# sorteados com mais frequência (cum_weights), como em vendas reais.      #
+###########################################################################
+
+
+def seed_vendas(ctx, rng):
+    created = {'vendas': 0, 'itens de venda': 0, 'pagamentos': 0, 'endereços': 0}
+    produtos, precos, pesos = ctx['produtos'], ctx['precos'], ctx['pesos']
+    for _, size in chunks(ctx['vendas'], ctx['lote']):
+        vendas, itens = [], []
+        for _ in range(size):
+            data = moment(rng, ctx['now'], ctx['dias'])
+            escolhidos = set(rng.choices(produtos, cum_weights=pesos, k=rng.randint(*ITENS_POR_VENDA)))
+            linhas = [(produto_id, rng.randint(1, 5)) for produto_id in sorted(escolhidos)]
+            subtotal = sum(quantidade * precos[produto_id] for produto_id, quantidade in linhas)
+            desconto = min(Decimal(rng.choice([5, 10, 20])), subtotal) if rng.random() < VENDAS_COM_DESCONTO else Decimal('0.00')
+            pago = rng.random() < VENDAS_PAGAS
+            # Os totais já são gravados calculados (os sinais de totals.py não executam)
+            vendas.append(Venda(
+                cliente_id=rng.choice(ctx['clientes']), subtotal=subtotal, desconto=desconto,
+                total=subtotal - desconto, valor_pago=subtotal - desconto if pago else 0, **stamp(Venda, data),
+            ))
+            itens.append((data, linhas, pago))
+
+        with transaction.atomic():
+            vendas = create(Venda, vendas, ctx['lote'])
+            create(ItemVenda, [
+                ItemVenda(venda=venda, produto_id=produto_id, quantidade=quantidade, preco=precos[produto_id], **stamp(ItemVenda, data))
+                for venda, (data, linhas, _) in zip(vendas, itens) for produto_id, quantidade in linhas
+            ], ctx['lote'])
+            pagamentos = create(Pagamento, [
+                Pagamento(venda=venda, valor=venda.total, **stamp(Pagamento, data + timedelta(minutes=rng.randint(1, 120))))
+                for venda, (data, _, pago) in zip(vendas, itens) if pago and venda.total
+            ], ctx['lote'])
+            create(EnderecoEntrega, [
+                EnderecoEntrega(
+                    venda=venda, rua=f'Rua {rng.choice(SOBRENOMES)}', numero=str(rng.randint(1, 2000)),
+                    bairro=bairro, cidade=cidade, estado=estado, cep=f'{rng.randint(10000, 99999)}-{rng.randint(0, 999):03d}',
+                    **stamp(EnderecoEntrega, data),
+                )
+                for venda, (data, _, _) in zip(vendas, itens)
+                for bairro, cidade, estado in [rng.choice(ENDERECOS)]
+            ], ctx['lote'])
+        created['vendas'] += len(vendas)
+        created['itens de venda'] += sum(len(linhas) for _, linhas, _ in itens)
+        created['pagamentos'] += len(pagamentos)
+        created['endereços'] += len(vendas)
+    return created
+
+
+def seed_avaliacoes(ctx, rng):
+    created = {'avaliações': 0, 'comentários': 0}
+    for _, size in chunks(ctx['avaliacoes'], ctx['lote']):
+        avaliacoes = [
+            Avaliacao(
+                produto_id=rng.choices(ctx['produtos'], cum_weights=ctx['pesos'])[0],
+                cliente_id=rng.choice(ctx['clientes']),
+                estrelas=rng.choices(range(1, 6), weights=PESOS_ESTRELAS)[0],
+                **stamp(Avaliacao, moment(rng, ctx['now'], ctx['dias'])),
+            )
+            for _ in range(size)
+        ]
+        with transaction.atomic():
+            avaliacoes = create(Avaliacao, avaliacoes, ctx['lote'])
+            comentarios = create(Comentario, [
+                Comentario(avaliacao=avaliacao, texto=rng.choice(COMENTARIOS), **stamp(Comentario, avaliacao.data))
+                for avaliacao in avaliacoes if rng.random() < AVALIACOES_COMENTADAS
+            ], ctx['lote'])
+        created['avaliações'] += len(avaliacoes)
+        created['comentários'] += len(comentarios)
+    return created
+
+
+def seed_logs(ctx, rng):
+    created = 0
+    for _, size in chunks(ctx['logs'], ctx['lote']):
+        logs = []
+        for _ in range(size):
+            antigo = rng.randint(100, 10000)
+            novo = antigo + rng.randint(-500, 500)
+            logs.append(Log(
+                tabela=rng.choice(TABELAS_LOG), objeto=rng.randint(1, ctx['logs']), campo='preco',
+                alteracoes={'preco': [antigo / 100, novo / 100]}, acao=rng.choice(ACOES_LOG),
+                **stamp(Log, moment(rng, ctx['now'], ctx['dias'])),
+            ))
+        with transaction.atomic():
+            created += len(create(Log, logs, ctx['lote']))
+    return {'logs': created}
+
+
+# Carrinhos, listas de desejos e notificações (com os contadores de não lidas)
+def seed_clientes(ctx, rng):
+    created = {'carrinhos': 0, 'itens de carrinho': 0, 'desejos': 0, 'itens de desejo': 0, 'notificações': 0}
+    for start, size in chunks(len(ctx['clientes']), ctx['lote']):
+        clientes = ctx['clientes'][start:start + size]
+        with transaction.atomic():
+            for model, item_model, fraction, maximo, parent in (
+                (Carrinho, ItemCarrinho, CLIENTES_COM_CARRINHO, 5, 'carrinho'),
+                (Desejo, ItemDesejo, CLIENTES_COM_DESEJOS, 10, 'desejo'),
+            ):
+                datas = [moment(rng, ctx['now'], 30) for _ in clientes]
+                parents = create(model, [
+                    model(cliente_id=cliente_id, **stamp(model, data))
+                    for cliente_id, data in zip(clientes, datas) if rng.random() < fraction
+                ], ctx['lote'])
+                # Produtos sem repetição: ItemCarrinho é único por (carrinho, produto)
+                items = create(item_model, [
+                    item_model(produto_id=produto_id, quantidade=rng.randint(1, 3), **{parent: obj}, **stamp(item_model, obj.criado_em))
+                    for obj in parents
+                    for produto_id in rng.sample(ctx['produtos'], rng.randint(1, min(maximo, len(ctx['produtos']))))
+                ], ctx['lote'])
+                created[f'{parent}s'] += len(parents)
+                created[f'itens de {parent}'] += len(items)
+
+            notificacoes, nao_lidas = [], {}
+            for cliente_id in clientes:
+                for _ in range(rng.randint(*NOTIFICACOES_POR_CLIENTE)):
+                    lida = rng.random() < NOTIFICACOES_LIDAS
+                    notificacoes.append(Notificacao(
+                        cliente_id=cliente_id, texto=rng.choice(NOTIFICACOES), lida=lida,
+                        **stamp(Notificacao, moment(rng, ctx['now'], ctx['dias'])),
+                    ))
+                    if not lida:
+                        nao_lidas[cliente_id] = nao_lidas.get(cliente_id, 0) + 1
+            create(Notificacao, notificacoes, ctx['lote'])
+            # Os clientes são novos: os contadores são criados já com o total
+            NotificacoesNaoLidas.objects.bulk_create([
+                NotificacoesNaoLidas(cliente_id=cliente_id, total=total) for cliente_id, total in nao_lidas.items()
+            ], batch_size=ctx['lote'])
+        created['notificações'] += len(notificacoes)
+    return created
+
+
+# Em ordem decrescente de volume: com menos processos que grupos, o maior
+# grupo não fica para o fim
+GROUPS = {
+    'logs': (seed_logs, [Log]),
+    'vendas': (seed_vendas, [Venda, ItemVenda, Pagamento, EnderecoEntrega]),
+    'avaliacoes': (seed_avaliacoes, [Avaliacao, Comentario]),
+    'clientes': (seed_clientes, [Carrinho, ItemCarrinho, Desejo, ItemDesejo, Notificacao]),
+}
+
+
+# Executa um grupo (no processo atual ou em um processo do pool)
+def run_group(name, ctx):
+    function, group_models = GROUPS[name]
+    inicio = time.perf_counter()
+    with explicit_dates(*group_models):
+        created = function(ctx, random.Random(f'{ctx["seed"]}:{name}'))
+    return name, created, time.perf_counter() - inicio
+
+
+# Os processos não podem herdar as conexões abertas pelo processo principal
+def init_worker():
+    import django
+    django.setup()
+    connections.close_all()
+
+
+class Command(BaseCommand):
+    help = (
+        'Gera dados sintéticos consistentes para testes de carga, em volume '
+        'proporcional a --scale (1 = 1.000 clientes, 500 produtos, 2.000 '
+        'vendas, 5.000 avaliações e 20.000 logs). Os registros são criados em '
+        'lotes, sem auditoria, e as tabelas dependentes podem ser geradas em '
+        'processos paralelos. A mesma semente gera os mesmos dados.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=int, default=1, help='Multiplicador dos volumes')
+        parser.add_argument('--seed', type=int, default=42, help='Semente dos dados (cada semente só pode ser gerada uma vez)')
+        parser.add_argument('--lote', type=int, default=5000, help='Registros por INSERT/transação')
+        parser.add_argument('--processos', type=int, default=1, help='Processos para as tabelas dependentes')
+        parser.add_argument('--dias', type=int, default=365, help='Período das datas geradas (dias até hoje)')
+        parser.add_argument('--sem-derivados', action='store_true', help='Não recalcula resumos, rollups e o índice da busca')
+
+    def handle(self, *args, **options):
+        if options['scale'] < 1 or options['lote'] < 1 or options['processos'] < 1 or options['dias'] < 1:
+            raise CommandError('--scale, --lote, --processos e --dias devem ser maiores que zero')
+        prefixo = f'fake-{options["seed"]}'
+        if Categoria._base_manager.filter(slug__startswith=f'{prefixo}-').exists():
+            raise CommandError(f'Os dados da semente {options["seed"]} já foram gerados (use outra --seed)')
+        if options['processos'] > 1 and connection.vendor == 'sqlite':
+            if connection.settings_dict['NAME'] in ('', ':memory:'):
+                raise CommandError('Vários processos precisam de um banco SQLite em arquivo.')
+            self.stdout.write(self.style.WARNING(DEGRADACAO_SQLITE))
+
+        inicio = time.perf_counter()
+        rng = random.Random(f'{options["seed"]}:base')
+        ctx = {
+            'seed': options['seed'], 'lote': options['lote'], 'dias': options['dias'], 'now': timezone.now(),
+            **{name: volume * options['scale'] for name, volume in VOLUMES.items()},
+        }
+        ctx.update(self.seed_base(ctx, rng, prefixo))
+
+        names = list(GROUPS)
+        if options['processos'] > 1:
+            connections.close_all()
+            context = multiprocessing.get_context('fork' if 'fork' in multiprocessing.get_all_start_methods() else 'spawn')
+            with ProcessPoolExecutor(min(options['processos'], len(names)), mp_context=context, initializer=init_worker) as pool:
+                results = list(pool.map(run_group, names, [ctx] * len(names)))
+        else:
+            results = [run_group(name, ctx) for name in names]
+
+        for name, created, duracao in results:
+            resumo = ', '.join(f'{quantidade} {tabela}' for tabela, quantidade in created.items())
+            self.stdout.write(f'{name}: {resumo} ({duracao:.1f} s)')
+
+        if not options['sem_derivados']:
+            self.rebuild_derived()
+        self.stdout.write(self.style.SUCCESS(f'Dados da semente {options["seed"]} gerados em {time.perf_counter() - inicio:.1f} s'))
+
+    # Tabelas base, no processo principal: retorna as pks e os preços usados
+    # pelos grupos
+    def seed_base(self, ctx, rng, prefixo):
+        now, lote = ctx['now'], ctx['lote']
+        with transaction.atomic(), explicit_dates(Categoria, Marca, Produto, Cliente, Cupom):
+            categorias = create(Categoria, [
+                Categoria(nome=f'Categoria {n}', descricao=f'Categoria {n}', slug=f'{prefixo}-categoria-{n}', **stamp(Categoria, now))
+                for n in range(CATEGORIAS)
+            ], lote)
+            marcas = create(Marca, [
+                Marca(nome=f'Marca {n}', descricao=f'Marca {n}', slug=f'{prefixo}-marca-{n}', **stamp(Marca, now))
+                for n in range(MARCAS)
+            ], lote)
+            produtos = []
+            for n in range(ctx['produtos']):
+                fabricacao = date.today() - timedelta(days=rng.randrange(365))
+                produtos.append(Produto(
+                    nome=f'{rng.choice(PRODUTOS)} {rng.choice(VARIACOES)} {n}', descricao='Produto gerado para testes de carga',
+                    # Preços concentrados entre R$ 5 e R$ 50, com alguns bem mais caros
+                    preco=Decimal(f'{min(rng.lognormvariate(3, 0.8), 5000) + 1:.2f}'),
+                    fabricacao=fabricacao, validade=fabricacao + timedelta(days=rng.randint(90, 1095)),
+                    categoria=rng.choice(categorias), marca=rng.choice(marcas), slug=f'{prefixo}-produto-{n}',
+                    **stamp(Produto, moment(rng, now, ctx['dias'])),
+                ))
+            produtos = create(Produto, produtos, lote)
+            clientes = create(Cliente, [
+                Cliente(
+                    nome=f'{rng.choice(NOMES)} {rng.choice(SOBRENOMES)}', email=f'cliente{n}@{prefixo}.teste',
+                    senha='!', **stamp(Cliente, moment(rng, now, ctx['dias'])),
+                )
+                for n in range(ctx['clientes'])
+            ], lote)
+            create(Cupom, [
+                Cupom(codigo=f'{prefixo}-{n}', desconto=Decimal(rng.choice([5, 10, 15, 20])), **stamp(Cupom, now))
+                for n in range(CUPONS)
+            ], lote)
+
+        # Popularidade dos produtos (Zipf): o primeiro é o mais vendido
+        pesos = list(accumulate(1 / (n + 1) ** 0.8 for n in range(len(produtos))))
+        self.stdout.write(
+            f'base: {len(categorias)} categorias, {len(marcas)} marcas, {len(produtos)} produtos, '
+            f'{len(clientes)} clientes, {CUPONS} cupons'
+        )
+        for model, objs in ((Categoria, categorias), (Marca, marcas), (Produto, produtos)):
+            catalog.invalidate(model, dict.fromkeys(obj.pk for obj in objs))
+        return {
+            'produtos': [produto.pk for produto in produtos],
+            'precos': {produto.pk: produto.preco for produto in produtos},
+            'pesos': pesos,
+            'clientes': [cliente.pk for cliente in clientes],
+        }
+
+    # Recalcula as tabelas mantidas pelos sinais (que não executaram)
+    def rebuild_derived(self):
+        inicio = time.perf_counter()
+        call_command('reconcile_ratings', stdout=self.stdout)
+        call_command('rollup_sales', '--completo', stdout=self.stdout)
+        try:
+            call_command('rebuild_search_index', stdout=self.stdout)
+        except CommandError as erro:
+            self.stdout.write(self.style.WARNING(str(erro)))
+        self.stdout.write(f'Tabelas derivadas recalculadas em {time.perf_counter() - inicio:.1f} s')
@@ -0,0 +1,24 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from app import notifications
+from app.models import Campanha
+
+
+class Command(BaseCommand):
+    help = (
+        'Envia uma campanha a todos os clientes ativos, em lotes de notificações '
+        'criadas com bulk_create. Um envio interrompido continua do último lote '
+        'gravado quando o comando é executado de novo.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('campanha', type=int, help='Id da campanha')
+        parser.add_argument('--lote', type=int, default=settings.NOTIFICATION_BATCH_SIZE, help='Notificações criadas por lote')
+
+    def handle(self, *args, **options):
+        campanha = Campanha.objects.filter(pk=options['campanha'], ativo=True).first()
+        if campanha is None:
+            raise CommandError(f'Campanha ativa não encontrada: {options["campanha"]}')
+        sent = notifications.send_campaign(campanha, options['lote'])
+        self.stdout.write(f'{sent} notificação(ões) enviada(s).')
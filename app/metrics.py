@@ -0,0 +1,198 @@
+import re
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter, defaultdict
+
+from django.conf import settings
+
+
+###########################################################################
+# MÉTRICAS DAS REQUISIÇÕES (FORMATO TEXTO DO PROMETHEUS)                  #
+# O middleware RequestMetricsMiddleware registra a duração e o status de  #
+# todas as requisições. Apenas uma amostra (METRICS_SAMPLE_RATE) tem as   #
+# queries interceptadas (execute_wrapper): quantidade, tempo no banco e   #
+# queries repetidas na mesma requisição (assinatura de N+1). As métricas  #
+# ficam na memória de cada processo e são expostas em /metrics; com       #
+# vários processos (ex: gunicorn), cada um expõe apenas as suas.          #
+###########################################################################
+
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+# Nome: (tipo, descrição, limites dos buckets dos histogramas)
+METRICS = {
+    'app_http_requests_total': ('counter', 'Requisições por view, método e status', None),
+    'app_http_request_duration_seconds': ('histogram', 'Duração das requisições por view', DURATION_BUCKETS),
+    'app_db_queries_per_request': ('histogram', 'Queries por requisição (amostra)', QUERY_BUCKETS),
+    'app_db_time_seconds': ('histogram', 'Tempo no banco por requisição (amostra)', DURATION_BUCKETS),
+    'app_db_duplicate_queries_total': ('counter', 'Queries repetidas nas requisições da amostra, por assinatura', None),
+}
+
+# Assinaturas de queries repetidas mantidas como labels (as demais são
+# somadas em OTHER) e tamanho máximo de cada uma
+MAX_SIGNATURES = 100
+SIGNATURE_LENGTH = 200
+OTHER = 'outras'
+
+_lock = threading.Lock()
+_counters = defaultdict(int)
+_histograms = {}
+_signatures = set()
+
+
+# Intercepta as queries de uma requisição da amostra (ver
+# connection.execute_wrapper)
+class QueryRecorder:
+
+    def __init__(self):
+        self.count = 0
+        self.time = 0.0
+        self.statements = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.time += time.perf_counter() - start
+            self.count += 1
+            self.statements[sql] += 1
+
+    # Assinaturas executadas ao menos METRICS_DUPLICATE_THRESHOLD vezes e
+    # quantas execuções passaram da primeira ({assinatura: repetições})
+    def duplicates(self):
+        signatures = Counter()
+        for sql, executed in self.statements.items():
+            signatures[signature(sql)] += executed
+        return {
+            sql: executed - 1 for sql, executed in signatures.items()
+            if executed >= settings.METRICS_DUPLICATE_THRESHOLD
+        }
+
+
+# SQL sem a lista de colunas do SELECT e sem a quantidade de parâmetros das
+# listas (IN (%s, %s, ...)), para que a mesma consulta com listas de
+# tamanhos diferentes tenha uma assinatura (e o label mostre o WHERE)
+def signature(sql):
+    sql = re.sub(r'^SELECT .+? FROM ', 'SELECT ... FROM ', sql, flags=re.DOTALL)
+    return re.sub(r'%s(?:, %s)+', '%s, ...', sql)
+
+
+# /metrics e o cabeçalho Server-Timing (que expõe o tempo no banco e a
+# quantidade de queries) ficam restritos aos IPs de METRICS_ALLOWED_IPS e
+# aos usuários da equipe
+def can_view(request):
+    if request.META.get('REMOTE_ADDR') in settings.METRICS_ALLOWED_IPS:
+        return True
+    user = getattr(request, 'user', None)
+    return user is not None and user.is_staff
+
+
+# Nome da view da requisição (rotas inexistentes e arquivos estáticos não
+# têm view)
+def view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match else '<sem rota>'
+
+
+###########################################################################
+# REGISTRO                                                                #
+###########################################################################
+
+
+def inc(name, labels, value=1):
+    with _lock:
+        _counters[name, labels] += value
+
+
+def observe(name, labels, value):
+    buckets = METRICS[name][2]
+    with _lock:
+        histogram = _histograms.get((name, labels))
+        if histogram is None:
+            histogram = _histograms[name, labels] = [[0] * (len(buckets) + 1), 0.0]
+        histogram[0][bisect_left(buckets, value)] += 1
+        histogram[1] += value
+
+
+def record_request(view, method, status, duration, recorder=None):
+    inc('app_http_requests_total', (('view', view), ('method', method), ('status', str(status))))
+    observe('app_http_request_duration_seconds', (('view', view),), duration)
+    if recorder is None:
+        return
+    observe('app_db_queries_per_request', (('view', view),), recorder.count)
+    observe('app_db_time_seconds', (('view', view),), recorder.time)
+    for sql, repeated in recorder.duplicates().items():
+        inc('app_db_duplicate_queries_total', (('view', view), ('signature', _known_signature(sql))), repeated)
+
+
+def _known_signature(sql):
+    sql = sql[:SIGNATURE_LENGTH]
+    with _lock:
+        if sql not in _signatures and len(_signatures) < MAX_SIGNATURES:
+            _signatures.add(sql)
+        return sql if sql in _signatures else OTHER
+
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+        _signatures.clear()
+
+
+# Valor do cabeçalho Server-Timing (durações em milissegundos)
+def server_timing(duration, recorder=None):
+    timing = f'app;dur={duration * 1000:.1f}'
+    if recorder is not None:
+        description = f'{recorder.count} queries'
+        repeated = sum(recorder.duplicates().values())
+        if repeated:
+            description += f', {repeated} repetidas'
+        timing += f', db;dur={recorder.time * 1000:.1f};desc="{description}"'
+    return timing
+
+
+###########################################################################
+# EXPOSIÇÃO                                                               #
+###########################################################################
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels) + '}'
+
+
+# Métricas no formato texto do Prometheus
+def render():
+    with _lock:
+        counters = dict(_counters)
+        histograms = {key: ([*counts], total) for key, (counts, total) in _histograms.items()}
+
+    lines = []
+    for name, (kind, description, buckets) in METRICS.items():
+        lines += [f'# HELP {name} {description}', f'# TYPE {name} {kind}']
+        if kind == 'counter':
+            for (metric, labels), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(f'{name}{_labels(labels)} {value}')
+            continue
+        for (metric, labels), (counts, total) in sorted(histograms.items()):
+            if metric != name:
+                continue
+            cumulative = 0
+            for bound, count in zip([*buckets, '+Inf'], counts):
+                cumulative += count
+                lines.append(f'{name}_bucket{_labels(labels + (("le", str(bound)),))} {cumulative}')
+            lines.append(f'{name}_sum{_labels(labels)} {total}')
+            lines.append(f'{name}_count{_labels(labels)} {cumulative}')
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,71 @@
+import random
+import time
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+
+from . import metrics
+from .audit import current_user
+
+
+##############################################################################
+# MIDDLEWARES DA APLICAÇÃO (EXECUTADOS EM TODAS AS REQUISIÇÕES E RESPOSTAS) #
+##############################################################################
+
+
+# Disponibiliza o usuário da requisição para os sinais de auditoria, que
+# não recebem a requisição. Deve vir depois do AuthenticationMiddleware.
+# Funciona tanto em WSGI quanto em ASGI.
+class AuditUserMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        token = current_user.set(getattr(request, 'user', None))
+        try:
+            return self.get_response(request)
+        finally:
+            current_user.reset(token)
+
+    async def __acall__(self, request):
+        token = current_user.set(getattr(request, 'user', None))
+        try:
+            return await self.get_response(request)
+        finally:
+            current_user.reset(token)
+
+
+# Métricas de todas as requisições (duração, view e status) e, em uma
+# amostra de METRICS_SAMPLE_RATE, das queries executadas (ver metrics.py).
+# Fora da amostra, o custo é o de medir o tempo e somar os contadores.
+# Deve ser o primeiro middleware, para medir também os demais. Apenas
+# síncrono: o execute_wrapper vale para as conexões da thread atual.
+class RequestMetricsMiddleware:
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        recorder = metrics.QueryRecorder() if random.random() < settings.METRICS_SAMPLE_RATE else None
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            if recorder is not None:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(recorder))
+            response = self.get_response(request)
+        duration = time.perf_counter() - start
+
+        metrics.record_request(metrics.view_name(request), request.method, response.status_code, duration, recorder)
+        if settings.METRICS_SERVER_TIMING and metrics.can_view(request):
+            response['Server-Timing'] = metrics.server_timing(duration, recorder)
+        return response
@@ -0,0 +1,143 @@
+# Generated by Django 5.1.2 on 2026-10-17 00:39
+
+import django.core.serializers.json
+from django.db import migrations, models
+
+
+# Tamanho dos lotes usados para ler e regravar os logs existentes
+BATCH_SIZE = 1000
+
+# Intervalo máximo (em segundos) entre os registros por campo de um mesmo save
+JANELA_SEGUNDOS = 2
+
+
+def _valor(texto):
+    # Os logs antigos gravavam None como a string 'None'
+    return None if texto == 'None' else texto
+
+
+def _nomes(alteracoes):
+    return ', '.join(alteracoes)[:255]
+
+
+# Agrupa os registros antigos (um por campo) em um único registro por save.
+# Registros consecutivos da mesma tabela, objeto, ação e usuário, gravados
+# dentro da janela de tempo, pertencem ao mesmo save.
+def agrupar_logs(apps, schema_editor):
+    Log = apps.get_model('app', 'Log')
+    db = schema_editor.connection.alias
+
+    atualizados = []
+    removidos = []
+    grupo = None
+
+    def fechar(grupo):
+        if grupo is None:
+            return
+        grupo['log'].campo = _nomes(grupo['log'].alteracoes)
+        atualizados.append(grupo['log'])
+
+    logs = Log.objects.using(db).order_by('id').iterator(chunk_size=BATCH_SIZE)
+    for log in logs:
+        chave = (log.tabela, log.objeto, log.acao, log.usuario_id)
+        valores = [_valor(log.valor_antigo), _valor(log.valor_novo)]
+
+        if (
+            grupo is not None
+            and grupo['chave'] == chave
+            and log.campo not in grupo['log'].alteracoes
+            and (log.criado_em - grupo['ultimo']).total_seconds() <= JANELA_SEGUNDOS
+        ):
+            grupo['log'].alteracoes[log.campo] = valores
+            grupo['ultimo'] = log.criado_em
+            removidos.append(log.pk)
+        else:
+            fechar(grupo)
+            log.alteracoes = {log.campo: valores}
+            grupo = {'chave': chave, 'log': log, 'ultimo': log.criado_em}
+
+        if len(atualizados) >= BATCH_SIZE:
+            Log.objects.using(db).bulk_update(atualizados, ['campo', 'alteracoes'])
+            atualizados.clear()
+        if len(removidos) >= BATCH_SIZE:
+            Log.objects.using(db).filter(pk__in=removidos).delete()
+            removidos.clear()
+
+    fechar(grupo)
+    Log.objects.using(db).bulk_update(atualizados, ['campo', 'alteracoes'], batch_size=BATCH_SIZE)
+    Log.objects.using(db).filter(pk__in=removidos).delete()
+
+
+# Operação inversa: desmembra cada registro agrupado em um registro por campo
+def desagrupar_logs(apps, schema_editor):
+    Log = apps.get_model('app', 'Log')
+    db = schema_editor.connection.alias
+
+    novos = []
+    for log in Log.objects.using(db).order_by('id').iterator(chunk_size=BATCH_SIZE):
+        itens = list(log.alteracoes.items())
+        if not itens:
+            continue
+
+        # O próprio registro fica com o primeiro campo, os demais viram novos registros
+        campo, (antigo, novo) = itens[0]
+        Log.objects.using(db).filter(pk=log.pk).update(
+            campo=campo, valor_antigo=str(antigo), valor_novo=str(novo)
+        )
+        for campo, (antigo, novo) in itens[1:]:
+            novos.append(Log(
+                tabela=log.tabela,
+                objeto=log.objeto,
+                campo=campo,
+                valor_antigo=str(antigo),
+                valor_novo=str(novo),
+                acao=log.acao,
+                usuario_id=log.usuario_id,
+            ))
+
+        if len(novos) >= BATCH_SIZE:
+            Log.objects.using(db).bulk_create(novos)
+            novos.clear()
+
+    Log.objects.using(db).bulk_create(novos, batch_size=BATCH_SIZE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='log',
+            name='alteracoes',
+            field=models.JSONField(blank=True, default=dict, encoder=django.core.serializers.json.DjangoJSONEncoder),
+        ),
+        migrations.AlterField(
+            model_name='log',
+            name='campo',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        # Os valores por campo recebem um default para que a migração
+        # possa ser revertida com registros já existentes na tabela
+        migrations.AlterField(
+            model_name='log',
+            name='valor_antigo',
+            field=models.TextField(default=''),
+        ),
+        migrations.AlterField(
+            model_name='log',
+            name='valor_novo',
+            field=models.TextField(default=''),
+        ),
+        migrations.RunPython(agrupar_logs, desagrupar_logs),
+        migrations.RemoveField(
+            model_name='log',
+            name='valor_antigo',
+        ),
+        migrations.RemoveField(
+            model_name='log',
+            name='valor_novo',
+        ),
+    ]
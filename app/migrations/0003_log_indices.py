@@ -0,0 +1,27 @@
+# Generated by Django 5.1.2 on 2026-10-17 00:45
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0002_log_alteracoes_json'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='log',
+            index=models.Index(fields=['criado_em'], name='log_criado_em_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='log',
+            index=models.Index(fields=['tabela', 'criado_em'], name='log_tabela_criado_em_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='log',
+            index=models.Index(fields=['acao', 'criado_em'], name='log_acao_criado_em_idx'),
+        ),
+    ]
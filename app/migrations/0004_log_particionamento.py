@@ -0,0 +1,106 @@
+from datetime import date, datetime, timezone
+
+from django.db import migrations
+
+
+# Quantidade de partições mensais criadas à frente do mês atual
+MESES_A_FRENTE = 2
+
+
+def _proximo_mes(mes):
+    return date(mes.year + mes.month // 12, mes.month % 12 + 1, 1)
+
+
+def _limite(mes):
+    return datetime(mes.year, mes.month, 1, tzinfo=timezone.utc).isoformat()
+
+
+# Converte a tabela app_log em uma tabela particionada por mês (criado_em).
+# Só é executada no PostgreSQL; no SQLite a tabela continua como está.
+# A chave primária passa a ser (id, criado_em), exigência do PostgreSQL
+# para tabelas particionadas; o id continua único por vir de uma sequência
+# nova (app_log_particionado_id_seq, dona da coluna id).
+#
+# O estado das migrações não sabe do particionamento (para o Django, a
+# chave primária ainda é só o id), então o modelo Log não deve ser alterado
+# por migrações comuns geradas pelo makemigrations sem revisão: alterar o id
+# ou a chave primária, criar restrições únicas sem criado_em ou recriar a
+# tabela falham ou desfazem o particionamento. Escreva essas alterações com
+# RunSQL e rode-as no PostgreSQL (ver PartitionLogsMigrationTest). Alterar a
+# nulidade de uma coluna (0009) e criar ou remover índices comuns (0008)
+# funcionam, pois o PostgreSQL os aplica a todas as partições. A reversão
+# não desfaz o particionamento.
+def particionar_logs(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT relkind FROM pg_class WHERE relname = 'app_log'")
+        if cursor.fetchone()[0] == 'p':
+            return
+
+        # Guarda os índices e chaves estrangeiras para recriá-los na nova tabela
+        cursor.execute(
+            """
+            SELECT indexname, indexdef FROM pg_indexes
+            WHERE tablename = 'app_log'
+            AND indexname NOT IN (SELECT conname FROM pg_constraint WHERE contype IN ('p', 'u'))
+            """
+        )
+        indices = cursor.fetchall()
+        cursor.execute(
+            """
+            SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint
+            WHERE conrelid = 'app_log'::regclass AND contype = 'f'
+            """
+        )
+        chaves = cursor.fetchall()
+        cursor.execute("SELECT date_trunc('month', MIN(criado_em))::date, COALESCE(MAX(id), 0) FROM app_log")
+        primeiro_mes, maior_id = cursor.fetchone()
+
+        cursor.execute('ALTER TABLE app_log RENAME TO app_log_legado')
+        cursor.execute('ALTER TABLE app_log_legado DROP CONSTRAINT app_log_pkey')
+        for nome, _ in indices:
+            cursor.execute(f'DROP INDEX "{nome}"')
+
+        cursor.execute(
+            'CREATE TABLE app_log (LIKE app_log_legado INCLUDING DEFAULTS) '
+            'PARTITION BY RANGE (criado_em)'
+        )
+        cursor.execute('CREATE SEQUENCE app_log_particionado_id_seq OWNED BY app_log.id')
+        cursor.execute("SELECT setval('app_log_particionado_id_seq', %s + 1, false)", [maior_id])
+        cursor.execute("ALTER TABLE app_log ALTER COLUMN id SET DEFAULT nextval('app_log_particionado_id_seq')")
+        cursor.execute('ALTER TABLE app_log ADD CONSTRAINT app_log_pkey PRIMARY KEY (id, criado_em)')
+
+        # Uma partição por mês, do log mais antigo até alguns meses à frente,
+        # e uma partição padrão para qualquer data fora desses intervalos
+        mes = primeiro_mes or date.today().replace(day=1)
+        ultimo_mes = date.today().replace(day=1)
+        for _ in range(MESES_A_FRENTE):
+            ultimo_mes = _proximo_mes(ultimo_mes)
+        while mes <= ultimo_mes:
+            cursor.execute(
+                f'CREATE TABLE "app_log_p{mes.year}{mes.month:02d}" PARTITION OF app_log '
+                f"FOR VALUES FROM ('{_limite(mes)}') TO ('{_limite(_proximo_mes(mes))}')"
+            )
+            mes = _proximo_mes(mes)
+        cursor.execute('CREATE TABLE app_log_default PARTITION OF app_log DEFAULT')
+
+        cursor.execute('INSERT INTO app_log SELECT * FROM app_log_legado')
+        cursor.execute('DROP TABLE app_log_legado')
+
+        for _, definicao in indices:
+            cursor.execute(definicao)
+        for nome, definicao in chaves:
+            cursor.execute(f'ALTER TABLE app_log ADD CONSTRAINT "{nome}" {definicao}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0003_log_indices'),
+    ]
+
+    operations = [
+        migrations.RunPython(particionar_logs, migrations.RunPython.noop),
+    ]
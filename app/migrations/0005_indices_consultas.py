@@ -0,0 +1,29 @@
+# Generated by Django 5.1.2 on 2026-10-17 00:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0004_log_particionamento'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='avaliacao',
+            index=models.Index(condition=models.Q(('ativo', True)), fields=['produto', '-data'], name='avaliacao_produto_data_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cupom',
+            index=models.Index(fields=['codigo'], name='cupom_codigo_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='produto',
+            index=models.Index(condition=models.Q(('ativo', True)), fields=['categoria', 'marca'], name='produto_ativo_cat_marca_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='venda',
+            index=models.Index(fields=['cliente', '-data'], name='venda_cliente_data_idx'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+from django.db import migrations
+
+
+# Cria a tabela app_busca usada pela busca textual do admin (ver search.py).
+# No SQLite é uma tabela virtual FTS5 com tokenizer de trigramas; no
+# PostgreSQL, uma tabela comum com índice GIN de trigramas (pg_trgm). Em
+# outros bancos a tabela não é criada e o admin usa a busca padrão.
+def criar_busca(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    with schema_editor.connection.cursor() as cursor:
+        if vendor == 'sqlite':
+            cursor.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS app_busca USING fts5("
+                "tabela UNINDEXED, objeto UNINDEXED, texto, tokenize = 'trigram')"
+            )
+        elif vendor == 'postgresql':
+            cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+            cursor.execute(
+                'CREATE TABLE IF NOT EXISTS app_busca ('
+                'tabela varchar(100) NOT NULL, objeto bigint NOT NULL, texto text NOT NULL, '
+                'PRIMARY KEY (tabela, objeto))'
+            )
+            cursor.execute(
+                'CREATE INDEX IF NOT EXISTS app_busca_texto_trgm_idx '
+                'ON app_busca USING gin (texto gin_trgm_ops)'
+            )
+
+
+def remover_busca(apps, schema_editor):
+    if schema_editor.connection.vendor in ('sqlite', 'postgresql'):
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute('DROP TABLE IF EXISTS app_busca')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0005_indices_consultas'),
+    ]
+
+    operations = [
+        migrations.RunPython(criar_busca, remover_busca),
+    ]
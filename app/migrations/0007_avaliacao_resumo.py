@@ -0,0 +1,56 @@
+# Generated by Django 5.1.2 on 2026-10-17 00:56
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# Calcula os resumos das avaliações já existentes (avaliações ativas com 1 a 5 estrelas)
+def calcular_resumos(apps, schema_editor):
+    Avaliacao = apps.get_model('app', 'Avaliacao')
+    AvaliacaoResumo = apps.get_model('app', 'AvaliacaoResumo')
+    contadas = models.Q(ativo=True, estrelas__gte=1, estrelas__lte=5)
+    linhas = (
+        Avaliacao.objects.filter(contadas)
+        .values('produto_id')
+        .annotate(
+            total=models.Count('pk'),
+            soma=models.Sum('estrelas'),
+            **{f'estrelas_{n}': models.Count('pk', filter=models.Q(estrelas=n)) for n in range(1, 6)},
+        )
+    )
+    AvaliacaoResumo.objects.bulk_create(
+        [AvaliacaoResumo(media=linha['soma'] / linha['total'], **linha) for linha in linhas],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0006_busca_textual'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AvaliacaoResumo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total', models.PositiveIntegerField(default=0)),
+                ('soma', models.PositiveIntegerField(default=0)),
+                ('estrelas_1', models.PositiveIntegerField(default=0)),
+                ('estrelas_2', models.PositiveIntegerField(default=0)),
+                ('estrelas_3', models.PositiveIntegerField(default=0)),
+                ('estrelas_4', models.PositiveIntegerField(default=0)),
+                ('estrelas_5', models.PositiveIntegerField(default=0)),
+                ('media', models.FloatField(blank=True, null=True)),
+                ('modificado_em', models.DateTimeField(auto_now=True)),
+                ('produto', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='resumo_avaliacoes', to='app.produto')),
+            ],
+            options={
+                'verbose_name': 'Resumo de avaliações',
+                'verbose_name_plural': 'Resumos de avaliações',
+                'indexes': [models.Index(fields=['-media', '-total'], name='resumo_media_total_idx')],
+            },
+        ),
+        migrations.RunPython(calcular_resumos, migrations.RunPython.noop),
+    ]
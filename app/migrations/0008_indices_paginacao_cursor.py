@@ -0,0 +1,31 @@
+# Generated by Django 5.1.2 on 2026-10-17 00:58
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0007_avaliacao_resumo'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='log',
+            name='log_criado_em_idx',
+        ),
+        migrations.AddIndex(
+            model_name='log',
+            index=models.Index(fields=['criado_em', 'id'], name='log_criado_em_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='produto',
+            index=models.Index(fields=['criado_em', 'id'], name='produto_criado_em_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='venda',
+            index=models.Index(fields=['criado_em', 'id'], name='venda_criado_em_id_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.2 on 2026-10-17 01:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0008_indices_paginacao_cursor'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='log',
+            name='objeto',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+    ]
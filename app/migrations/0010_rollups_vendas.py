@@ -0,0 +1,137 @@
+# Generated by Django 5.1.2 on 2026-10-17 01:04
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0009_log_objeto_opcional'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PagamentoDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dia', models.DateField(unique=True)),
+                ('quantidade', models.IntegerField(default=0)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+            ],
+            options={
+                'verbose_name': 'Pagamentos do dia',
+                'verbose_name_plural': 'Pagamentos por dia',
+            },
+        ),
+        migrations.CreateModel(
+            name='ProcessamentoRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nome', models.CharField(max_length=100, unique=True)),
+                ('processado_ate', models.DateTimeField(blank=True, null=True)),
+                ('modificado_em', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Processamento de rollup',
+                'verbose_name_plural': 'Processamentos de rollup',
+            },
+        ),
+        migrations.CreateModel(
+            name='RollupPendente',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dia', models.DateField(unique=True)),
+            ],
+            options={
+                'verbose_name': 'Dia pendente de rollup',
+                'verbose_name_plural': 'Dias pendentes de rollup',
+            },
+        ),
+        migrations.CreateModel(
+            name='VendaDiariaCategoria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dia', models.DateField()),
+                ('quantidade', models.IntegerField(default=0)),
+                ('receita', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+            ],
+            options={
+                'verbose_name': 'Venda diária por categoria',
+                'verbose_name_plural': 'Vendas diárias por categoria',
+            },
+        ),
+        migrations.CreateModel(
+            name='VendaDiariaMarca',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dia', models.DateField()),
+                ('quantidade', models.IntegerField(default=0)),
+                ('receita', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+            ],
+            options={
+                'verbose_name': 'Venda diária por marca',
+                'verbose_name_plural': 'Vendas diárias por marca',
+            },
+        ),
+        migrations.CreateModel(
+            name='VendaDiariaProduto',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dia', models.DateField()),
+                ('quantidade', models.IntegerField(default=0)),
+                ('receita', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+            ],
+            options={
+                'verbose_name': 'Venda diária por produto',
+                'verbose_name_plural': 'Vendas diárias por produto',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='itemvenda',
+            index=models.Index(fields=['modificado_em'], name='itemvenda_modificado_em_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pagamento',
+            index=models.Index(fields=['data'], name='pagamento_data_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pagamento',
+            index=models.Index(fields=['modificado_em'], name='pagamento_modificado_em_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='venda',
+            index=models.Index(fields=['data'], name='venda_data_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='venda',
+            index=models.Index(fields=['modificado_em'], name='venda_modificado_em_idx'),
+        ),
+        migrations.AddField(
+            model_name='vendadiariacategoria',
+            name='categoria',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='app.categoria'),
+        ),
+        migrations.AddField(
+            model_name='vendadiariamarca',
+            name='marca',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='app.marca'),
+        ),
+        migrations.AddField(
+            model_name='vendadiariaproduto',
+            name='produto',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='app.produto'),
+        ),
+        migrations.AddConstraint(
+            model_name='vendadiariacategoria',
+            constraint=models.UniqueConstraint(fields=('dia', 'categoria'), name='venda_diaria_categoria_unica'),
+        ),
+        migrations.AddConstraint(
+            model_name='vendadiariamarca',
+            constraint=models.UniqueConstraint(fields=('dia', 'marca'), name='venda_diaria_marca_unica'),
+        ),
+        migrations.AddConstraint(
+            model_name='vendadiariaproduto',
+            constraint=models.UniqueConstraint(fields=('dia', 'produto'), name='venda_diaria_produto_unica'),
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 5.1.2 on 2026-10-17 01:07
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce, Greatest
+
+
+# Calcula os totais das vendas já existentes (itens e pagamentos ativos)
+def calcular_totais(apps, schema_editor):
+    Venda = apps.get_model('app', 'Venda')
+    ItemVenda = apps.get_model('app', 'ItemVenda')
+    Pagamento = apps.get_model('app', 'Pagamento')
+    decimal = models.DecimalField(max_digits=12, decimal_places=2)
+    zero = models.Value(0, output_field=decimal)
+
+    def soma(model, expressao):
+        linhas = (
+            model.objects.filter(venda=models.OuterRef('pk'), ativo=True)
+            .values('venda').annotate(soma=models.Sum(expressao, output_field=decimal)).values('soma')
+        )
+        return Coalesce(models.Subquery(linhas, output_field=decimal), zero)
+
+    Venda.objects.update(
+        subtotal=soma(ItemVenda, models.F('quantidade') * models.F('preco')),
+        valor_pago=soma(Pagamento, models.F('valor')),
+    )
+    Venda.objects.update(total=Greatest(models.F('subtotal') - models.F('desconto'), zero))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0010_rollups_vendas'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='venda',
+            name='desconto',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='venda',
+            name='subtotal',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='venda',
+            name='total',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='venda',
+            name='valor_pago',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=12),
+        ),
+        migrations.RunPython(calcular_totais, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='venda',
+            index=models.Index(condition=models.Q(('ativo', True), ('valor_pago__lt', models.F('total'))), fields=['-data'], name='venda_em_aberto_idx'),
+        ),
+    ]
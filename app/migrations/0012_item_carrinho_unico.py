@@ -0,0 +1,35 @@
+# Generated by Django 5.1.2 on 2026-10-17 01:09
+
+from django.db import migrations, models
+
+
+# Junta os itens repetidos (mesmo produto no mesmo carrinho) antes de criar
+# a restrição: fica o item mais recente, com a soma das quantidades ativas
+def juntar_itens_repetidos(apps, schema_editor):
+    ItemCarrinho = apps.get_model('app', 'ItemCarrinho')
+    repetidos = (
+        ItemCarrinho.objects.values('carrinho_id', 'produto_id')
+        .annotate(itens=models.Count('pk'), ultimo=models.Max('pk'))
+        .filter(itens__gt=1)
+    )
+    for grupo in repetidos.iterator():
+        itens = ItemCarrinho.objects.filter(carrinho_id=grupo['carrinho_id'], produto_id=grupo['produto_id'])
+        ativos = itens.filter(ativo=True).aggregate(soma=models.Sum('quantidade'), itens=models.Count('pk'))
+        if ativos['itens']:
+            itens.filter(pk=grupo['ultimo']).update(quantidade=ativos['soma'], ativo=True)
+        itens.exclude(pk=grupo['ultimo']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0011_totais_venda'),
+    ]
+
+    operations = [
+        migrations.RunPython(juntar_itens_repetidos, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='itemcarrinho',
+            constraint=models.UniqueConstraint(fields=('carrinho', 'produto'), name='item_carrinho_produto_unico'),
+        ),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 5.1.2 on 2026-10-17 01:13
+
+import django.db.models.functions.text
+from django.db import migrations, models
+from django.db.models.functions import Lower
+
+
+# Códigos repetidos (sem diferenciar maiúsculas e minúsculas): o cupom mais
+# antigo mantém o código e os demais recebem o id como sufixo
+def renomear_codigos_repetidos(apps, schema_editor):
+    Cupom = apps.get_model('app', 'Cupom')
+    repetidos = (
+        Cupom.objects.annotate(normalizado=Lower('codigo')).values('normalizado')
+        .annotate(cupons=models.Count('pk')).filter(cupons__gt=1).values_list('normalizado', flat=True)
+    )
+    for codigo in list(repetidos):
+        cupons = Cupom.objects.annotate(normalizado=Lower('codigo')).filter(normalizado=codigo).order_by('pk')
+        for cupom in list(cupons)[1:]:
+            Cupom.objects.filter(pk=cupom.pk).update(codigo=f'{cupom.codigo}-{cupom.pk}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0012_item_carrinho_unico'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='cupom',
+            name='cupom_codigo_idx',
+        ),
+        migrations.AddField(
+            model_name='cupom',
+            name='limite_usos',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='cupom',
+            name='usos',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='cupom',
+            name='valido_ate',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='cupom',
+            name='valido_de',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(renomear_codigos_repetidos, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='cupom',
+            constraint=models.UniqueConstraint(django.db.models.functions.text.Lower('codigo'), name='cupom_codigo_unico'),
+        ),
+    ]
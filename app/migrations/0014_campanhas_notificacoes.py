@@ -0,0 +1,74 @@
+# Generated by Django 5.1.2 on 2026-10-17 01:15
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# Calcula os contadores a partir das notificações já existentes (todas
+# ficam como não lidas)
+def calcular_contadores(apps, schema_editor):
+    Notificacao = apps.get_model('app', 'Notificacao')
+    NotificacoesNaoLidas = apps.get_model('app', 'NotificacoesNaoLidas')
+    linhas = (
+        Notificacao.objects.filter(ativo=True, lida=False)
+        .values('cliente_id').annotate(total=models.Count('pk'))
+    )
+    NotificacoesNaoLidas.objects.bulk_create(
+        [NotificacoesNaoLidas(**linha) for linha in linhas],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0013_cupom_validade_usos'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Campanha',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nome', models.CharField(max_length=255)),
+                ('texto', models.TextField()),
+                ('destinatarios', models.PositiveIntegerField(default=0, editable=False)),
+                ('ultimo_cliente', models.PositiveBigIntegerField(blank=True, editable=False, null=True)),
+                ('enviada_em', models.DateTimeField(blank=True, editable=False, null=True)),
+                ('ativo', models.BooleanField(default=True)),
+                ('criado_em', models.DateTimeField(auto_now_add=True)),
+                ('modificado_em', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Campanha',
+                'verbose_name_plural': 'Campanhas',
+            },
+        ),
+        migrations.CreateModel(
+            name='NotificacoesNaoLidas',
+            fields=[
+                ('cliente', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='notificacoes_nao_lidas', serialize=False, to='app.cliente')),
+                ('total', models.PositiveIntegerField(default=0)),
+                ('modificado_em', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Notificações não lidas',
+                'verbose_name_plural': 'Notificações não lidas',
+            },
+        ),
+        migrations.AddField(
+            model_name='notificacao',
+            name='lida',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='notificacao',
+            name='campanha',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='app.campanha'),
+        ),
+        migrations.AddIndex(
+            model_name='notificacao',
+            index=models.Index(condition=models.Q(('ativo', True), ('lida', False)), fields=['cliente', '-data'], name='notificacao_nao_lida_idx'),
+        ),
+        migrations.RunPython(calcular_contadores, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.1.2 on 2026-10-17 01:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0014_campanhas_notificacoes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='itemdesejo',
+            index=models.Index(condition=models.Q(('ativo', True)), fields=['produto', 'desejo'], name='item_desejo_produto_idx'),
+        ),
+    ]
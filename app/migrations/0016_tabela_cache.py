@@ -0,0 +1,20 @@
+from django.core.management import call_command
+from django.db import migrations
+
+
+# Cria a tabela do DatabaseCache (CACHES em settings.py) junto com as demais
+# tabelas: os objetos padrão criados após o migrate já usam o cache. Não faz
+# nada com outros backends de cache e ignora tabelas que já existem.
+def create_cache_table(apps, schema_editor):
+    call_command('createcachetable', database=schema_editor.connection.alias, verbosity=0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0015_indice_item_desejo_produto'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_cache_table, migrations.RunPython.noop),
+    ]
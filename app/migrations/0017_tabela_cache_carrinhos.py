@@ -0,0 +1,20 @@
+from django.core.management import call_command
+from django.db import migrations
+
+
+# Cria a tabela do cache dos carrinhos (CACHES['carrinhos'] em settings.py)
+# nos bancos já migrados até a 0016. Como na 0016, não faz nada com outros
+# backends de cache e ignora tabelas que já existem.
+def create_cache_table(apps, schema_editor):
+    call_command('createcachetable', database=schema_editor.connection.alias, verbosity=0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0016_tabela_cache'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_cache_table, migrations.RunPython.noop),
+    ]
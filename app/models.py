@@ -1,5 +1,10 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import DEFERRED
+from django.db.models.functions import Lower
 from django.contrib.auth.models import User
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+from . import audit
 
 
 ###################################################################
@@ -7,8 +12,232 @@ from django.contrib.auth.models import User
 ###################################################################
 
 
+# Quantidade máxima de ids por consulta nas operações em lote
+BULK_CHUNK_SIZE = 1000
+
+
+# QuerySet que audita as operações em lote (update, bulk_create, bulk_update
+# e delete), que não disparam os sinais de save. Os valores antigos e novos
+# são lidos com uma consulta por lote e os logs são gravados com bulk_create,
+# em vez de uma consulta e um INSERT por linha.
+class AuditQuerySet(models.QuerySet):
+
+    def update(self, **kwargs):
+        fields = [self.model._meta.get_field(name) for name in kwargs]
+        attnames = [field.attname for field in fields]
+
+        # Nos modelos com touch_on_update (ver SnapshotMixin), os campos
+        # auto_now (modificado_em) também são atualizados em lote
+        if getattr(self.model, 'touch_on_update', False):
+            for field in self.model._meta.concrete_fields:
+                if getattr(field, 'auto_now', False) and field.name not in kwargs:
+                    kwargs[field.name] = timezone.now()
+
+        # Apenas os pks são lidos de uma vez: os valores antigos e os novos
+        # são lidos em lotes de pks
+        with transaction.atomic(using=self.db, savepoint=False):
+            pks = list(self.values_list('pk', flat=True))
+            old_rows = self._fetch_values(pks, attnames)
+            rows = super().update(**kwargs)
+            new_rows = self._fetch_values(pks, attnames)
+            changes = self._diff(fields, old_rows, new_rows)
+            self._log(changes, 'UPDATE')
+            audit.post_bulk_update.send(sender=self.model, changes=changes, using=self.db)
+        return rows
+
+    update.alters_data = True
+
+    def bulk_create(self, objs, batch_size=None, ignore_conflicts=False,
+                    update_conflicts=False, update_fields=None, unique_fields=None):
+        fields = self.model._meta.concrete_fields
+
+        with transaction.atomic(using=self.db, savepoint=False):
+            objs = super().bulk_create(
+                objs, batch_size=batch_size, ignore_conflicts=ignore_conflicts,
+                update_conflicts=update_conflicts, update_fields=update_fields,
+                unique_fields=unique_fields,
+            )
+            # Objetos ignorados por conflito ficam sem pk e não são registrados
+            changes = {
+                obj.pk: {field.name: [None, field.value_from_object(obj)] for field in fields}
+                for obj in objs if obj.pk is not None
+            }
+            for obj in objs:
+                obj._update_snapshot()
+            self._log(changes, 'UPSERT' if update_conflicts else 'CREATE')
+            audit.post_bulk_create.send(sender=self.model, objs=objs, using=self.db)
+        return objs
+
+    def bulk_update(self, objs, fields, batch_size=None):
+        objs = list(objs)
+        model_fields = [self.model._meta.get_field(name) for name in fields]
+        attnames = [field.attname for field in model_fields]
+
+        with transaction.atomic(using=self.db, savepoint=False):
+            old_rows = self._fetch_values([obj.pk for obj in objs], attnames)
+            rows = super().bulk_update(objs, fields, batch_size=batch_size)
+            new_rows = {
+                obj.pk: tuple(field.value_from_object(obj) for field in model_fields)
+                for obj in objs
+            }
+            changes = self._diff(model_fields, old_rows, new_rows)
+            for obj in objs:
+                obj._update_snapshot(fields)
+            self._log(changes, 'UPDATE')
+            audit.post_bulk_update.send(sender=self.model, changes=changes, using=self.db)
+        return rows
+
+    # Exclusões (inclusive em cascata) disparam pre_delete por linha;
+    # os logs dessas linhas são acumulados e gravados de uma vez
+    def delete(self):
+        with audit.batched_logs(), audit.deleting():
+            return super().delete()
+
+    delete.alters_data = True
+    delete.queryset_only = True
+
+    # Lê os valores dos campos para uma lista de pks, em lotes
+    def _fetch_values(self, pks, attnames):
+        manager = self.model._base_manager.using(self.db)
+        values = {}
+        for start in range(0, len(pks), BULK_CHUNK_SIZE):
+            chunk = pks[start:start + BULK_CHUNK_SIZE]
+            for row in manager.filter(pk__in=chunk).values_list('pk', *attnames):
+                values[row[0]] = row[1:]
+        return values
+
+    @staticmethod
+    def _diff(fields, old_rows, new_rows):
+        changes = {}
+        for pk, old_values in old_rows.items():
+            new_values = new_rows.get(pk)
+            if new_values is None:
+                continue
+            diff = {
+                field.name: [old_value, new_value]
+                for field, old_value, new_value in zip(fields, old_values, new_values)
+                if old_value != new_value
+            }
+            if diff:
+                changes[pk] = diff
+        return changes
+
+    def _log(self, changes, action):
+        if not changes:
+            return
+        user_id = audit.get_audit_user_id()
+        audit.write_logs([
+            audit.make_log(self.model, pk, diff, action, user_id)
+            for pk, diff in changes.items()
+        ])
+
+
+# Classe base que guarda os valores originais dos campos quando o objeto
+# é carregado do banco (from_db). O snapshot é uma tupla alinhada com
+# _meta.concrete_fields, o que permite detectar os campos alterados em
+# memória, sem consultar o banco antes de cada save.
+class SnapshotMixin(models.Model):
+
+    objects = AuditQuerySet.as_manager()
+
+    class Meta:
+        abstract = True
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._snapshot = instance._snapshot_values()
+        return instance
+
+    # Valores atuais dos campos concretos (DEFERRED para campos não carregados)
+    def _snapshot_values(self):
+        return tuple(
+            self.__dict__.get(field.attname, DEFERRED)
+            for field in self._meta.concrete_fields
+        )
+
+    # Retorna os campos alterados desde o carregamento, no formato
+    # {campo: [valor_antigo, valor_novo]}. Os valores originais só são
+    # buscados no banco quando não estão no snapshot (objeto que não veio
+    # do banco ou campo adiado). Retorna None se o objeto não existe no banco.
+    def get_changes(self):
+        fields = self._meta.concrete_fields
+        snapshot = self.__dict__.get('_snapshot') or (DEFERRED,) * len(fields)
+        current = self._snapshot_values()
+
+        missing = [
+            field.attname
+            for field, old_value, new_value in zip(fields, snapshot, current)
+            if old_value is DEFERRED and new_value is not DEFERRED
+        ]
+        if missing:
+            row = type(self)._base_manager.using(self._state.db).filter(pk=self.pk).values(*missing).first()
+            if row is None:
+                return None
+            snapshot = tuple(
+                row[field.attname] if old_value is DEFERRED and field.attname in row else old_value
+                for field, old_value in zip(fields, snapshot)
+            )
+
+        return {
+            field.name: [old_value, new_value]
+            for field, old_value, new_value in zip(fields, snapshot, current)
+            if old_value is not DEFERRED and new_value is not DEFERRED and old_value != new_value
+        }
+
+    # Campos alterados apenas direto no banco, com F() (ex: totais e
+    # contadores). Os valores em memória podem estar desatualizados: ao
+    # atualizar um objeto existente, esses campos não são regravados. Os
+    # campos adiados (only/defer) também ficam de fora, como no save padrão
+    # do Django, para não serem carregados um a um só para serem regravados.
+    maintained_fields = ()
+
+    # Se o QuerySet.update auditado também atualiza os campos auto_now
+    # (modificado_em), como o save. Nos demais modelos, o update altera
+    # apenas os campos informados, como no Django.
+    touch_on_update = False
+
+    def save(self, *args, update_fields=None, **kwargs):
+        if update_fields is None and self.maintained_fields and not self._state.adding:
+            deferred = self.get_deferred_fields()
+            update_fields = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.maintained_fields
+                and field.attname not in deferred
+            ]
+        super().save(*args, update_fields=update_fields, **kwargs)
+
+    # Após salvar, os valores gravados passam a ser os valores originais
+    def save_base(self, *args, update_fields=None, **kwargs):
+        super().save_base(*args, update_fields=update_fields, **kwargs)
+        self._update_snapshot(update_fields)
+
+    # Os logs de uma exclusão em cascata são gravados de uma só vez
+    def delete(self, *args, **kwargs):
+        with audit.batched_logs(), audit.deleting():
+            return super().delete(*args, **kwargs)
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+        self._update_snapshot(fields)
+
+    def _update_snapshot(self, names=None):
+        fields = self._meta.concrete_fields
+        current = self._snapshot_values()
+        if names is None:
+            self._snapshot = current
+            return
+
+        names = set(names)
+        snapshot = self.__dict__.get('_snapshot') or (DEFERRED,) * len(fields)
+        self._snapshot = tuple(
+            new_value if field.name in names or field.attname in names else old_value
+            for field, old_value, new_value in zip(fields, snapshot, current)
+        )
+
+
 # Categoria de produtos (ex: cabelo, pele, maquiagem)
-class Categoria(models.Model):
+class Categoria(SnapshotMixin):
     nome = models.CharField(max_length=255)
     descricao = models.TextField()
     ativo = models.BooleanField(default=True) # Campo que indica se a categoria está ativa ou não
@@ -21,6 +250,14 @@ class Categoria(models.Model):
         verbose_name = 'Categoria'
         verbose_name_plural = 'Categorias'
 
+    # Campos usados pelo __str__ (o admin usa essa lista para montar
+    # select_related/only e evitar uma consulta por linha exibida)
+    str_fields = ['nome']
+
+    # Campos de busca do admin. Se todos forem de texto, formam o documento
+    # da busca textual, registrado em AppConfig.ready (ver search.py)
+    search_fields = ['nome', 'slug']
+
     # Método que retorna o nome da categoria
     def __str__(self):
         return self.nome
@@ -38,7 +275,7 @@ class Categoria(models.Model):
 
 
 # Marca de produtos (ex: Natura, Avon, O Boticário)
-class Marca(models.Model):
+class Marca(SnapshotMixin):
     nome = models.CharField(max_length=255)
     descricao = models.TextField()
     ativo = models.BooleanField(default=True)
@@ -50,6 +287,9 @@ class Marca(models.Model):
         verbose_name = 'Marca'
         verbose_name_plural = 'Marcas'
 
+    str_fields = ['nome']
+    search_fields = ['nome', 'slug']
+
     def __str__(self):
         return self.nome
     
@@ -64,7 +304,7 @@ class Marca(models.Model):
     
 
 # Produto (ex: shampoo, condicionador, batom, base)
-class Produto(models.Model):
+class Produto(SnapshotMixin):
     nome = models.CharField(max_length=255)
     descricao = models.TextField()
     preco = models.DecimalField(max_digits=10, decimal_places=2)
@@ -80,6 +320,15 @@ class Produto(models.Model):
     class Meta:
         verbose_name = 'Produto'
         verbose_name_plural = 'Produtos'
+        indexes = [
+            # Listagem de produtos ativos por categoria (e marca)
+            models.Index(fields=['categoria', 'marca'], condition=models.Q(ativo=True), name='produto_ativo_cat_marca_idx'),
+            # Paginação por cursor (ver KeysetPaginator)
+            models.Index(fields=['criado_em', 'id'], name='produto_criado_em_id_idx'),
+        ]
+
+    str_fields = ['nome']
+    search_fields = ['nome', 'slug', 'marca__nome', 'categoria__nome']
 
     def __str__(self):
         return self.nome
@@ -102,7 +351,7 @@ class Produto(models.Model):
 # Cliente (ex: Maria, João, Ana)
 # Obs: Este modelo será usado futuramente para autenticação
 # e deverá ser melhor trabalhado depois
-class Cliente(models.Model):
+class Cliente(SnapshotMixin):
     nome = models.CharField(max_length=255)
     email = models.EmailField()
     cpf = models.CharField(max_length=14, unique=True, blank=True, null=True) # CPF é único e opcional
@@ -115,6 +364,9 @@ class Cliente(models.Model):
         verbose_name = 'Cliente'
         verbose_name_plural = 'Clientes'
 
+    str_fields = ['nome']
+    search_fields = ['nome', 'email', 'cpf']
+
     def __str__(self):
         return self.nome
     
@@ -131,16 +383,44 @@ class Cliente(models.Model):
 
 
 # Venda (ex: venda de 3 shampoos, 2 condicionadores e 1 batom para Maria)
-class Venda(models.Model):
+class Venda(SnapshotMixin):
     cliente = models.ForeignKey(Cliente, on_delete=models.CASCADE)
     data = models.DateTimeField(auto_now_add=True)
+    # Totais mantidos a partir dos itens e pagamentos (ver totals.py)
+    subtotal = models.DecimalField(max_digits=12, decimal_places=2, default=0, editable=False)
+    desconto = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    total = models.DecimalField(max_digits=12, decimal_places=2, default=0, editable=False)
+    valor_pago = models.DecimalField(max_digits=12, decimal_places=2, default=0, editable=False)
     ativo = models.BooleanField(default=True)
     criado_em = models.DateTimeField(auto_now_add=True)
     modificado_em = models.DateTimeField(auto_now=True)
 
+    # Campos atualizados apenas com F() (ver totals.py)
+    maintained_fields = ('subtotal', 'total', 'valor_pago')
+
+    # Os rollups diários leem as alterações por modificado_em (ver rollups.py)
+    touch_on_update = True
+
     class Meta:
         verbose_name = 'Venda'
         verbose_name_plural = 'Vendas'
+        indexes = [
+            # Pedidos de um cliente, dos mais recentes para os mais antigos
+            models.Index(fields=['cliente', '-data'], name='venda_cliente_data_idx'),
+            # Paginação por cursor (ver KeysetPaginator)
+            models.Index(fields=['criado_em', 'id'], name='venda_criado_em_id_idx'),
+            # Rollups diários: vendas do dia e alterações desde a última execução
+            models.Index(fields=['data'], name='venda_data_idx'),
+            models.Index(fields=['modificado_em'], name='venda_modificado_em_idx'),
+            # Vendas em aberto (ver totals.unpaid)
+            models.Index(
+                fields=['-data'], name='venda_em_aberto_idx',
+                condition=models.Q(ativo=True, valor_pago__lt=models.F('total')),
+            ),
+        ]
+
+    str_fields = ['id', 'cliente__nome']
+    search_fields = ['cliente__nome']
 
     def __str__(self):
         return f'Venda {self.id} - Cliente {self.cliente.nome}'
@@ -155,7 +435,7 @@ class Venda(models.Model):
     
 
 # Itens da venda (ex: 3 shampoos, 2 condicionadores e 1 batom)
-class ItemVenda(models.Model):
+class ItemVenda(SnapshotMixin):
     venda = models.ForeignKey(Venda, on_delete=models.CASCADE)
     produto = models.ForeignKey(Produto, on_delete=models.CASCADE)
     quantidade = models.IntegerField()
@@ -164,9 +444,18 @@ class ItemVenda(models.Model):
     criado_em = models.DateTimeField(auto_now_add=True)
     modificado_em = models.DateTimeField(auto_now=True)
 
+    # Os rollups diários leem as alterações por modificado_em (ver rollups.py)
+    touch_on_update = True
+
     class Meta:
         verbose_name = 'Item da Venda'
         verbose_name_plural = 'Itens das Vendas'
+        indexes = [
+            # Rollups diários: alterações desde a última execução
+            models.Index(fields=['modificado_em'], name='itemvenda_modificado_em_idx'),
+        ]
+
+    str_fields = ['quantidade', 'produto__nome']
 
     def __str__(self):
         return f'{self.quantidade}x {self.produto.nome}'
@@ -184,7 +473,7 @@ class ItemVenda(models.Model):
     
 
 # Pagamento (ex: pagamento de R$ 100,00 em dinheiro)
-class Pagamento(models.Model):
+class Pagamento(SnapshotMixin):
     venda = models.ForeignKey(Venda, on_delete=models.CASCADE)
     valor = models.DecimalField(max_digits=10, decimal_places=2)
     data = models.DateTimeField(auto_now_add=True)
@@ -192,9 +481,20 @@ class Pagamento(models.Model):
     criado_em = models.DateTimeField(auto_now_add=True)
     modificado_em = models.DateTimeField(auto_now=True)
 
+    # Os rollups diários leem as alterações por modificado_em (ver rollups.py)
+    touch_on_update = True
+
     class Meta:
         verbose_name = 'Pagamento'
         verbose_name_plural = 'Pagamentos'
+        indexes = [
+            # Rollups diários: pagamentos do dia e alterações desde a última execução
+            models.Index(fields=['data'], name='pagamento_data_idx'),
+            models.Index(fields=['modificado_em'], name='pagamento_modificado_em_idx'),
+        ]
+
+    str_fields = ['id', 'valor']
+    search_fields = ['venda__id', 'valor']
 
     def __str__(self):
         return f'Pagamento {self.id} - R$ {self.valor}'
@@ -210,7 +510,7 @@ class Pagamento(models.Model):
     
 
 # Endereço de entrega (ex: entrega na Rua A, número 123, bairro B)
-class EnderecoEntrega(models.Model):
+class EnderecoEntrega(SnapshotMixin):
     venda = models.ForeignKey(Venda, on_delete=models.CASCADE)
     rua = models.CharField(max_length=255)
     numero = models.CharField(max_length=10)
@@ -226,6 +526,9 @@ class EnderecoEntrega(models.Model):
         verbose_name = 'Endereço de Entrega'
         verbose_name_plural = 'Endereços de Entrega'
 
+    str_fields = ['rua', 'numero', 'bairro', 'cidade', 'estado']
+    search_fields = ['venda__cliente__nome', 'rua', 'cidade', 'estado', 'cep']
+
     def __str__(self):
         return f'{self.rua}, {self.numero} - {self.bairro}, {self.cidade}/{self.estado}'
     
@@ -245,7 +548,7 @@ class EnderecoEntrega(models.Model):
     
 
 # Avaliação do produto (ex: avaliação de 5 estrelas para o shampoo)
-class Avaliacao(models.Model):
+class Avaliacao(SnapshotMixin):
     produto = models.ForeignKey(Produto, on_delete=models.CASCADE)
     cliente = models.ForeignKey(Cliente, on_delete=models.CASCADE)
     estrelas = models.IntegerField()
@@ -257,6 +560,13 @@ class Avaliacao(models.Model):
     class Meta:
         verbose_name = 'Avaliação'
         verbose_name_plural = 'Avaliações'
+        indexes = [
+            # Avaliações ativas de um produto, das mais recentes para as mais antigas
+            models.Index(fields=['produto', '-data'], condition=models.Q(ativo=True), name='avaliacao_produto_data_idx'),
+        ]
+
+    str_fields = ['estrelas', 'cliente__nome', 'produto__nome']
+    search_fields = ['cliente__nome', 'produto__nome', 'estrelas']
 
     def __str__(self):
         return f'{self.estrelas} estrelas - {self.cliente.nome} sobre {self.produto.nome}'
@@ -273,8 +583,42 @@ class Avaliacao(models.Model):
             )
     
 
+# Resumo das avaliações ativas de um produto: quantidade, soma e histograma
+# das estrelas (1 a 5) e a média. É atualizado de forma incremental a cada
+# avaliação criada, alterada ou excluída (ver ratings.py), assim a nota do
+# produto não precisa de AVG/COUNT sobre todas as avaliações. Não é auditado:
+# é um dado derivado, que pode ser recalculado com reconcile_ratings.
+class AvaliacaoResumo(models.Model):
+    produto = models.OneToOneField(Produto, on_delete=models.CASCADE, related_name='resumo_avaliacoes')
+    total = models.PositiveIntegerField(default=0)
+    soma = models.PositiveIntegerField(default=0)
+    estrelas_1 = models.PositiveIntegerField(default=0)
+    estrelas_2 = models.PositiveIntegerField(default=0)
+    estrelas_3 = models.PositiveIntegerField(default=0)
+    estrelas_4 = models.PositiveIntegerField(default=0)
+    estrelas_5 = models.PositiveIntegerField(default=0)
+    media = models.FloatField(null=True, blank=True) # soma / total (nulo sem avaliações)
+    modificado_em = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Resumo de avaliações'
+        verbose_name_plural = 'Resumos de avaliações'
+        indexes = [
+            # Listagem dos produtos mais bem avaliados
+            models.Index(fields=['-media', '-total'], name='resumo_media_total_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.produto_id}: {self.media} ({self.total} avaliações)'
+
+    # Histograma no formato {estrelas: quantidade}
+    @property
+    def histograma(self):
+        return {estrelas: getattr(self, f'estrelas_{estrelas}') for estrelas in range(1, 6)}
+
+
 # Comentário sobre a avaliação (ex: comentário sobre a avaliação do shampoo)
-class Comentario(models.Model):
+class Comentario(SnapshotMixin):
     avaliacao = models.ForeignKey(Avaliacao, on_delete=models.CASCADE)
     texto = models.TextField()
     data = models.DateTimeField(auto_now_add=True)
@@ -286,6 +630,9 @@ class Comentario(models.Model):
         verbose_name = 'Comentário'
         verbose_name_plural = 'Comentários'
 
+    str_fields = ['avaliacao__cliente__nome', 'texto']
+    search_fields = ['avaliacao__cliente__nome', 'avaliacao__produto__nome', 'texto']
+
     def __str__(self):
         return f'Comentário de {self.avaliacao.cliente.nome}: {self.texto[:30]}...'
     
@@ -303,16 +650,32 @@ class Comentario(models.Model):
     
 
 # Cupom de desconto (ex: cupom de 10% de desconto)
-class Cupom(models.Model):
+class Cupom(SnapshotMixin):
     codigo = models.CharField(max_length=255)
     desconto = models.DecimalField(max_digits=10, decimal_places=2)
+    # Período de validade e limite de usos (vazios: sem restrição)
+    valido_de = models.DateTimeField(null=True, blank=True)
+    valido_ate = models.DateTimeField(null=True, blank=True)
+    limite_usos = models.PositiveIntegerField(null=True, blank=True)
+    usos = models.PositiveIntegerField(default=0, editable=False)
     ativo = models.BooleanField(default=True)
     criado_em = models.DateTimeField(auto_now_add=True)
     modificado_em = models.DateTimeField(auto_now=True)
 
+    # Contador atualizado apenas com F() (ver coupons.py)
+    maintained_fields = ('usos',)
+
     class Meta:
         verbose_name = 'Cupom'
         verbose_name_plural = 'Cupons'
+        constraints = [
+            # Códigos únicos sem diferenciar maiúsculas e minúsculas (o
+            # índice também atende à busca por código, ver coupons.py)
+            models.UniqueConstraint(Lower('codigo'), name='cupom_codigo_unico'),
+        ]
+
+    str_fields = ['codigo', 'desconto']
+    search_fields = ['codigo']
 
     def __str__(self):
         return f'Cupom {self.codigo} - Desconto: R$ {self.desconto}'
@@ -328,7 +691,7 @@ class Cupom(models.Model):
     
 
 # Carrinho de compras (ex: carrinho com 3 shampoos, 2 condicionadores e 1 batom)
-class Carrinho(models.Model):
+class Carrinho(SnapshotMixin):
     cliente = models.ForeignKey(Cliente, on_delete=models.CASCADE)
     ativo = models.BooleanField(default=True)
     criado_em = models.DateTimeField(auto_now_add=True)
@@ -338,6 +701,9 @@ class Carrinho(models.Model):
         verbose_name = 'Carrinho'
         verbose_name_plural = 'Carrinhos'
 
+    str_fields = ['id', 'cliente__nome']
+    search_fields = ['cliente__nome']
+
     def __str__(self):
         return f'Carrinho {self.id} - Cliente: {self.cliente.nome}'
     
@@ -351,7 +717,7 @@ class Carrinho(models.Model):
     
 
 # Itens do carrinho (ex: 3 shampoos, 2 condicionadores e 1 batom)
-class ItemCarrinho(models.Model):
+class ItemCarrinho(SnapshotMixin):
     carrinho = models.ForeignKey(Carrinho, on_delete=models.CASCADE)
     produto = models.ForeignKey(Produto, on_delete=models.CASCADE)
     quantidade = models.IntegerField()
@@ -362,6 +728,13 @@ class ItemCarrinho(models.Model):
     class Meta:
         verbose_name = 'Item do Carrinho'
         verbose_name_plural = 'Itens dos Carrinhos'
+        constraints = [
+            # Um item por produto no carrinho (upsert do cart.py)
+            models.UniqueConstraint(fields=['carrinho', 'produto'], name='item_carrinho_produto_unico'),
+        ]
+
+    str_fields = ['quantidade', 'produto__nome', 'carrinho__cliente__nome']
+    search_fields = ['carrinho__id', 'produto__nome', 'quantidade']
 
     def __str__(self):
         return f'{self.quantidade}x {self.produto.nome} no carrinho de {self.carrinho.cliente.nome}'
@@ -380,7 +753,7 @@ class ItemCarrinho(models.Model):
     
 
 # Desejo de compra (ex: desejo de comprar 3 shampoos, 2 condicionadores e 1 batom)
-class Desejo(models.Model):
+class Desejo(SnapshotMixin):
     cliente = models.ForeignKey(Cliente, on_delete=models.CASCADE)
     ativo = models.BooleanField(default=True)
     criado_em = models.DateTimeField(auto_now_add=True)
@@ -390,6 +763,9 @@ class Desejo(models.Model):
         verbose_name = 'Desejo'
         verbose_name_plural = 'Desejos'
 
+    str_fields = ['id', 'cliente__nome']
+    search_fields = ['cliente__nome']
+
     def __str__(self):
         return f'Desejo {self.id} - Cliente: {self.cliente.nome}'
     
@@ -403,7 +779,7 @@ class Desejo(models.Model):
     
 
 # Itens do desejo (ex: 3 shampoos, 2 condicionadores e 1 batom)
-class ItemDesejo(models.Model):
+class ItemDesejo(SnapshotMixin):
     desejo = models.ForeignKey(Desejo, on_delete=models.CASCADE)
     produto = models.ForeignKey(Produto, on_delete=models.CASCADE)
     quantidade = models.IntegerField()
@@ -414,6 +790,13 @@ class ItemDesejo(models.Model):
     class Meta:
         verbose_name = 'Item do Desejo'
         verbose_name_plural = 'Itens dos Desejos'
+        indexes = [
+            # Desejos ativos de um produto (ver wishlist.py)
+            models.Index(fields=['produto', 'desejo'], condition=models.Q(ativo=True), name='item_desejo_produto_idx'),
+        ]
+
+    str_fields = ['quantidade', 'produto__nome', 'desejo__cliente__nome']
+    search_fields = ['desejo__id', 'produto__nome']
 
     def __str__(self):
         return f'{self.quantidade}x {self.produto.nome} no desejo de {self.desejo.cliente.nome}'
@@ -431,11 +814,41 @@ class ItemDesejo(models.Model):
             )
     
 
+# Campanha enviada a todos os clientes ativos (ex: promoção de verão)
+class Campanha(SnapshotMixin):
+    nome = models.CharField(max_length=255)
+    texto = models.TextField()
+    # Envio em lotes (ver notifications.py): clientes notificados, último
+    # cliente do último lote gravado (para retomar um envio interrompido)
+    # e data de conclusão
+    destinatarios = models.PositiveIntegerField(default=0, editable=False)
+    ultimo_cliente = models.PositiveBigIntegerField(null=True, blank=True, editable=False)
+    enviada_em = models.DateTimeField(null=True, blank=True, editable=False)
+    ativo = models.BooleanField(default=True)
+    criado_em = models.DateTimeField(auto_now_add=True)
+    modificado_em = models.DateTimeField(auto_now=True)
+
+    # Progresso atualizado apenas direto no banco (ver notifications.py)
+    maintained_fields = ('destinatarios', 'ultimo_cliente', 'enviada_em')
+
+    class Meta:
+        verbose_name = 'Campanha'
+        verbose_name_plural = 'Campanhas'
+
+    str_fields = ['nome']
+    search_fields = ['nome', 'texto']
+
+    def __str__(self):
+        return self.nome
+
+
 # Notificação (ex: notificação de promoção de shampoo)
-class Notificacao(models.Model):
+class Notificacao(SnapshotMixin):
     cliente = models.ForeignKey(Cliente, on_delete=models.CASCADE)
+    campanha = models.ForeignKey(Campanha, on_delete=models.SET_NULL, null=True, blank=True)
     texto = models.TextField()
     data = models.DateTimeField(auto_now_add=True)
+    lida = models.BooleanField(default=False)
     ativo = models.BooleanField(default=True)
     criado_em = models.DateTimeField(auto_now_add=True)
     modificado_em = models.DateTimeField(auto_now=True)
@@ -443,6 +856,13 @@ class Notificacao(models.Model):
     class Meta:
         verbose_name = 'Notificação'
         verbose_name_plural = 'Notificações'
+        indexes = [
+            # Notificações não lidas do cliente, das mais recentes para as mais antigas
+            models.Index(fields=['cliente', '-data'], condition=models.Q(lida=False, ativo=True), name='notificacao_nao_lida_idx'),
+        ]
+
+    str_fields = ['cliente__nome', 'texto']
+    search_fields = ['cliente__nome', 'texto']
 
     def __str__(self):
         return f'Notificação para {self.cliente.nome}: {self.texto[:30]}...'
@@ -457,15 +877,34 @@ class Notificacao(models.Model):
             )
 
 
+# Quantidade de notificações ativas e não lidas do cliente, mantida pelos
+# sinais (ver notifications.py): o contador exibido no site é uma leitura
+# pela chave primária, sem COUNT sobre as notificações
+class NotificacoesNaoLidas(models.Model):
+    cliente = models.OneToOneField(Cliente, on_delete=models.CASCADE, primary_key=True, related_name='notificacoes_nao_lidas')
+    total = models.PositiveIntegerField(default=0)
+    modificado_em = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Notificações não lidas'
+        verbose_name_plural = 'Notificações não lidas'
+
+    def __str__(self):
+        return f'{self.cliente_id}: {self.total}'
+
+
 # Classe para registro de logs de alterações no banco de dados,
-# mantém salvo a tabela, o objeto, o campo alterado, o valor antigo,
-# o valor novo, a data de alteração, a ação realizada e o usuário.
+# mantém salvo a tabela, o objeto, os campos alterados, os valores
+# antigos e novos, a data de alteração, a ação realizada e o usuário.
+# Cada save/delete gera um único registro com todos os campos alterados.
+# No PostgreSQL a tabela é particionada por mês, com chave primária
+# (id, criado_em): veja em 0004_log_particionamento as alterações que não
+# podem ser feitas por migrações comuns.
 class Log(models.Model):
     tabela = models.CharField(max_length=255)
-    objeto = models.IntegerField()
-    campo = models.CharField(max_length=255)
-    valor_antigo = models.TextField()
-    valor_novo = models.TextField()
+    objeto = models.IntegerField(blank=True, null=True) # Vazio em registros de operações em lote (ex: importação)
+    campo = models.CharField(max_length=255, blank=True) # Nomes dos campos alterados, separados por vírgula
+    alteracoes = models.JSONField(default=dict, blank=True, encoder=DjangoJSONEncoder) # {campo: [valor_antigo, valor_novo]}
     acao = models.CharField(max_length=255)
     usuario = models.ForeignKey(User, on_delete=models.CASCADE, blank=True, null=True) # Arrumar depois
     data = models.DateTimeField(auto_now_add=True)
@@ -474,6 +913,94 @@ class Log(models.Model):
     class Meta:
         verbose_name = 'Log'
         verbose_name_plural = 'Logs'
+        # Índices para os filtros do admin, para o arquivamento por data e
+        # para a paginação por cursor (criado_em, id)
+        indexes = [
+            models.Index(fields=['criado_em', 'id'], name='log_criado_em_id_idx'),
+            models.Index(fields=['tabela', 'criado_em'], name='log_tabela_criado_em_idx'),
+            models.Index(fields=['acao', 'criado_em'], name='log_acao_criado_em_idx'),
+        ]
+
+    str_fields = ['data', 'acao', 'tabela', 'usuario__username']
+
+    def __str__(self):
+        return f'[{self.data}] {self.acao} em {self.tabela} por {self.usuario}'
+
+# Tabelas de resumo (rollup) das vendas e pagamentos por dia, usadas pelo
+# painel de vendas do admin. São recalculadas por dia pelo comando
+# rollup_sales (ver rollups.py) e não são auditadas: são dados derivados.
+# Os valores consideram apenas itens/pagamentos ativos de vendas ativas.
+class VendaDiariaProduto(models.Model):
+    dia = models.DateField()
+    produto = models.ForeignKey(Produto, on_delete=models.CASCADE)
+    quantidade = models.IntegerField(default=0)
+    receita = models.DecimalField(max_digits=14, decimal_places=2, default=0) # Soma de quantidade * preço
+
+    class Meta:
+        verbose_name = 'Venda diária por produto'
+        verbose_name_plural = 'Vendas diárias por produto'
+        constraints = [
+            models.UniqueConstraint(fields=['dia', 'produto'], name='venda_diaria_produto_unica'),
+        ]
+
+
+class VendaDiariaCategoria(models.Model):
+    dia = models.DateField()
+    categoria = models.ForeignKey(Categoria, on_delete=models.CASCADE)
+    quantidade = models.IntegerField(default=0)
+    receita = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        verbose_name = 'Venda diária por categoria'
+        verbose_name_plural = 'Vendas diárias por categoria'
+        constraints = [
+            models.UniqueConstraint(fields=['dia', 'categoria'], name='venda_diaria_categoria_unica'),
+        ]
+
+
+class VendaDiariaMarca(models.Model):
+    dia = models.DateField()
+    marca = models.ForeignKey(Marca, on_delete=models.CASCADE)
+    quantidade = models.IntegerField(default=0)
+    receita = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        verbose_name = 'Venda diária por marca'
+        verbose_name_plural = 'Vendas diárias por marca'
+        constraints = [
+            models.UniqueConstraint(fields=['dia', 'marca'], name='venda_diaria_marca_unica'),
+        ]
+
+
+class PagamentoDiario(models.Model):
+    dia = models.DateField(unique=True)
+    quantidade = models.IntegerField(default=0)
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        verbose_name = 'Pagamentos do dia'
+        verbose_name_plural = 'Pagamentos por dia'
+
+
+# Até onde (modificado_em) as alterações já foram processadas por um job
+# incremental, e dias marcados para recálculo por exclusões, que não
+# aparecem na busca por modificado_em
+class ProcessamentoRollup(models.Model):
+    nome = models.CharField(max_length=100, unique=True)
+    processado_ate = models.DateTimeField(null=True, blank=True)
+    modificado_em = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Processamento de rollup'
+        verbose_name_plural = 'Processamentos de rollup'
 
     def __str__(self):
-        return f'[{self.data}] {self.acao} em {self.tabela} por {self.usuario}'
\ No newline at end of file
+        return f'{self.nome} até {self.processado_ate}'
+
+
+class RollupPendente(models.Model):
+    dia = models.DateField(unique=True)
+
+    class Meta:
+        verbose_name = 'Dia pendente de rollup'
+        verbose_name_plural = 'Dias pendentes de rollup'
@@ -0,0 +1,151 @@
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import audit
+from .models import Cliente, Campanha, Notificacao, NotificacoesNaoLidas
+
+
+###########################################################################
+# NOTIFICAÇÕES: ENVIO DE CAMPANHAS EM LOTES E CONTADOR DE NÃO LIDAS       #
+# Uma campanha é enviada aos clientes ativos em lotes (em ordem de pk):   #
+# cada lote é um bulk_create sem log por notificação, na mesma transação  #
+# que atualiza o progresso da campanha, de forma que um envio             #
+# interrompido continua do último lote gravado. O envio inteiro gera um   #
+# único log da campanha.                                                  #
+# O contador de não lidas de cada cliente é atualizado com F(), somando   #
+# +1/-1 a cada notificação criada, lida, desativada ou excluída.          #
+###########################################################################
+
+
+# Cliente cujo contador inclui a notificação (None se ela não conta)
+def contribution(cliente_id, lida, ativo):
+    return cliente_id if ativo and not lida else None
+
+
+# Contribuição antes da alteração ({campo: [antigo, novo]})
+def old_contribution(cliente_id, lida, ativo, fields):
+    values = {'cliente': cliente_id, 'lida': lida, 'ativo': ativo}
+    for name, (old_value, _) in fields.items():
+        if name in values:
+            values[name] = old_value
+    return contribution(values['cliente'], values['lida'], values['ativo'])
+
+
+# Soma as variações por cliente e aplica uma atualização por valor de
+# variação (ex: todos os clientes com +1 em um único UPDATE)
+def apply_changes(changes):
+    deltas = Counter()
+    for old, new in changes:
+        if old == new:
+            continue
+        if old is not None:
+            deltas[old] -= 1
+        if new is not None:
+            deltas[new] += 1
+
+    by_delta = defaultdict(list)
+    for cliente_id, delta in deltas.items():
+        if delta:
+            by_delta[delta].append(cliente_id)
+    for delta, cliente_ids in by_delta.items():
+        apply_delta(cliente_ids, delta)
+
+
+def apply_delta(cliente_ids, delta):
+    # Só variações positivas criam contadores (exclusões em cascata de um
+    # cliente não devem recriá-lo)
+    if delta > 0:
+        NotificacoesNaoLidas.objects.bulk_create(
+            [NotificacoesNaoLidas(cliente_id=cliente_id) for cliente_id in cliente_ids],
+            ignore_conflicts=True,
+        )
+    NotificacoesNaoLidas.objects.filter(cliente_id__in=cliente_ids).update(
+        total=F('total') + delta, modificado_em=timezone.now(),
+    )
+
+
+# Após alterações em lote (update/bulk_update): os valores atuais são lidos
+# em uma consulta e os antigos vêm das alterações auditadas
+def apply_bulk_update(changes):
+    rows = Notificacao._base_manager.filter(pk__in=list(changes)).values_list('pk', 'cliente_id', 'lida', 'ativo')
+    apply_changes([
+        (old_contribution(cliente_id, lida, ativo, changes[pk]), contribution(cliente_id, lida, ativo))
+        for pk, cliente_id, lida, ativo in rows
+    ])
+
+
+###########################################################################
+# LEITURA                                                                 #
+###########################################################################
+
+
+# Quantidade de notificações não lidas do cliente (uma leitura pela pk)
+def unread_count(cliente_id):
+    return NotificacoesNaoLidas.objects.filter(cliente_id=cliente_id).values_list('total', flat=True).first() or 0
+
+
+# Notificações não lidas do cliente (usa o índice notificacao_nao_lida_idx)
+def unread(cliente_id):
+    return Notificacao.objects.filter(cliente_id=cliente_id, lida=False, ativo=True).order_by('-data')
+
+
+# Marca as notificações do cliente como lidas (todas, se pks não for
+# informado) e retorna quantas foram marcadas. Sem log por notificação.
+def mark_read(cliente_id, pks=None):
+    notificacoes = Notificacao._base_manager.filter(cliente_id=cliente_id, lida=False, ativo=True)
+    if pks is not None:
+        notificacoes = notificacoes.filter(pk__in=pks)
+    with transaction.atomic():
+        marked = notificacoes.update(lida=True, modificado_em=timezone.now())
+        if marked:
+            apply_delta([cliente_id], -marked)
+    return marked
+
+
+###########################################################################
+# ENVIO DE CAMPANHAS                                                      #
+###########################################################################
+
+
+# Envia a campanha aos clientes ativos que ainda não a receberam e retorna
+# a quantidade de notificações criadas
+def send_campaign(campanha, batch_size=None):
+    batch_size = batch_size or settings.NOTIFICATION_BATCH_SIZE
+    campanha = Campanha._base_manager.get(pk=campanha.pk)
+    clientes = Cliente._base_manager.filter(ativo=True).order_by('pk').values_list('pk', flat=True)
+    last, sent = campanha.ultimo_cliente, 0
+
+    while True:
+        batch = clientes.filter(pk__gt=last) if last is not None else clientes
+        batch = list(batch[:batch_size])
+        if not batch:
+            break
+        with transaction.atomic():
+            sent += send_batch(campanha, batch)
+        last = batch[-1]
+
+    with transaction.atomic():
+        Campanha._base_manager.filter(pk=campanha.pk).update(enviada_em=timezone.now())
+        audit.write_log(audit.make_batch_log(Campanha, 'SEND', {
+            'campanha': campanha.pk,
+            'notificacoes': sent,
+        }, audit.get_audit_user_id()))
+    return sent
+
+
+def send_batch(campanha, cliente_ids):
+    # O _base_manager não gera um log por notificação; o sinal de criação
+    # em lote mantém os contadores de não lidas e a busca atualizados
+    objs = Notificacao._base_manager.bulk_create([
+        Notificacao(cliente_id=cliente_id, campanha=campanha, texto=campanha.texto)
+        for cliente_id in cliente_ids
+    ])
+    audit.post_bulk_create.send(sender=Notificacao, objs=objs, using=Notificacao.objects.db)
+    Campanha._base_manager.filter(pk=campanha.pk).update(
+        destinatarios=F('destinatarios') + len(objs), ultimo_cliente=cliente_ids[-1],
+    )
+    return len(objs)
@@ -0,0 +1,164 @@
+import base64
+import json
+
+from django.core.paginator import InvalidPage, Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+
+###########################################################################
+# PAGINAÇÃO DAS LISTAGENS (ADMIN E VIEWS)                                 #
+###########################################################################
+
+
+# Abaixo deste total estimado a contagem exata é barata e é usada no lugar
+ESTIMATE_THRESHOLD = 10000
+
+
+# Total de linhas estimado pelas estatísticas do banco, sem percorrer a
+# tabela. Retorna None se não houver estatísticas disponíveis.
+def estimated_row_count(model, using='default'):
+    connection = connections[using]
+    table = model._meta.db_table
+
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            # reltuples é atualizado pelo VACUUM/ANALYZE (-1 se nunca analisada)
+            cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass', [table])
+            row = cursor.fetchone()
+            return row[0] if row and row[0] >= 0 else None
+
+        if connection.vendor == 'sqlite':
+            # sqlite_stat1 só existe depois de um ANALYZE; o primeiro número
+            # da coluna stat é a quantidade de linhas de cada índice (ou da
+            # tabela). Índices parciais têm só parte das linhas: vale o maior.
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sqlite_stat1'")
+            if cursor.fetchone() is None:
+                return None
+            cursor.execute('SELECT stat FROM sqlite_stat1 WHERE tbl = %s', [table])
+            counts = [int(stat.split()[0]) for (stat,) in cursor.fetchall() if stat]
+            return max(counts, default=None)
+
+    return None
+
+
+# Paginator que evita o COUNT(*) em tabelas grandes: quando a listagem não
+# tem filtros, usa o total estimado pelas estatísticas do banco. Com filtros
+# (ou tabelas pequenas / sem estatísticas) a contagem continua exata.
+class EstimatedCountPaginator(Paginator):
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if getattr(queryset, 'query', None) is not None and not queryset.query.where:
+            estimate = estimated_row_count(queryset.model, queryset.db)
+            if estimate is not None and estimate >= ESTIMATE_THRESHOLD:
+                return estimate
+        return super().count
+
+
+# Ordenação padrão da paginação por cursor. Precisa terminar em um campo
+# único (o id) para que a posição de cada linha seja bem definida.
+KEYSET_ORDERING = ('-criado_em', '-id')
+
+
+# Página da paginação por cursor. Não há número de página nem total: apenas
+# os cursores (opacos) para a página seguinte e para a anterior.
+class KeysetPage:
+
+    def __init__(self, object_list, next_cursor, previous_cursor):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+
+# Paginação por cursor (keyset / seek): em vez de OFFSET, cada página
+# continua a partir dos valores de ordenação da última linha da página
+# anterior (WHERE (criado_em, id) < (...)), usando o índice de
+# (criado_em, id). O custo de uma página não depende de quão longe ela está
+# do início e não é feito COUNT(*). O cursor é um JSON em base64 com a
+# direção e os valores da linha de referência.
+class KeysetPaginator:
+
+    def __init__(self, queryset, per_page, ordering=KEYSET_ORDERING):
+        self.queryset = queryset
+        self.per_page = int(per_page)
+        self.ordering = list(ordering)
+        self.fields = [
+            queryset.model._meta.get_field(name.lstrip('-'))
+            for name in self.ordering
+        ]
+
+    def encode_cursor(self, direction, obj):
+        values = [getattr(obj, field.attname) for field in self.fields]
+        # str() mantém os microssegundos das datas (o DjangoJSONEncoder os
+        # arredonda para milissegundos, o que faria a página pular linhas)
+        data = json.dumps([direction, values], default=str, separators=(',', ':'))
+        return base64.urlsafe_b64encode(data.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        try:
+            data = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+            direction, values = json.loads(data)
+            if direction not in ('n', 'p') or len(values) != len(self.fields):
+                raise ValueError
+            return direction, [field.to_python(value) for field, value in zip(self.fields, values)]
+        except (ValueError, TypeError):
+            raise InvalidPage('Cursor inválido')
+
+    # Condição "depois da linha de referência" na ordenação informada:
+    # (a > x) OR (a = x AND b > y) ..., com a comparação de cada campo
+    # invertida para os campos em ordem decrescente
+    def seek_filter(self, ordering, values):
+        condition = Q()
+        equal = {}
+        for name, value in zip(ordering, values):
+            field = name.lstrip('-')
+            lookup = 'lt' if name.startswith('-') else 'gt'
+            condition |= Q(**equal, **{f'{field}__{lookup}': value})
+            equal[field] = value
+        # O primeiro campo também limitado com <=/>= ajuda o banco a usar o
+        # índice como intervalo
+        first = ordering[0]
+        bound = {f'{first.lstrip("-")}__{"lte" if first.startswith("-") else "gte"}': values[0]}
+        return Q(**bound) & condition
+
+    def page(self, cursor=None):
+        ordering = self.ordering
+        direction, values = self.decode_cursor(cursor) if cursor else ('n', None)
+        if direction == 'p':
+            ordering = [name[1:] if name.startswith('-') else f'-{name}' for name in ordering]
+
+        queryset = self.queryset.order_by(*ordering)
+        if values is not None:
+            queryset = queryset.filter(self.seek_filter(ordering, values))
+        rows = list(queryset[:self.per_page + 1])
+        more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+
+        if direction == 'p':
+            rows.reverse()
+            has_next, has_previous = True, more
+        else:
+            has_next, has_previous = more, values is not None
+
+        if not rows:
+            return KeysetPage([], None, None)
+        return KeysetPage(
+            rows,
+            self.encode_cursor('n', rows[-1]) if has_next else None,
+            self.encode_cursor('p', rows[0]) if has_previous else None,
+        )
@@ -0,0 +1,94 @@
+from datetime import date, datetime, timezone as dt_timezone
+from django.db import connection
+
+
+###########################################################################
+# PARTIÇÕES MENSAIS DA TABELA DE LOGS (APENAS POSTGRESQL)                 #
+# No PostgreSQL a tabela app_log é particionada por mês em criado_em      #
+# (migração 0004). No SQLite não há partições e o arquivamento remove as  #
+# linhas antigas em lotes (ver o comando archive_logs).                   #
+###########################################################################
+
+
+LOG_TABLE = 'app_log'
+DEFAULT_PARTITION = 'app_log_default'
+
+
+# Primeiro dia do mês seguinte
+def next_month(month):
+    return add_months(month, 1)
+
+
+# Soma (ou subtrai, se negativo) meses a partir do primeiro dia de um mês
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def month_start(day):
+    return date(day.year, day.month, 1)
+
+
+# Limite de uma partição como timestamp em UTC
+def month_bound(month):
+    return datetime(month.year, month.month, 1, tzinfo=dt_timezone.utc)
+
+
+def partition_name(month):
+    return f'{LOG_TABLE}_p{month.year}{month.month:02d}'
+
+
+def is_partitioned():
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT relkind FROM pg_class WHERE relname = %s', [LOG_TABLE])
+        row = cursor.fetchone()
+    return row is not None and row[0] == 'p'
+
+
+# Nomes das partições mensais existentes
+def list_partitions():
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT child.relname
+            FROM pg_inherits
+            JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+            JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+            WHERE parent.relname = %s AND child.relname <> %s
+            ORDER BY child.relname
+            """,
+            [LOG_TABLE, DEFAULT_PARTITION],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+# Cria as partições que faltam entre os meses informados (inclusive)
+def create_partitions(first_month, last_month):
+    existing = set(list_partitions())
+    created = []
+    month = month_start(first_month)
+    with connection.cursor() as cursor:
+        while month <= last_month:
+            name = partition_name(month)
+            if name not in existing:
+                cursor.execute(
+                    f'CREATE TABLE "{name}" PARTITION OF "{LOG_TABLE}" '
+                    f"FOR VALUES FROM ('{month_bound(month).isoformat()}') "
+                    f"TO ('{month_bound(next_month(month)).isoformat()}')"
+                )
+                created.append(name)
+            month = next_month(month)
+    return created
+
+
+# Desanexa e remove a partição de um mês (os dados devem ter sido arquivados)
+def drop_partition(month):
+    name = partition_name(month)
+    if name not in list_partitions():
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(f'ALTER TABLE "{LOG_TABLE}" DETACH PARTITION "{name}"')
+        cursor.execute(f'DROP TABLE "{name}"')
+    return True
@@ -0,0 +1,116 @@
+from collections import Counter, defaultdict
+
+from django.db.models import Count, F, FloatField, Q, Sum
+from django.db.models.functions import Cast, NullIf
+from django.utils import timezone
+
+from .models import Avaliacao, AvaliacaoResumo
+
+
+###########################################################################
+# RESUMO DAS AVALIAÇÕES DOS PRODUTOS (ATUALIZAÇÃO INCREMENTAL)            #
+# Cada avaliação ativa com 1 a 5 estrelas conta no resumo do produto.     #
+# Ao criar, alterar ou excluir avaliações, a contribuição antiga é        #
+# retirada e a nova é somada com um único UPDATE usando F(), sem ler o    #
+# resumo e sem recalcular sobre todas as avaliações do produto.           #
+###########################################################################
+
+
+STARS = range(1, 6)
+
+# Produtos recalculados por vez no comando reconcile_ratings
+CHUNK_SIZE = 1000
+
+
+# Produto e estrelas com que a avaliação conta no resumo (None se não conta)
+def contribution(produto_id, estrelas, ativo):
+    if ativo and estrelas in STARS:
+        return produto_id, estrelas
+    return None
+
+
+# Contribuição antes da alteração: os valores atuais, exceto os campos
+# alterados, que voltam ao valor antigo ({campo: [antigo, novo]})
+def old_contribution(produto_id, estrelas, ativo, fields):
+    values = {'produto': produto_id, 'estrelas': estrelas, 'ativo': ativo}
+    for name, (old_value, _) in fields.items():
+        if name in values:
+            values[name] = old_value
+    return contribution(values['produto'], values['estrelas'], values['ativo'])
+
+
+# Soma as variações (-1 para a contribuição antiga, +1 para a nova) e
+# aplica uma atualização por produto. changes: [(antiga, nova)]
+def apply_changes(changes):
+    deltas = defaultdict(Counter)
+    for old, new in changes:
+        if old == new:
+            continue
+        for value, sign in ((old, -1), (new, 1)):
+            if value is not None:
+                produto_id, estrelas = value
+                deltas[produto_id][estrelas] += sign
+
+    for produto_id, delta in deltas.items():
+        apply_delta(produto_id, {estrelas: count for estrelas, count in delta.items() if count})
+
+
+# Atualiza o resumo do produto com as variações {estrelas: quantidade}
+def apply_delta(produto_id, delta):
+    if not delta:
+        return
+    total = sum(delta.values())
+    soma = sum(estrelas * count for estrelas, count in delta.items())
+    values = {
+        'total': F('total') + total,
+        'soma': F('soma') + soma,
+        'media': Cast(F('soma') + soma, FloatField()) / NullIf(F('total') + total, 0),
+        'modificado_em': timezone.now(),
+    }
+    for estrelas, count in delta.items():
+        values[f'estrelas_{estrelas}'] = F(f'estrelas_{estrelas}') + count
+
+    resumos = AvaliacaoResumo.objects.filter(produto_id=produto_id)
+    if resumos.update(**values):
+        return
+
+    # Primeira avaliação do produto: cria o resumo e aplica a variação. Só
+    # variações positivas criam o resumo (exclusões em cascata de um produto
+    # não devem recriá-lo).
+    if any(count > 0 for count in delta.values()):
+        AvaliacaoResumo.objects.bulk_create([AvaliacaoResumo(produto_id=produto_id)], ignore_conflicts=True)
+        resumos.update(**values)
+
+
+# Após alterações em lote (update/bulk_update): os valores atuais são lidos
+# em uma consulta e os antigos vêm das alterações auditadas
+def apply_bulk_update(changes):
+    rows = Avaliacao._base_manager.filter(pk__in=list(changes)).values_list('pk', 'produto_id', 'estrelas', 'ativo')
+    apply_changes([
+        (old_contribution(produto_id, estrelas, ativo, changes[pk]), contribution(produto_id, estrelas, ativo))
+        for pk, produto_id, estrelas, ativo in rows
+    ])
+
+
+###########################################################################
+# RECÁLCULO COMPLETO                                                      #
+###########################################################################
+
+
+# Resumos calculados a partir das avaliações, para os produtos informados
+def compute(produto_ids):
+    counted = Q(ativo=True, estrelas__gte=1, estrelas__lte=5)
+    rows = (
+        Avaliacao._base_manager.filter(produto_id__in=produto_ids)
+        .values('produto_id')
+        .annotate(
+            total=Count('pk', filter=counted),
+            soma=Sum('estrelas', filter=counted, default=0),
+            **{f'estrelas_{estrelas}': Count('pk', filter=Q(ativo=True, estrelas=estrelas)) for estrelas in STARS},
+        )
+    )
+    resumos = {}
+    for row in rows:
+        row['media'] = row['soma'] / row['total'] if row['total'] else None
+        resumos[row.pop('produto_id')] = row
+    return resumos
@@ -0,0 +1,167 @@
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.db.models import DecimalField, ExpressionWrapper, F, Count, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import (
+    Venda, ItemVenda, Pagamento, VendaDiariaProduto, VendaDiariaCategoria,
+    VendaDiariaMarca, PagamentoDiario, ProcessamentoRollup, RollupPendente
+)
+
+
+###########################################################################
+# ROLLUPS DIÁRIOS DE VENDAS E PAGAMENTOS (PROCESSAMENTO INCREMENTAL)      #
+# A cada execução, apenas as linhas de Venda/ItemVenda/Pagamento com      #
+# modificado_em posterior à marca d'água (processado_ate) são lidas, para #
+# descobrir quais dias mudaram. Esses dias (e os marcados por exclusões)  #
+# são recalculados por inteiro, o que cobre alterações de quantidade,     #
+# preço, produto ou ativo sem precisar dos valores antigos.               #
+###########################################################################
+
+
+JOB_NAME = 'vendas'
+
+# Alterações mais recentes que isso ficam para a próxima execução, para não
+# perder linhas de transações ainda não confirmadas com modificado_em anterior
+SAFETY_LAG = timedelta(minutes=1)
+
+REVENUE = ExpressionWrapper(F('quantidade') * F('preco'), output_field=DecimalField(max_digits=14, decimal_places=2))
+
+
+# Intervalo [início, fim) de um dia no fuso horário atual
+def day_bounds(day):
+    start = timezone.make_aware(datetime.combine(day, time.min))
+    return start, start + timedelta(days=1)
+
+
+# Marca um dia para recálculo (usado nas exclusões, ver signals.py)
+def mark_day(moment):
+    mark_days([moment])
+
+
+def mark_days(moments):
+    days = {timezone.localdate(moment) for moment in moments if moment is not None}
+    if days:
+        RollupPendente.objects.bulk_create([RollupPendente(dia=day) for day in days], ignore_conflicts=True)
+
+
+# Campo que define o dia de cada linha nos rollups ({modelo: campo}). Se ele
+# muda (ex: item passado para a venda de outro dia), a busca por
+# modificado_em encontra apenas o dia novo: o antigo é marcado a partir do
+# valor antigo.
+DAY_FIELDS = {Venda: 'data', ItemVenda: 'venda', Pagamento: 'data'}
+
+
+# Marca os dias antigos das linhas que mudaram de dia, a partir das
+# alterações auditadas ({pk: {campo: [antigo, novo]}}, ver signals.py)
+def mark_moved(model, changes):
+    field = model._meta.get_field(DAY_FIELDS[model])
+    old = [
+        field.to_python(fields[field.name][0])
+        for fields in changes.values() if fields and field.name in fields
+    ]
+    if not old:
+        return
+    if model is ItemVenda:
+        old = Venda._base_manager.filter(pk__in=old).values_list('data', flat=True)
+    mark_days(old)
+
+
+# Dias com alterações em (desde, ate]. Com desde=None, todos os dias.
+def changed_days(since, until):
+    def modified(queryset):
+        queryset = queryset.filter(modificado_em__lte=until)
+        return queryset.filter(modificado_em__gt=since) if since else queryset
+
+    days = set()
+    days.update(modified(Venda.objects).annotate(dia=TruncDate('data')).values_list('dia', flat=True).distinct())
+    days.update(modified(ItemVenda.objects).annotate(dia=TruncDate('venda__data')).values_list('dia', flat=True).distinct())
+    days.update(modified(Pagamento.objects).annotate(dia=TruncDate('data')).values_list('dia', flat=True).distinct())
+    days.update(RollupPendente.objects.values_list('dia', flat=True))
+    return sorted(days)
+
+
+# Recalcula os rollups de um dia a partir das vendas e pagamentos do dia
+def rebuild_day(day):
+    start, end = day_bounds(day)
+    items = ItemVenda.objects.filter(ativo=True, venda__ativo=True, venda__data__gte=start, venda__data__lt=end)
+    # A receita vem antes: depois da anotação, 'quantidade' passa a ser a soma
+    totals = {'receita': Sum(REVENUE), 'quantidade': Sum('quantidade')}
+
+    with transaction.atomic():
+        for model, group in (
+            (VendaDiariaProduto, 'produto'),
+            (VendaDiariaCategoria, 'categoria'),
+            (VendaDiariaMarca, 'marca'),
+        ):
+            path = 'produto' if group == 'produto' else f'produto__{group}'
+            rows = items.values(path).annotate(**totals).order_by()
+            model.objects.filter(dia=day).delete()
+            model.objects.bulk_create([
+                model(dia=day, **{f'{group}_id': row[path]}, quantidade=row['quantidade'], receita=row['receita'])
+                for row in rows
+            ])
+
+        payments = Pagamento.objects.filter(ativo=True, venda__ativo=True, data__gte=start, data__lt=end)
+        summary = payments.aggregate(quantidade=Count('pk'), total=Sum('valor'))
+        PagamentoDiario.objects.filter(dia=day).delete()
+        if summary['quantidade']:
+            PagamentoDiario.objects.create(dia=day, **summary)
+
+        RollupPendente.objects.filter(dia=day).delete()
+
+
+# Processa as alterações desde a última execução e avança a marca d'água.
+# Com full=True, todos os dias são recalculados. Retorna os dias processados.
+def run(full=False):
+    state, _ = ProcessamentoRollup.objects.get_or_create(nome=JOB_NAME)
+    until = timezone.now() - SAFETY_LAG
+    since = None if full else state.processado_ate
+
+    days = set(changed_days(since, until))
+    if full:
+        # Dias que já tinham rollups, mas cujas vendas não existem mais
+        days.update(VendaDiariaProduto.objects.values_list('dia', flat=True).distinct())
+        days.update(PagamentoDiario.objects.values_list('dia', flat=True))
+
+    days = sorted(days)
+    for day in days:
+        rebuild_day(day)
+
+    state.processado_ate = until
+    state.save(update_fields=['processado_ate', 'modificado_em'])
+    return days
+
+
+# Dados do painel de vendas do admin, lidos apenas das tabelas de rollup
+def dashboard(days=30, top=10):
+    start = timezone.localdate() - timedelta(days=days - 1)
+    totals = {'quantidade': Sum('quantidade'), 'receita': Sum('receita')}
+
+    per_day = {
+        row['dia']: {**row, 'pagamentos': 0, 'total_pago': 0}
+        for row in VendaDiariaProduto.objects.filter(dia__gte=start).values('dia').annotate(**totals).order_by()
+    }
+    for row in PagamentoDiario.objects.filter(dia__gte=start).values('dia', 'quantidade', 'total'):
+        line = per_day.setdefault(row['dia'], {'dia': row['dia'], 'quantidade': 0, 'receita': 0})
+        line.update(pagamentos=row['quantidade'], total_pago=row['total'])
+
+    def ranking(model, group):
+        return (
+            model.objects.filter(dia__gte=start)
+            .values(nome=F(f'{group}__nome')).annotate(**totals).order_by('-receita')[:top]
+        )
+
+    state = ProcessamentoRollup.objects.filter(nome=JOB_NAME).first()
+    return {
+        'dias': days,
+        'processado_ate': state.processado_ate if state else None,
+        'por_dia': sorted(per_day.values(), key=lambda row: row['dia'], reverse=True),
+        'rankings': [
+            ('Produtos mais vendidos', ranking(VendaDiariaProduto, 'produto')),
+            ('Categorias mais vendidas', ranking(VendaDiariaCategoria, 'categoria')),
+            ('Marcas mais vendidas', ranking(VendaDiariaMarca, 'marca')),
+        ],
+    }
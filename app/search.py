@@ -0,0 +1,273 @@
+from collections import defaultdict
+from itertools import islice
+
+from django.db import connection
+from django.db.models.signals import post_delete, post_save
+from django.db.models import CharField, TextField
+from django.db.models.constants import LOOKUP_SEP
+from django.utils.text import smart_split, unescape_string_literal
+
+
+###########################################################################
+# BUSCA TEXTUAL DO ADMIN                                                  #
+# Os campos de busca de cada modelo são concatenados em um documento na   #
+# tabela app_busca (migração 0006), que tem um índice de trigramas:       #
+# FTS5 com tokenizer trigram no SQLite e GIN com pg_trgm no PostgreSQL.   #
+# Assim a busca por trecho de texto usa o índice, em vez de vários        #
+# ILIKE '%termo%' com OR entre tabelas. O documento é atualizado pelos    #
+# sinais (ver signals.py) e pode ser refeito com rebuild_search_index.    #
+###########################################################################
+
+
+SEARCH_TABLE = 'app_busca'
+
+# O índice de trigramas só encontra termos com pelo menos 3 caracteres
+MIN_TERM_LENGTH = 3
+
+# Objetos indexados (ou removidos) por vez, o que também limita o tamanho
+# das listas IN das consultas
+CHUNK_SIZE = 2000
+
+# Campos de busca de cada modelo indexado: {modelo: [caminhos]}
+_registry = {}
+
+# Modelos cujo documento depende de outro modelo, via relação:
+# {modelo relacionado: [(modelo indexado, caminho até o relacionado, campo usado)]}
+_dependents = defaultdict(list)
+
+
+# Registra os modelos que declaram search_fields (chamado em
+# AppConfig.ready, sem depender do admin)
+def register_models(models):
+    for model in models:
+        if getattr(model, 'search_fields', None):
+            register(model, model.search_fields)
+
+
+# Registra um modelo na busca textual. Só é possível quando todos os campos
+# de busca são de texto e sem prefixos de lookup (^, = ou @); caso contrário
+# retorna False e o admin continua usando a busca padrão do Django. Os
+# sinais que atualizam o índice são conectados apenas ao modelo registrado e
+# aos modelos dos quais o documento dele depende: um receiver sem sender
+# seria chamado a cada save de qualquer modelo, e um post_delete sem sender
+# impediria as exclusões rápidas (fast delete) de todos os modelos, como o Log.
+def register(model, search_fields):
+    paths = []
+    for path in search_fields:
+        if path[:1] in ('^', '=', '@'):
+            return False
+        field, relations = _resolve(model, path)
+        if not isinstance(field, (CharField, TextField)):
+            return False
+        paths.append((path, relations))
+
+    if model in _registry:
+        return True
+
+    _registry[model] = [path for path, _ in paths]
+    _connect(model)
+    post_delete.connect(_remove_deleted, sender=model, dispatch_uid=f'search:{model._meta.label}')
+    for path, relations in paths:
+        parts = path.split(LOOKUP_SEP)
+        for index, related_model in enumerate(relations):
+            _dependents[related_model].append(
+                (model, LOOKUP_SEP.join(parts[:index + 1]), parts[index + 1])
+            )
+            _connect(related_model)
+    return True
+
+
+# Conecta os sinais de alteração do modelo à atualização do índice (uma vez
+# por modelo, pelo dispatch_uid)
+def _connect(model):
+    from .audit import post_bulk_create, post_bulk_update
+
+    uid = f'search:{model._meta.label}'
+    post_save.connect(_update_saved, sender=model, dispatch_uid=uid)
+    post_bulk_update.connect(_update_bulk, sender=model, dispatch_uid=uid)
+    post_bulk_create.connect(_update_bulk_created, sender=model, dispatch_uid=uid)
+
+
+# Campo final de um caminho (ex: marca__nome) e os modelos percorridos até ele
+def _resolve(model, path):
+    relations = []
+    parts = path.split(LOOKUP_SEP)
+    for part in parts[:-1]:
+        model = model._meta.get_field(part).related_model
+        relations.append(model)
+    return model._meta.get_field(parts[-1]), relations
+
+
+def is_registered(model):
+    return model in _registry
+
+
+def registered_models():
+    return list(_registry)
+
+
+# O índice existe apenas no SQLite (com FTS5) e no PostgreSQL (com pg_trgm).
+# A verificação é feita uma vez por banco de dados.
+_available = {}
+
+
+def is_available():
+    name = connection.settings_dict['NAME']
+    if name not in _available:
+        _available[name] = SEARCH_TABLE in connection.introspection.table_names()
+    return _available[name]
+
+
+###########################################################################
+# ATUALIZAÇÃO DO ÍNDICE                                                   #
+###########################################################################
+
+
+# Receivers conectados por register. Nos saves, apenas alterações em campos
+# usados na busca (do próprio modelo ou de modelos relacionados) refazem os
+# documentos (ver update_index).
+def _update_saved(sender, instance, created, **kwargs):
+    changes = None if created else instance.__dict__.get('_log_changes')
+    update_index(sender, {instance.pk: changes}, created=created)
+
+
+def _update_bulk(sender, changes, **kwargs):
+    update_index(sender, changes)
+
+
+def _update_bulk_created(sender, objs, **kwargs):
+    update_index(sender, {obj.pk: None for obj in objs if obj.pk is not None}, created=True)
+
+
+def _remove_deleted(sender, instance, **kwargs):
+    remove(sender, [instance.pk])
+
+
+# Divide os pks em listas de até CHUNK_SIZE
+def chunked(pks):
+    pks = iter(pks)
+    while chunk := list(islice(pks, CHUNK_SIZE)):
+        yield chunk
+
+
+# Monta os documentos dos objetos informados: {pk: texto}
+def build_documents(model, pks):
+    documents = defaultdict(list)
+    rows = model._base_manager.filter(pk__in=pks).values_list('pk', *_registry[model])
+    for pk, *values in rows:
+        documents[pk].extend(str(value) for value in values if value)
+    return {pk: '\n'.join(values) for pk, values in documents.items()}
+
+
+# Refaz os documentos dos objetos informados, em lotes. Os objetos que não
+# existem mais no banco são removidos do índice.
+def reindex(model, pks):
+    if not is_available():
+        return
+    table = model._meta.model_name
+    for chunk in chunked(pks):
+        documents = build_documents(model, chunk)
+        remove(model, chunk)
+        if not documents:
+            continue
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'INSERT INTO {SEARCH_TABLE} (tabela, objeto, texto) VALUES (%s, %s, %s)',
+                [(table, pk, text) for pk, text in documents.items()],
+            )
+
+
+def remove(model, pks):
+    if not is_available():
+        return
+    for chunk in chunked(pks):
+        placeholders = ', '.join(['%s'] * len(chunk))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {SEARCH_TABLE} WHERE tabela = %s AND objeto IN ({placeholders})',
+                [model._meta.model_name, *chunk],
+            )
+
+
+# Atualiza o índice após alterações em objetos de um modelo. changes segue o
+# formato da auditoria, {pk: {campo: [antigo, novo]}}; com None (alterações
+# desconhecidas) os documentos são sempre refeitos.
+def update_index(model, changes, created=False):
+    if model in _registry:
+        own_fields = {path.split(LOOKUP_SEP)[0] for path in _registry[model]}
+        reindex(model, [
+            pk for pk, fields in changes.items()
+            if created or fields is None or own_fields.intersection(fields)
+        ])
+
+    if created:
+        return
+
+    # Documentos de outros modelos que exibem campos deste (ex: marca__nome).
+    # Renomear uma marca pode refazer milhares de produtos: os pks são lidos
+    # com iterator() e os documentos refeitos em lotes de CHUNK_SIZE.
+    for indexed_model, prefix, field_name in _dependents.get(model, []):
+        pks = [pk for pk, fields in changes.items() if fields is None or field_name in fields]
+        for chunk in chunked(pks):
+            related = indexed_model._base_manager.filter(**{f'{prefix}__pk__in': chunk}).order_by('pk')
+            reindex(indexed_model, related.values_list('pk', flat=True).iterator(chunk_size=CHUNK_SIZE))
+
+
+# Reconstrói todo o índice de um modelo, em lotes
+def rebuild(model):
+    remove_all(model)
+    pks = model._base_manager.order_by('pk').values_list('pk', flat=True)
+    reindex(model, pks.iterator(chunk_size=CHUNK_SIZE))
+
+
+# Indexa os modelos registrados que ainda não têm nenhum documento (ex: logo
+# após a migração que cria o índice em um banco com dados)
+def populate_missing():
+    if not is_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT DISTINCT tabela FROM {SEARCH_TABLE}')
+        indexed = {row[0] for row in cursor.fetchall()}
+    for model in _registry:
+        if model._meta.model_name not in indexed:
+            rebuild(model)
+
+
+def remove_all(model):
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {SEARCH_TABLE} WHERE tabela = %s', [model._meta.model_name])
+
+
+###########################################################################
+# CONSULTA                                                                #
+###########################################################################
+
+
+# Separa os termos da busca como o admin do Django (aspas agrupam palavras)
+def split_terms(search_term):
+    terms = []
+    for bit in smart_split(search_term):
+        if bit.startswith(('"', "'")) and bit[0] == bit[-1]:
+            bit = unescape_string_literal(bit)
+        terms.append(bit)
+    return terms
+
+
+# SQL que retorna os ids dos objetos que contêm todos os termos. Retorna
+# None quando a busca não pode usar o índice (termos curtos demais).
+def match_sql(model, terms):
+    if not terms or any(len(term) < MIN_TERM_LENGTH for term in terms):
+        return None
+
+    params = [model._meta.model_name]
+    if connection.vendor == 'sqlite':
+        # Cada termo entre aspas é buscado como trecho do texto
+        query = ' AND '.join('"{}"'.format(term.replace('"', '""')) for term in terms)
+        return f'SELECT objeto FROM {SEARCH_TABLE} WHERE tabela = %s AND texto MATCH %s', params + [query]
+
+    conditions = []
+    for term in terms:
+        escaped = term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        conditions.append('texto ILIKE %s')
+        params.append(f'%{escaped}%')
+    return f'SELECT objeto FROM {SEARCH_TABLE} WHERE tabela = %s AND {" AND ".join(conditions)}', params
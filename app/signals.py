@@ -1,12 +1,18 @@
-from django.db.models.signals import post_migrate, pre_save, post_save, pre_delete
+from django.db import transaction
+from django.db.models.signals import post_migrate, pre_save, post_save, pre_delete, post_delete
 from django.dispatch import receiver
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import User
 from .models import (
     Categoria, Marca, Produto, Cliente, Venda, ItemVenda, Pagamento,
     EnderecoEntrega, Avaliacao, Comentario, Cupom, Carrinho, 
-    ItemCarrinho, Desejo, ItemDesejo, Notificacao, Log
+    ItemCarrinho, Desejo, ItemDesejo, Notificacao, Campanha, Log
 )
+from .audit import (
+    make_log, write_log, get_audit_user_id, invalidate_default_user,
+    mark_deleted, is_deleted, post_bulk_update, post_bulk_create
+)
+from . import catalog, coupons, notifications, ratings, rollups, search, totals, wishlist
 import inspect
 
 
@@ -53,41 +59,36 @@ def create_default_user(sender, **kwargs):
 MONITORED_MODELS = [
     Categoria, Marca, Produto, Cliente, Venda, ItemVenda, Pagamento,
     EnderecoEntrega, Avaliacao, Comentario, Cupom, Carrinho, 
-    ItemCarrinho, Desejo, ItemDesejo, Notificacao
+    ItemCarrinho, Desejo, ItemDesejo, Notificacao, Campanha
 ]
 
 
-# Função auxiliar para salvar logs
-def save_log(instance, field, old_value, new_value, action, user):
-    Log.objects.create(
-        tabela=instance._meta.model_name,
-        objeto=instance.pk,
-        campo=field,
-        valor_antigo=str(old_value),
-        valor_novo=str(new_value),
-        acao=action,
-        usuario=user
-    )
+# Função auxiliar para salvar logs. Todos os campos alterados em um
+# mesmo save/delete são gravados em um único registro, no formato
+# {campo: [valor_antigo, valor_novo]}.
+def save_log(instance, changes, action, user_id):
+    write_log(make_log(type(instance), instance.pk, changes, action, user_id))
 
 
 # Sinal para capturar alterações antes de salvar (pre-save)
 @receiver(pre_save)
-def track_changes(sender, instance, **kwargs):
+def track_changes(sender, instance, update_fields=None, **kwargs):
     # Ignorar modelos que não estão monitorados
     if sender not in MONITORED_MODELS:
         return
 
-    # Checa se a instância já existe no banco de dados (update)
+    # Checa se a instância já existe no banco de dados (update). As alterações
+    # são detectadas em memória a partir do snapshot feito no carregamento.
     if instance.pk:
-        old_instance = sender.objects.get(pk=instance.pk)
-        for field in instance._meta.fields:
-            field_name = field.name
-            old_value = getattr(old_instance, field_name)
-            new_value = getattr(instance, field_name)
+        changes = instance.get_changes()
+
+        # Com update_fields, apenas os campos informados são gravados
+        if changes and update_fields is not None:
+            names = {sender._meta.get_field(name).name for name in update_fields}
+            changes = {name: values for name, values in changes.items() if name in names}
 
-            # Se o valor mudou, armazena em cache para o sinal post_save
-            if old_value != new_value:
-                setattr(instance, f'_old_{field_name}', old_value)
+        # Armazena em cache as alterações para o sinal post_save
+        instance._log_changes = changes
 
 
 # Sinal para capturar e salvar logs após salvar (post-save)
@@ -97,38 +98,273 @@ def log_changes(sender, instance, created, **kwargs):
     if sender not in MONITORED_MODELS:
         return
 
-    user = get_user_model().objects.filter(is_superuser=True).first()  # Usuário padrão, ajuste conforme necessário
-
     # Caso de criação (insert)
     if created:
-        for field in instance._meta.fields:
-            field_name = field.name
-            new_value = getattr(instance, field_name)
-            save_log(instance, field_name, None, new_value, "CREATE", user)
+        changes = {
+            field.name: [None, field.value_from_object(instance)]
+            for field in instance._meta.concrete_fields
+        }
+        action = "CREATE"
     else:
-        # Caso de atualização (update)
-        for field in instance._meta.fields:
-            field_name = field.name
-            old_value = getattr(instance, f'_old_{field_name}', None)
-            new_value = getattr(instance, field_name)
+        # Caso de atualização (update), salva apenas os campos que foram alterados
+        changes = instance.__dict__.get('_log_changes')
+        action = "UPDATE"
+
+    if not changes:
+        return
 
-            # Salva apenas os campos que foram alterados
-            if old_value is not None and old_value != new_value:
-                save_log(instance, field_name, old_value, new_value, "UPDATE", user)
+    save_log(instance, changes, action, get_audit_user_id())
 
 
-# Sinal para capturar exclusões antes de deletar (pre-delete)
-@receiver(pre_delete)
+# Sinal para capturar exclusões antes de deletar (pre-delete). É conectado
+# apenas aos modelos monitorados (ver abaixo), assim os demais modelos,
+# como o Log, continuam podendo ser excluídos em lote sem carregar as linhas.
 def log_deletions(sender, instance, **kwargs):
-    # Ignorar modelos que não estão monitorados
-    if sender not in MONITORED_MODELS:
+    # Caso de exclusão (delete)
+    changes = {
+        field.name: [field.value_from_object(instance), None]
+        for field in instance._meta.concrete_fields
+    }
+    save_log(instance, changes, "DELETE", get_audit_user_id())
+
+
+# Registra os objetos excluídos em cascata (ver audit.deleting)
+def track_deletions(sender, instance, **kwargs):
+    mark_deleted(instance)
+
+
+for model in MONITORED_MODELS:
+    pre_delete.connect(log_deletions, sender=model)
+    pre_delete.connect(track_deletions, sender=model)
+
+
+# Sinal para invalidar o usuário padrão dos logs quando algum usuário muda
+# (o login só atualiza last_login e não precisa invalidar o cache)
+@receiver(post_save, sender=get_user_model())
+@receiver(post_delete, sender=get_user_model())
+def reset_default_user(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and set(update_fields) == {'last_login'}:
         return
+    invalidate_default_user()
 
-    user = get_user_model().objects.filter(is_superuser=True).first()  # Usuário padrão, ajuste conforme necessário
 
-    # Caso de exclusão (delete)
-    for field in instance._meta.fields:
-        field_name = field.name
-        old_value = getattr(instance, field_name)
-        save_log(instance, field_name, old_value, None, "DELETE", user)
-        
\ No newline at end of file
+# Indexa na busca textual os objetos que ainda não foram indexados
+@receiver(post_migrate)
+def populate_search_index(sender, **kwargs):
+    search.populate_missing()
+
+
+# O índice da busca textual do admin é mantido pelos sinais conectados em
+# search.register, apenas para os modelos registrados (ver AppConfig.ready)
+
+
+# Alterações em lote do catálogo (ver catalog.invalidate)
+@receiver(post_bulk_update, sender=Produto)
+@receiver(post_bulk_update, sender=Categoria)
+@receiver(post_bulk_update, sender=Marca)
+@receiver(post_bulk_update, sender=Avaliacao)
+def invalidate_catalog_bulk(sender, changes, **kwargs):
+    catalog.invalidate(sender, changes)
+
+
+@receiver(post_bulk_create, sender=Produto)
+@receiver(post_bulk_create, sender=Categoria)
+@receiver(post_bulk_create, sender=Marca)
+@receiver(post_bulk_create, sender=Avaliacao)
+def invalidate_catalog_bulk_create(sender, objs, **kwargs):
+    catalog.invalidate(sender, {obj.pk: None for obj in objs if obj.pk is not None})
+
+
+# Alterações do catálogo: None em criações e exclusões, senão os campos
+# alterados (calculados em track_changes)
+def catalog_changes(instance, signal, created):
+    if created or signal is pre_delete:
+        return {instance.pk: None}
+    return {instance.pk: instance.__dict__.get('_log_changes')}
+
+
+# Sinais para invalidar o cache do catálogo (ver catalog.py)
+@receiver(post_save, sender=Produto)
+@receiver(pre_delete, sender=Produto)
+def invalidate_catalog_product(sender, instance, signal, created=False, **kwargs):
+    rows = [(instance.pk, instance.slug, instance.categoria_id, instance.marca_id)]
+    catalog.invalidate_products(rows, catalog_changes(instance, signal, created))
+
+
+@receiver(post_save, sender=Categoria)
+@receiver(pre_delete, sender=Categoria)
+@receiver(post_save, sender=Marca)
+@receiver(pre_delete, sender=Marca)
+def invalidate_catalog_group(sender, instance, signal, created=False, **kwargs):
+    rows = [(instance.pk, instance.slug)]
+    catalog.invalidate_groups(sender._meta.model_name, rows, catalog_changes(instance, signal, created))
+
+
+@receiver(post_save, sender=Avaliacao)
+@receiver(pre_delete, sender=Avaliacao)
+def invalidate_catalog_rating(sender, instance, signal, created=False, **kwargs):
+    rows = [(instance.pk, instance.produto_id)]
+    catalog.invalidate_ratings(rows, catalog_changes(instance, signal, created))
+
+
+# Sinais para manter o resumo das avaliações dos produtos (ver ratings.py)
+@receiver(post_save, sender=Avaliacao)
+def update_rating_summary(sender, instance, created, **kwargs):
+    new = ratings.contribution(instance.produto_id, instance.estrelas, instance.ativo)
+    if created:
+        old = None
+    else:
+        fields = instance.__dict__.get('_log_changes') or {}
+        old = ratings.old_contribution(instance.produto_id, instance.estrelas, instance.ativo, fields)
+    ratings.apply_changes([(old, new)])
+
+
+@receiver(post_delete, sender=Avaliacao)
+def remove_from_rating_summary(sender, instance, **kwargs):
+    old = ratings.contribution(instance.produto_id, instance.estrelas, instance.ativo)
+    ratings.apply_changes([(old, None)])
+
+
+@receiver(post_bulk_update, sender=Avaliacao)
+def update_rating_summary_bulk(sender, changes, **kwargs):
+    ratings.apply_bulk_update(changes)
+
+
+@receiver(post_bulk_create, sender=Avaliacao)
+def update_rating_summary_bulk_create(sender, objs, **kwargs):
+    ratings.apply_changes([
+        (None, ratings.contribution(obj.produto_id, obj.estrelas, obj.ativo)) for obj in objs
+    ])
+
+
+# Exclusões não aparecem na busca por modificado_em do rollup de vendas:
+# o dia da venda é marcado para ser recalculado (ver rollups.py)
+@receiver(pre_delete, sender=Venda)
+@receiver(pre_delete, sender=Pagamento)
+def mark_rollup_day(sender, instance, **kwargs):
+    rollups.mark_day(instance.data)
+
+
+# Itens excluídos junto com a venda já têm o dia marcado pela venda; os
+# demais precisam ler a data da venda (post_delete, ver audit.deleting)
+@receiver(post_delete, sender=ItemVenda)
+def mark_rollup_day_item(sender, instance, **kwargs):
+    if is_deleted(Venda, instance.venda_id):
+        return
+    rollups.mark_day(Venda._base_manager.filter(pk=instance.venda_id).values_list('data', flat=True).first())
+
+
+# Linhas que mudaram de dia (data alterada ou item passado para outra venda)
+# saem do dia antigo, que a busca por modificado_em não encontra
+@receiver(post_save, sender=Venda)
+@receiver(post_save, sender=ItemVenda)
+@receiver(post_save, sender=Pagamento)
+def mark_rollup_old_day(sender, instance, created, **kwargs):
+    if not created:
+        rollups.mark_moved(sender, {instance.pk: instance.__dict__.get('_log_changes')})
+
+
+@receiver(post_bulk_update, sender=Venda)
+@receiver(post_bulk_update, sender=ItemVenda)
+@receiver(post_bulk_update, sender=Pagamento)
+def mark_rollup_old_day_bulk(sender, changes, **kwargs):
+    rollups.mark_moved(sender, changes)
+
+
+# Sinais para manter os totais das vendas (ver totals.py)
+@receiver(post_save, sender=ItemVenda)
+@receiver(post_save, sender=Pagamento)
+def update_order_totals(sender, instance, created, **kwargs):
+    values = totals.current_values(sender, instance)
+    if created:
+        old = None
+    else:
+        fields = instance.__dict__.get('_log_changes') or {}
+        old = totals.contribution(sender, totals.old_values(values, fields))
+    totals.apply_changes(sender, [(old, totals.contribution(sender, values))])
+
+
+# Itens e pagamentos excluídos junto com a venda não precisam atualizá-la
+@receiver(post_delete, sender=ItemVenda)
+@receiver(post_delete, sender=Pagamento)
+def remove_from_order_totals(sender, instance, **kwargs):
+    if is_deleted(Venda, instance.venda_id):
+        return
+    old = totals.contribution(sender, totals.current_values(sender, instance))
+    totals.apply_changes(sender, [(old, None)])
+
+
+@receiver(post_bulk_update, sender=ItemVenda)
+@receiver(post_bulk_update, sender=Pagamento)
+def update_order_totals_bulk(sender, changes, **kwargs):
+    totals.apply_bulk_update(sender, changes)
+
+
+@receiver(post_bulk_create, sender=ItemVenda)
+@receiver(post_bulk_create, sender=Pagamento)
+def update_order_totals_bulk_create(sender, objs, **kwargs):
+    totals.apply_bulk_create(sender, objs)
+
+
+# Alterações no desconto recalculam o total da venda
+@receiver(post_save, sender=Venda)
+def update_order_discount(sender, instance, created, **kwargs):
+    fields = instance.__dict__.get('_log_changes') or {}
+    if 'desconto' in fields or (created and instance.desconto):
+        totals.apply_discount([instance.pk])
+
+
+@receiver(post_bulk_update, sender=Venda)
+def update_order_discount_bulk(sender, changes, **kwargs):
+    totals.apply_discount([pk for pk, fields in changes.items() if 'desconto' in fields])
+
+
+# Alterações em cupons limpam o cache de cupons do processo (ver coupons.py)
+@receiver(post_save, sender=Cupom)
+@receiver(post_delete, sender=Cupom)
+@receiver(post_bulk_update, sender=Cupom)
+@receiver(post_bulk_create, sender=Cupom)
+def invalidate_coupons(sender, **kwargs):
+    transaction.on_commit(coupons.invalidate)
+
+
+# Sinais para manter os contadores de notificações não lidas (ver notifications.py)
+@receiver(post_save, sender=Notificacao)
+def update_unread_counter(sender, instance, created, **kwargs):
+    new = notifications.contribution(instance.cliente_id, instance.lida, instance.ativo)
+    if created:
+        old = None
+    else:
+        fields = instance.__dict__.get('_log_changes') or {}
+        old = notifications.old_contribution(instance.cliente_id, instance.lida, instance.ativo, fields)
+    notifications.apply_changes([(old, new)])
+
+
+@receiver(post_delete, sender=Notificacao)
+def remove_from_unread_counter(sender, instance, **kwargs):
+    old = notifications.contribution(instance.cliente_id, instance.lida, instance.ativo)
+    notifications.apply_changes([(old, None)])
+
+
+@receiver(post_bulk_update, sender=Notificacao)
+def update_unread_counter_bulk(sender, changes, **kwargs):
+    notifications.apply_bulk_update(changes)
+
+
+@receiver(post_bulk_create, sender=Notificacao)
+def update_unread_counter_bulk_create(sender, objs, **kwargs):
+    notifications.apply_changes([
+        (None, notifications.contribution(obj.cliente_id, obj.lida, obj.ativo)) for obj in objs
+    ])
+
+
+# Quedas de preço e produtos de volta geram avisos da lista de desejos (ver wishlist.py)
+@receiver(post_save, sender=Produto)
+def watch_wishlist_prices(sender, instance, created, **kwargs):
+    if not created:
+        wishlist.watch({instance.pk: instance.__dict__.get('_log_changes')})
+
+
+@receiver(post_bulk_update, sender=Produto)
+def watch_wishlist_prices_bulk(sender, changes, **kwargs):
+    wishlist.watch(changes)
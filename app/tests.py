@@ -1,3 +1,1407 @@
-from django.test import TestCase
+import csv
+import gzip
+import json
+import tempfile
+import threading
+import time
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from io import StringIO
+from pathlib import Path
+from unittest import skipUnless
+from unittest.mock import patch
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.core.paginator import InvalidPage
+from django.db import IntegrityError, connection, transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.db.models import Sum
+from django.db.models.deletion import Collector
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import (
+    Categoria, Marca, Produto, Cliente, Venda, ItemVenda, Pagamento, Avaliacao,
+    AvaliacaoResumo, Comentario, Cupom, Carrinho, ItemCarrinho, Desejo, ItemDesejo, Log, Campanha, Notificacao, VendaDiariaProduto,
+    VendaDiariaCategoria, VendaDiariaMarca, PagamentoDiario
+)
+from . import audit, caching, cart, catalog, coupons, exports, metrics, notifications, rollups, search, totals
+from .checkout import CheckoutError, checkout
+from .admin import LogAdmin
+from .management.commands.archive_logs import Command as ArchiveLogsCommand
+from .pagination import EstimatedCountPaginator, KeysetPaginator, KEYSET_ORDERING
+from .middleware import AuditUserMiddleware
+
+
+# Cache em memória no lugar do cache compartilhado (ex: Redis), para os
+# testes que contam apenas as queries da aplicação (o DatabaseCache padrão
+# também faz queries)
+MEMORY_CACHES = {
+    alias: {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': f'testes-{alias}'}
+    for alias in settings.CACHES
+}
+
+
+# Garante que cada save gera um único log, com as alterações em JSON
+class AuditLogTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.categoria = Categoria.objects.create(nome='Cabelo', descricao='Cabelo', slug='cabelo')
+        self.pk = self.categoria.pk
+
+    def logs(self):
+        return list(Log.objects.filter(tabela='categoria', objeto=self.pk).order_by('id'))
+
+    def test_one_log_per_save(self):
+        self.categoria.nome = 'Cabelos'
+        self.categoria.descricao = 'Cuidados com o cabelo'
+        self.categoria.save()
+        self.categoria.save()
+        self.categoria.delete()
+
+        created, updated, deleted = self.logs()
+        self.assertEqual(created.acao, 'CREATE')
+        self.assertEqual(created.alteracoes['nome'], [None, 'Cabelo'])
+        self.assertEqual((updated.acao, updated.campo), ('UPDATE', 'nome, descricao'))
+        self.assertEqual(updated.alteracoes, {'nome': ['Cabelo', 'Cabelos'], 'descricao': ['Cabelo', 'Cuidados com o cabelo']})
+        self.assertEqual(deleted.acao, 'DELETE')
+        self.assertEqual(deleted.alteracoes['slug'], ['cabelo', None])
+
+
+# Garante que as alterações são detectadas pelo snapshot feito no
+# carregamento, sem consultar o banco antes de cada save
+class SnapshotMixinTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        categoria = Categoria.objects.create(nome='Cabelo', descricao='Cabelo', slug='cabelo')
+        marca = Marca.objects.create(nome='Natura', descricao='Natura', slug='natura')
+        self.produto = Produto.objects.create(
+            nome='Shampoo', descricao='x', preco=10, fabricacao=date(2024, 1, 1),
+            validade=date(2025, 1, 1), categoria=categoria, marca=marca, slug='shampoo'
+        )
+        self.venda = Venda.objects.create(cliente=Cliente.objects.create(nome='Ana', email='ana@ana.com', senha='x'))
+
+    def test_changes_from_snapshot(self):
+        produto = Produto.objects.get(pk=self.produto.pk)
+        produto.preco = Decimal('12.00')
+        with self.assertNumQueries(0):
+            self.assertEqual(produto.get_changes(), {'preco': [Decimal('10.00'), Decimal('12.00')]})
+
+        # Após o save, os valores gravados passam a ser os originais
+        produto.save()
+        self.assertEqual(produto.get_changes(), {})
+
+    def test_fallback_fetch(self):
+        # Objeto que não veio do banco: os valores originais são buscados
+        produto = Produto(pk=self.produto.pk, nome='Condicionador')
+        with self.assertNumQueries(1):
+            self.assertEqual(produto.get_changes()['nome'], ['Shampoo', 'Condicionador'])
+        self.assertIsNone(Produto(pk=0, nome='x').get_changes())
+
+        produto = Produto.objects.only('nome').get(pk=self.produto.pk)
+        produto.descricao = 'y'
+        with self.assertNumQueries(1):
+            self.assertEqual(produto.get_changes(), {'descricao': ['x', 'y']})
+
+    def test_maintained_fields_are_not_saved(self):
+        venda = Venda.objects.get(pk=self.venda.pk)
+        Venda.objects.filter(pk=venda.pk).update(subtotal=Decimal('50.00'))
+        venda.desconto = Decimal('5.00')
+        with CaptureQueriesContext(connection) as context:
+            venda.save()
+        update = next(query['sql'] for query in context.captured_queries if query['sql'].startswith('UPDATE "app_venda"'))
+        self.assertNotIn('"subtotal"', update.split(' WHERE ')[0])
+        venda.refresh_from_db()
+        self.assertEqual(venda.subtotal, Decimal('50.00'))
+
+    def test_deferred_fields_are_not_loaded_on_save(self):
+        venda = Venda.objects.only('pk', 'desconto').get(pk=self.venda.pk)
+        venda.desconto = Decimal('5.00')
+        with CaptureQueriesContext(connection) as context:
+            venda.save()
+        self.assertFalse([query for query in context.captured_queries if query['sql'].startswith('SELECT "app_venda"')])
+        self.assertEqual(Venda.objects.get(pk=venda.pk).desconto, Decimal('5.00'))
+
+
+# Garante que os logs usam o usuário da requisição (WSGI e ASGI) e, sem
+# usuário autenticado, o primeiro superusuário
+@override_settings(CACHES=MEMORY_CACHES)
+class AuditUserMiddlewareTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create_superuser('admin', 'admin@admin.com', 'admin')
+        self.user = User.objects.create_user('ana', 'ana@ana.com', 'ana')
+
+    def request(self, user):
+        request = RequestFactory().get('/')
+        request.user = user
+        return request
+
+    def test_sync(self):
+        middleware = AuditUserMiddleware(lambda request: HttpResponse(str(audit.get_audit_user_id())))
+        self.assertEqual(middleware(self.request(self.user)).content, str(self.user.pk).encode())
+        self.assertEqual(middleware(self.request(AnonymousUser())).content, str(self.admin.pk).encode())
+        self.assertIsNone(audit.current_user.get())
+
+    def test_async(self):
+        async def get_response(request):
+            return HttpResponse(str(audit.get_audit_user_id()))
+
+        middleware = AuditUserMiddleware(get_response)
+        response = async_to_sync(middleware)(self.request(self.user))
+        self.assertEqual(response.content, str(self.user.pk).encode())
+        self.assertIsNone(audit.current_user.get())
+
+    def test_default_user_is_cached(self):
+        self.assertEqual(audit.get_default_user_id(), self.admin.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(audit.get_default_user_id(), self.admin.pk)
+
+        # Criar outro usuário invalida o cache (ver signals.py)
+        User.objects.filter(pk=self.admin.pk).update(is_superuser=False)
+        outro = User.objects.create_superuser('outro', 'outro@outro.com', 'outro')
+        self.assertEqual(audit.get_default_user_id(), outro.pk)
+
+
+# Garante que, no modo assíncrono, os logs só são enfileirados após o
+# commit (e descartados no rollback) e que a fila cheia grava na hora
+class AsyncLogWriterTest(TransactionTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.writer = audit.AsyncLogWriter(batch_size=10, flush_interval=0.01, max_size=100)
+        patcher = patch.object(audit, 'get_writer', return_value=self.writer)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        # Apenas durante o teste: a limpeza do banco no final recria os
+        # objetos padrão e não deve iniciar o escritor real
+        settings = self.settings(AUDIT_LOG_ASYNC=True)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        # Logs dos objetos padrão, recriados a cada teste pelo post_migrate
+        self.last_id = Log.objects.order_by('-id').values_list('id', flat=True).first() or 0
+
+    def logs(self):
+        return Log.objects.filter(tabela='categoria', id__gt=self.last_id)
+
+    def test_flush_on_commit(self):
+        self.writer.start()
+        self.addCleanup(self.writer.stop)
+        with transaction.atomic():
+            Categoria.objects.create(nome='Cabelo', descricao='Cabelo', slug='cabelo')
+            self.assertEqual(self.writer.queue.qsize(), 0)
+        self.writer.flush()
+        self.assertEqual(self.logs().count(), 1)
+
+    def test_drop_on_rollback(self):
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Categoria.objects.create(nome='Cabelo', descricao='Cabelo', slug='cabelo')
+            Categoria.objects.create(nome='Cabelo', descricao='Cabelo', slug='cabelo')
+        self.assertEqual(self.writer.queue.qsize(), 0)
+        self.assertFalse(self.logs().exists())
+
+    def test_full_queue_writes_synchronously(self):
+        # Sem a thread de fundo, a fila (de tamanho 1) não é consumida
+        self.writer = audit.AsyncLogWriter(batch_size=10, flush_interval=0.01, max_size=1)
+        audit.get_writer.return_value = self.writer
+        with self.assertLogs('app.audit', 'WARNING'):
+            Categoria.objects.create(nome='Cabelo', descricao='Cabelo', slug='cabelo')
+            Categoria.objects.create(nome='Pele', descricao='Pele', slug='pele')
+        self.assertEqual(self.writer.queue.qsize(), 1)
+        self.assertEqual(self.logs().count(), 1)
+
+    def test_failed_batch_is_written_row_by_row(self):
+        logs = [
+            Log(tabela='categoria', objeto=1, acao='UPDATE'),
+            Log(tabela=None, objeto=2, acao='UPDATE'),
+            Log(tabela='categoria', objeto=3, acao='UPDATE'),
+        ]
+        for log in logs:
+            self.writer.enqueue(log)
+        with self.assertLogs('app.audit', 'ERROR') as captured:
+            self.writer.write(logs)
+        self.assertEqual(sorted(self.logs().values_list('objeto', flat=True)), [1, 3])
+        self.assertIn('descartado', captured.output[-1])
+
+
+# Garante que as operações em lote são auditadas com um log por linha
+# alterada, gravados com um único INSERT
+class BulkAuditTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.categoria = Categoria.objects.create(nome='Cabelo', descricao='Cabelo', slug='cabelo')
+        self.marca = Marca.objects.create(nome='Natura', descricao='Natura', slug='natura')
+        self.cliente = Cliente.objects.create(nome='Ana', email='ana@ana.com', senha='x')
+
+    def produtos(self, count):
+        return [
+            Produto(
+                nome=f'Produto {n}', descricao='x', preco=10, fabricacao=date(2024, 1, 1),
+                validade=date(2025, 1, 1), categoria=self.categoria, marca=self.marca, slug=f'produto-{n}'
+            )
+            for n in range(count)
+        ]
+
+    def logs(self, tabela, acao):
+        return Log.objects.filter(tabela=tabela, acao=acao)
+
+    def inserts(self, context):
+        return [query for query in context.captured_queries if query['sql'].startswith('INSERT INTO "app_log"')]
+
+    def test_bulk_create_and_update(self):
+        with CaptureQueriesContext(connection) as context:
+            produtos = Produto.objects.bulk_create(self.produtos(5))
+        self.assertEqual(self.logs('produto', 'CREATE').filter(objeto__in=[produto.pk for produto in produtos]).count(), 5)
+        self.assertEqual(len(self.inserts(context)), 1)
+
+        # Linhas sem alteração (preço já igual) não geram log
+        Produto.objects.filter(pk=produtos[0].pk).update(preco=20)
+        with CaptureQueriesContext(connection) as context:
+            Produto.objects.filter(pk__in=[produto.pk for produto in produtos]).update(preco=20)
+        updates = self.logs('produto', 'UPDATE').exclude(objeto=produtos[0].pk)
+        self.assertEqual(updates.count(), 4)
+        self.assertEqual(updates.first().alteracoes['preco'], ['10.00', '20.00'])
+        self.assertEqual(len(self.inserts(context)), 1)
+
+    def test_update_reads_values_in_chunks(self):
+        pks = [produto.pk for produto in Produto.objects.bulk_create(self.produtos(5))]
+        with patch('app.models.BULK_CHUNK_SIZE', 2), CaptureQueriesContext(connection) as context:
+            Produto.objects.filter(pk__in=pks).update(preco=30)
+        selects = [query for query in context.captured_queries if query['sql'].startswith('SELECT "app_produto"."id", "app_produto"."preco"')]
+        self.assertEqual(len(selects), 3 * 2)  # valores antigos e novos
+        self.assertEqual(self.logs('produto', 'UPDATE').filter(objeto__in=pks).count(), 5)
+
+    # modificado_em só muda sozinho nos modelos lidos pelos rollups
+    def test_update_touches_auto_now_only_when_asked(self):
+        produto = Produto.objects.bulk_create(self.produtos(1))[0]
+        venda = Venda.objects.create(cliente=self.cliente)
+        Produto.objects.filter(pk=produto.pk).update(preco=30)
+        Venda.objects.filter(pk=venda.pk).update(desconto=1)
+        self.assertEqual(Produto.objects.get(pk=produto.pk).modificado_em, produto.modificado_em)
+        self.assertGreater(Venda.objects.get(pk=venda.pk).modificado_em, venda.modificado_em)
+
+    def test_cascade_delete(self):
+        venda = Venda.objects.create(cliente=self.cliente)
+        produto = Produto.objects.bulk_create(self.produtos(1))[0]
+        ItemVenda.objects.bulk_create([
+            ItemVenda(venda=venda, produto=produto, quantidade=1, preco=Decimal('10.00')) for _ in range(3)
+        ])
+        Pagamento.objects.create(venda=venda, valor=Decimal('10.00'))
+
+        with CaptureQueriesContext(connection) as context:
+            venda.delete()
+        self.assertEqual(self.logs('venda', 'DELETE').count(), 1)
+        self.assertEqual(self.logs('itemvenda', 'DELETE').count(), 3)
+        self.assertEqual(self.logs('pagamento', 'DELETE').count(), 1)
+        self.assertEqual(len(self.inserts(context)), 1)
+
+
+# Garante que a migração 0002 agrupa os logs antigos (um por campo) em um
+# log por save e que a reversão volta a separá-los
+class MergeLogsMigrationTest(TransactionTestCase):
+
+    def migrate(self, target):
+        executor = MigrationExecutor(connection)
+        executor.migrate([('app', target)])
+        return executor.loader.project_state([('app', target)]).apps
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes('app'))
+
+    def test_merge_and_split(self):
+        Log = self.migrate('0001_initial').get_model('app', 'Log')
+        for objeto, campo, antigo, novo in [(1, 'nome', 'A', 'B'), (1, 'preco', '1', 'None'), (2, 'nome', 'C', 'D')]:
+            Log.objects.create(tabela='teste', objeto=objeto, campo=campo, valor_antigo=antigo, valor_novo=novo, acao='UPDATE')
+
+        Log = self.migrate('0002_log_alteracoes_json').get_model('app', 'Log')
+        self.assertEqual(
+            list(Log.objects.filter(tabela='teste').order_by('id').values_list('objeto', 'campo', 'alteracoes')),
+            [(1, 'nome, preco', {'nome': ['A', 'B'], 'preco': ['1', None]}), (2, 'nome', {'nome': ['C', 'D']})],
+        )
+
+        Log = self.migrate('0001_initial').get_model('app', 'Log')
+        self.assertEqual(
+            sorted(Log.objects.filter(tabela='teste').values_list('objeto', 'campo', 'valor_novo')),
+            [(1, 'nome', 'B'), (1, 'preco', 'None'), (2, 'nome', 'D')],
+        )
+
+
+# Garante que a migração 0004 particiona app_log por mês mantendo os logs,
+# os índices e a sequência dos ids (o particionamento só existe no PostgreSQL)
+@skipUnless(connection.vendor == 'postgresql', 'particionamento apenas no PostgreSQL')
+class PartitionLogsMigrationTest(TransactionTestCase):
+
+    def migrate(self, target):
+        executor = MigrationExecutor(connection)
+        executor.migrate([('app', target)])
+        return executor.loader.project_state([('app', target)]).apps
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes('app'))
+
+    def constraints(self):
+        with connection.cursor() as cursor:
+            return connection.introspection.get_constraints(cursor, 'app_log')
+
+    def test_partition_existing_logs(self):
+        Log = self.migrate('0003_log_indices').get_model('app', 'Log')
+        # A reversão da 0004 não desfaz o particionamento: recria a tabela
+        # como ela estava antes da migração
+        with connection.schema_editor() as editor:
+            editor.delete_model(Log)
+            editor.create_model(Log)
+
+        antigo = Log.objects.create(tabela='produto', objeto=1, acao='UPDATE')
+        Log.objects.filter(pk=antigo.pk).update(criado_em=datetime(2024, 1, 15, tzinfo=dt_timezone.utc))
+        recente = Log.objects.create(tabela='produto', objeto=2, acao='UPDATE')
+        indexes = {name for name, info in self.constraints().items() if info['index'] and not info['primary_key']}
+        foreign_keys = {name for name, info in self.constraints().items() if info['foreign_key']}
+
+        Log = self.migrate('0004_log_particionamento').get_model('app', 'Log')
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT relkind FROM pg_class WHERE relname = 'app_log'")
+            self.assertEqual(cursor.fetchone()[0], 'p')
+            cursor.execute("SELECT inhrelid::regclass::text FROM pg_inherits WHERE inhparent = 'app_log'::regclass")
+            partitions = {row[0] for row in cursor.fetchall()}
+            cursor.execute('SELECT objeto FROM app_log_p202401')
+            self.assertEqual(cursor.fetchall(), [(1,)])
+
+        self.assertIn('app_log_default', partitions)
+        self.assertIn(f'app_log_p{timezone.now():%Y%m}', partitions)
+        constraints = self.constraints()
+        primary_key = next(info['columns'] for info in constraints.values() if info['primary_key'])
+        self.assertEqual(sorted(primary_key), ['criado_em', 'id'])
+        self.assertLessEqual(indexes, set(constraints))
+        self.assertLessEqual(foreign_keys, set(constraints))
+
+        self.assertEqual(sorted(Log.objects.values_list('pk', flat=True)), [antigo.pk, recente.pk])
+        novo = Log.objects.create(tabela='produto', objeto=3, acao='UPDATE')
+        self.assertGreater(novo.pk, recente.pk)
+
+
+# Garante que as consultas do catálogo de audit_indexes continuam usando índices
+class IndexCoverageTest(TestCase):
+
+    def test_catalog_queries_use_indexes(self):
+        call_command('audit_indexes', '--fail-on-scan', stdout=StringIO())
+
+
+# Garante que as listagens do admin fazem um número constante de consultas,
+# independente da quantidade de linhas exibidas
+class AdminChangelistQueriesTest(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_superuser('admin', 'admin@admin.com', 'admin')
+        self.client.force_login(self.user)
+        self.categoria = Categoria.objects.create(nome='Cabelo', descricao='Cabelo', slug='cabelo')
+        self.marca = Marca.objects.create(nome='Marca', descricao='Marca', slug='marca')
+        self.total = 0
+
+    # Cria uma linha de cada modelo testado, com relações distintas
+    def create_rows(self, count):
+        for _ in range(count):
+            self.total += 1
+            n = self.total
+            cliente = Cliente.objects.create(nome=f'Cliente {n}', email=f'c{n}@c.com', senha='x')
+            produto = Produto.objects.create(
+                nome=f'Produto {n}', descricao='x', preco=10, fabricacao=date(2024, 1, 1),
+                validade=date(2025, 1, 1), categoria=self.categoria, marca=self.marca, slug=f'produto-{n}'
+            )
+            venda = Venda.objects.create(cliente=cliente)
+            Pagamento.objects.create(venda=venda, valor=10)
+            avaliacao = Avaliacao.objects.create(produto=produto, cliente=cliente, estrelas=5)
+            Comentario.objects.create(avaliacao=avaliacao, texto='Muito bom')
+            carrinho = Carrinho.objects.create(cliente=cliente)
+            ItemCarrinho.objects.create(carrinho=carrinho, produto=produto, quantidade=1)
+            desejo = Desejo.objects.create(cliente=cliente)
+            ItemDesejo.objects.create(desejo=desejo, produto=produto, quantidade=1)
+
+    def count_queries(self, model):
+        url = reverse(f'admin:app_{model._meta.model_name}_changelist')
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries)
+
+    def test_constant_queries_per_changelist(self):
+        models = [Venda, Pagamento, Avaliacao, Comentario, Carrinho, ItemCarrinho, ItemDesejo, Produto]
+
+        self.create_rows(2)
+        few = {model: self.count_queries(model) for model in models}
+        self.create_rows(20)
+        many = {model: self.count_queries(model) for model in models}
+
+        self.assertEqual(few, many)
+
+
+# Garante que os filtros por chave estrangeira carregam apenas o objeto
+# selecionado e que a contagem sem filtros usa a estimativa do banco
+class AdminFilterScalabilityTest(TestCase):
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@admin.com', 'admin'))
+        categoria = Categoria.objects.create(nome='Cabelo', descricao='Cabelo', slug='cabelo')
+        self.marcas = Marca.objects.bulk_create([
+            Marca(nome=f'Marca {n}', descricao='x', slug=f'marca-{n}') for n in range(2)
+        ])
+        self.produtos = Produto.objects.bulk_create([
+            Produto(
+                nome=f'Produto {n}', descricao='x', preco=10, fabricacao=date(2024, 1, 1), validade=date(2025, 1, 1),
+                categoria=categoria, marca=self.marcas[n % 2], slug=f'produto-{n}'
+            )
+            for n in range(3)
+        ])
+
+    def changelist(self, **params):
+        url = reverse('admin:app_produto_changelist')
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return response, len(context.captured_queries)
+
+    def test_autocomplete_filter(self):
+        marca = self.marcas[1]
+        response, queries = self.changelist(marca__id__exact=marca.pk)
+        self.assertEqual(list(response.context['cl'].result_list), [self.produtos[1]])
+        self.assertContains(response, 'autocomplete-filter')
+        self.assertContains(response, f'<option value="{marca.pk}" selected>Marca 1</option>', html=True)
+        self.assertNotContains(response, 'Marca 0</option>')
+
+        # As demais marcas não são carregadas na página
+        Marca.objects.bulk_create([Marca(nome=f'Outra {n}', descricao='x', slug=f'outra-{n}') for n in range(30)])
+        self.assertEqual(self.changelist(marca__id__exact=marca.pk)[1], queries)
+
+    def test_estimated_count(self):
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        queryset = Produto.objects.all()
+        with patch('app.pagination.ESTIMATE_THRESHOLD', 1):
+            with CaptureQueriesContext(connection) as context:
+                count = EstimatedCountPaginator(queryset, 10).count
+            self.assertEqual(count, queryset.count())
+            self.assertFalse([query for query in context.captured_queries if 'COUNT(' in query['sql']])
+
+            # Com filtros, a contagem é exata
+            filtered = EstimatedCountPaginator(queryset.filter(marca=self.marcas[0]), 10)
+            self.assertEqual(filtered.count, 2)
+
+        # Abaixo do limite, também é exata
+        with CaptureQueriesContext(connection) as context:
+            EstimatedCountPaginator(queryset, 10).count
+        self.assertTrue([query for query in context.captured_queries if 'COUNT(' in query['sql']])
+
+
+# Garante que a busca textual do admin acompanha as alterações nos campos
+# de busca, inclusive os de modelos relacionados
+class AdminFullTextSearchTest(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_superuser('admin', 'admin@admin.com', 'admin')
+        self.client.force_login(self.user)
+        self.categoria = Categoria.objects.create(nome='Cabelo', descricao='Cabelo', slug='cabelo')
+        self.marca = Marca.objects.create(nome='Natura', descricao='Natura', slug='natura')
+        self.produto = Produto.objects.create(
+            nome='Shampoo Hidratante', descricao='x', preco=10, fabricacao=date(2024, 1, 1),
+            validade=date(2025, 1, 1), categoria=self.categoria, marca=self.marca, slug='shampoo'
+        )
+
+    def search(self, term):
+        response = self.client.get(reverse('admin:app_produto_changelist'), {'q': term})
+        self.assertEqual(response.status_code, 200)
+        return list(response.context['cl'].result_list)
+
+    def test_search_follows_changes(self):
+        self.assertEqual(self.search('hidrat natura'), [self.produto])
+
+        self.marca.nome = 'Boticário'
+        self.marca.save()
+        self.assertEqual(self.search('natura'), [])
+        self.assertEqual(self.search('botic'), [self.produto])
+
+        Produto.objects.filter(pk=self.produto.pk).update(nome='Condicionador')
+        self.assertEqual(self.search('hidratante'), [])
+        self.assertEqual(self.search('CONDIC'), [self.produto])
+
+        self.produto.delete()
+        self.assertEqual(self.search('condic'), [])
+
+    def test_related_changes_are_reindexed_in_chunks(self):
+        Produto.objects.bulk_create([
+            Produto(
+                nome=f'Creme {n}', descricao='x', preco=10, fabricacao=date(2024, 1, 1), validade=date(2025, 1, 1),
+                categoria=self.categoria, marca=self.marca, slug=f'creme-{n}',
+            )
+            for n in range(5)
+        ])
+        with patch.object(search, 'CHUNK_SIZE', 2), CaptureQueriesContext(connection) as context:
+            self.marca.nome = 'Eudora'
+            self.marca.save()
+        # 6 produtos refeitos em 3 lotes de 2
+        batches = [query for query in context.captured_queries if "tabela = 'produto'" in query['sql']]
+        self.assertEqual(len(batches), 3)
+        self.assertEqual(len(self.search('eudora')), 6)
+
+    def test_unregistered_models_keep_fast_delete(self):
+        self.assertTrue(Collector(using='default').can_fast_delete(Log.objects.all()))
+        self.assertFalse(Collector(using='default').can_fast_delete(Produto.objects.all()))
+
+    def test_models_are_registered_without_the_admin(self):
+        self.assertIn(Produto, search.registered_models())
+        self.assertNotIn(Log, search.registered_models())
+        self.assertNotIn(Pagamento, search.registered_models())
+
+        with patch.object(search, 'update_index') as update_index:
+            Log.objects.create(tabela='produto', objeto=self.produto.pk, acao='U', usuario=self.user)
+            update_index.assert_not_called()
+
+            self.produto.nome = 'Shampoo Nutritivo'
+            self.produto.save()
+            update_index.assert_called_once()
+
+
+# Garante que o catálogo é servido do cache e invalidado quando os dados
+# mudam, com os caches de settings.py (o catálogo fica fora do banco)
+class CatalogCacheTest(TestCase):
+
+    def setUp(self):
+        catalog.cache.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.categoria = Categoria.objects.create(nome='Cabelo', descricao='Cabelo', slug='cabelo')
+            self.marca = Marca.objects.create(nome='Natura', descricao='Natura', slug='natura')
+            self.produto = Produto.objects.create(
+                nome='Shampoo', descricao='x', preco=10, fabricacao=date(2024, 1, 1),
+                validade=date(2025, 1, 1), categoria=self.categoria, marca=self.marca, slug='shampoo'
+            )
+
+    def get_json(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_cached_pages_do_not_query(self):
+        url = reverse('catalogo_categoria', args=['cabelo'])
+        self.get_json(url)
+        with self.assertNumQueries(0):
+            data = self.get_json(url)
+        self.assertEqual([card['slug'] for card in data['produtos']], ['shampoo'])
+
+        url = reverse('catalogo_produto', args=['shampoo'])
+        self.get_json(url)
+        with self.assertNumQueries(0):
+            self.get_json(url)
+
+    def test_invalidation(self):
+        listing = reverse('catalogo_marca', args=['natura'])
+        self.get_json(listing)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.marca.nome = 'Natura Brasil'
+            self.marca.save()
+        self.assertEqual(self.get_json(listing)['produtos'][0]['marca']['nome'], 'Natura Brasil')
+
+        cliente = Cliente.objects.create(nome='Ana', email='ana@ana.com', senha='x')
+        with self.captureOnCommitCallbacks(execute=True):
+            Avaliacao.objects.create(produto=self.produto, cliente=cliente, estrelas=4)
+        self.assertEqual(self.get_json(listing)['produtos'][0]['avaliacoes'], {'total': 1, 'media': 4.0})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Produto.objects.filter(pk=self.produto.pk).update(ativo=False)
+        self.assertEqual(self.get_json(listing)['produtos'], [])
+        self.assertEqual(self.client.get(reverse('catalogo_produto', args=['shampoo'])).status_code, 404)
+
+    # Invalidações de outros processos não chegam ao LocMemCache
+    @override_settings(CATALOG_CACHE_TIMEOUT=86400, CATALOG_LOCAL_CACHE_TIMEOUT=30)
+    def test_short_timeout_with_process_local_cache(self):
+        self.assertEqual(catalog._timeout(), 30)
+        with override_settings(CACHES={**settings.CACHES, 'catalogo': settings.CACHES['default']}):
+            self.assertEqual(catalog._timeout(), 86400)
+
+
+# Garante que o resumo incremental das avaliações bate com o recálculo completo
+class RatingSummaryTest(TestCase):
+
+    def test_incremental_summary_matches_reconcile(self):
+        categoria = Categoria.objects.create(nome='Cabelo', descricao='Cabelo', slug='cabelo')
+        marca = Marca.objects.create(nome='Natura', descricao='Natura', slug='natura')
+        produtos = [
+            Produto.objects.create(
+                nome=f'Produto {n}', descricao='x', preco=10, fabricacao=date(2024, 1, 1),
+                validade=date(2025, 1, 1), categoria=categoria, marca=marca, slug=f'produto-{n}'
+            )
+            for n in range(2)
+        ]
+        cliente = Cliente.objects.create(nome='Ana', email='ana@ana.com', senha='x')
+
+        avaliacoes = [Avaliacao.objects.create(produto=produtos[0], cliente=cliente, estrelas=n) for n in (5, 4, 3)]
+        avaliacoes[0].estrelas = 1
+        avaliacoes[0].save()
+        avaliacoes[1].produto = produtos[1]
+        avaliacoes[1].save()
+        Avaliacao.objects.filter(pk=avaliacoes[2].pk).update(ativo=False)
+        Avaliacao.objects.bulk_create([Avaliacao(produto=produtos[1], cliente=cliente, estrelas=2)])
+        avaliacoes[0].delete()
+
+        resumo = produtos[1].resumo_avaliacoes
+        resumo.refresh_from_db()
+        self.assertEqual((resumo.total, resumo.soma, resumo.media), (2, 6, 3.0))
+        self.assertEqual(resumo.histograma, {1: 0, 2: 1, 3: 0, 4: 1, 5: 0})
+
+        output = StringIO()
+        call_command('reconcile_ratings', '--dry-run', stdout=output)
+        self.assertIn('0 resumo(s)', output.getvalue())
+
+        # Diferenças de arredondamento na média não contam como divergência
+        AvaliacaoResumo.objects.filter(pk=resumo.pk).update(media=3.0 + 1e-13)
+        call_command('reconcile_ratings', '--dry-run', stdout=output)
+        self.assertIn('0 resumo(s)', output.getvalue().splitlines()[-1])
+        AvaliacaoResumo.objects.filter(pk=resumo.pk).update(media=3.5)
+        call_command('reconcile_ratings', '--dry-run', stdout=output)
+        self.assertIn('1 resumo(s)', output.getvalue().splitlines()[-1])
+
+
+# Garante que a paginação por cursor percorre todas as linhas, nos dois sentidos
+class KeysetPaginationTest(TestCase):
+
+    def setUp(self):
+        Log.objects.bulk_create([Log(tabela='teste', objeto=n, acao='UPDATE') for n in range(25)])
+        self.queryset = Log.objects.filter(tabela='teste')
+        self.expected = list(self.queryset.order_by(*KEYSET_ORDERING).values_list('pk', flat=True))
+
+    def test_forward_and_backward(self):
+        paginator = KeysetPaginator(self.queryset, 10)
+        pages = [paginator.page()]
+        while pages[-1].has_next():
+            pages.append(paginator.page(pages[-1].next_cursor))
+        self.assertEqual([obj.pk for page in pages for obj in page], self.expected)
+        self.assertFalse(pages[0].has_previous())
+
+        previous = paginator.page(pages[-1].previous_cursor)
+        self.assertEqual([obj.pk for obj in previous], self.expected[10:20])
+        self.assertTrue(previous.has_previous())
+
+        with self.assertRaises(InvalidPage):
+            paginator.page('invalido')
+
+    def test_admin_changelist(self):
+        user = User.objects.create_superuser('admin', 'admin@admin.com', 'admin')
+        self.client.force_login(user)
+        url = reverse('admin:app_log_changelist')
+
+        with patch.object(LogAdmin, 'list_per_page', 20):
+            response = self.client.get(url, {'tabela': 'teste'})
+            page = response.context['cl'].keyset_page
+            self.assertEqual([obj.pk for obj in page], self.expected[:20])
+
+            response = self.client.get(url, {'tabela': 'teste', 'p': page.next_cursor})
+            self.assertEqual([obj.pk for obj in response.context['cl'].result_list], self.expected[20:])
+            self.assertContains(response, '‹ Anterior')
+
+
+# Garante que a exportação em streaming gera todas as linhas, com e sem gzip
+class ExportTest(TestCase):
+
+    def test_streaming_exports(self):
+        Log.objects.bulk_create([Log(tabela='teste', objeto=n, acao='UPDATE', alteracoes={'n': [n, n + 1]}) for n in range(5000)])
+        queryset = Log.objects.filter(tabela='teste')
+
+        chunks = list(exports.export_chunks(queryset, 'csv', compress=True))
+        self.assertGreater(len(chunks), 1)
+        rows = list(csv.reader(StringIO(gzip.decompress(b''.join(chunks)).decode())))
+        self.assertEqual(len(rows), 5001)
+        self.assertEqual(json.loads(rows[1][exports.EXPORT_FIELDS[Log].index('alteracoes')]), {'n': [0, 1]})
+
+        lines = b''.join(exports.export_chunks(queryset, 'jsonl')).decode().splitlines()
+        self.assertEqual([json.loads(line)['objeto'] for line in lines], list(range(5000)))
+
+
+# Garante que o arquivamento dos logs é idempotente: repetir um mês (ex: após
+# uma falha no meio da remoção) não repete nem perde logs no arquivo
+class ArchiveLogsTest(TestCase):
+
+    def setUp(self):
+        self.destino = tempfile.TemporaryDirectory()
+        self.addCleanup(self.destino.cleanup)
+        logs = Log.objects.bulk_create([Log(tabela='teste', objeto=n, acao='UPDATE') for n in range(5)])
+        self.ids = [log.pk for log in logs]
+        Log.objects.filter(pk__in=self.ids).update(criado_em=datetime(2024, 1, 15, tzinfo=dt_timezone.utc))
+        self.path = Path(self.destino.name) / 'log-2024-01.jsonl.gz'
+
+    def archive(self, *args):
+        output = StringIO()
+        call_command('archive_logs', '--meses-retencao', '1', '--destino', self.destino.name, *args, stdout=output)
+        return output.getvalue()
+
+    def archived_ids(self):
+        with gzip.open(self.path, 'rt', encoding='utf-8') as file:
+            return [json.loads(line)['id'] for line in file]
+
+    def test_dry_run(self):
+        self.assertIn('Seria arquivado: 2024-01', self.archive('--dry-run'))
+        self.assertFalse(self.path.exists())
+        self.assertEqual(Log.objects.filter(pk__in=self.ids).count(), 5)
+
+    def test_archive_then_delete(self):
+        self.assertIn('2024-01: 5 logs arquivados', self.archive())
+        self.assertEqual(self.archived_ids(), self.ids)
+        self.assertFalse(Log.objects.filter(pk__in=self.ids).exists())
+        self.assertEqual(list(self.path.parent.iterdir()), [self.path])
+
+    def test_rerun_after_interrupted_removal(self):
+        def remove_some(command, month, partitioned):
+            Log.objects.filter(pk__in=self.ids[:2]).delete()
+            raise RuntimeError('falha no meio da remoção')
+
+        with patch.object(ArchiveLogsCommand, 'remove_month', remove_some), self.assertRaises(RuntimeError):
+            self.archive()
+        self.assertEqual(Log.objects.filter(pk__in=self.ids).count(), 3)
+
+        self.archive()
+        self.assertEqual(self.archived_ids(), self.ids)
+        self.assertFalse(Log.objects.filter(pk__in=self.ids).exists())
+
+
+# Garante que a importação cria e atualiza produtos pelo slug com um log por lote
+class ImportCatalogTest(TestCase):
+
+    def test_import_and_upsert(self):
+        path = Path(self.enterContext(tempfile.TemporaryDirectory())) / 'catalogo.jsonl'
+        rows = [
+            {'nome': f'Produto {n}', 'preco': '9.90', 'fabricacao': '2024-01-01', 'validade': '2025-01-01',
+             'categoria': 'cabelo', 'categoria_nome': 'Cabelo', 'marca': f'marca-{n % 2}'}
+            for n in range(5)
+        ]
+        path.write_text('\n'.join(json.dumps(row) for row in rows))
+        logs = Log.objects.count()
+
+        call_command('import_catalog', str(path), '--lote', '2', stdout=StringIO())
+        self.assertEqual(Produto.objects.filter(categoria__slug='cabelo').count(), 5)
+        self.assertEqual(Marca.objects.filter(slug__startswith='marca-').count(), 2)
+        imports = Log.objects.filter(acao='IMPORT')
+        self.assertEqual(imports.count(), 3)
+        self.assertEqual(Log.objects.count() - logs, 3 + 3)  # lotes + categoria e marcas criadas
+
+        rows[0]['preco'] = '19.90'
+        path.write_text(json.dumps(rows[0]))
+        call_command('import_catalog', str(path), stdout=StringIO())
+        produto = Produto.objects.get(slug='produto-0')
+        self.assertEqual(str(produto.preco), '19.90')
+        self.assertEqual(Log.objects.filter(acao='IMPORT').last().alteracoes['atualizados'], [produto.pk])
+
+    def test_price_drop_notifies_wishlist(self):
+        path = Path(self.enterContext(tempfile.TemporaryDirectory())) / 'catalogo.jsonl'
+        row = {'nome': 'Shampoo', 'preco': '20.00', 'fabricacao': '2024-01-01', 'validade': '2025-01-01',
+               'categoria': 'cabelo', 'marca': 'natura'}
+        path.write_text(json.dumps(row))
+        call_command('import_catalog', str(path), stdout=StringIO())
+        cliente = Cliente.objects.create(nome='Ana', email='ana@ana.com', senha='x')
+        desejo = Desejo.objects.create(cliente=cliente)
+        ItemDesejo.objects.create(desejo=desejo, produto=Produto.objects.get(slug='shampoo'), quantidade=1)
+
+        path.write_text(json.dumps({**row, 'preco': '15.00'}))
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('import_catalog', str(path), stdout=StringIO())
+        self.assertIn('baixou de R$ 20.00 para R$ 15.00', cliente.notificacao_set.get().texto)
+
+    def test_rows_without_slug_are_rejected(self):
+        path = Path(self.enterContext(tempfile.TemporaryDirectory())) / 'catalogo.jsonl'
+        path.write_text(json.dumps({'nome': '!!!', 'preco': '9.90', 'fabricacao': '2024-01-01',
+                                    'validade': '2025-01-01', 'categoria': 'cabelo', 'marca': 'natura'}))
+        produtos, stderr = Produto.objects.count(), StringIO()
+        call_command('import_catalog', str(path), stdout=StringIO(), stderr=stderr)
+        self.assertIn('slug vazio', stderr.getvalue())
+        self.assertEqual(Produto.objects.count(), produtos)
+
+
+# Garante que o processamento incremental dos rollups acompanha alterações e exclusões
+@patch.object(rollups, 'SAFETY_LAG', timedelta(0))
+class SalesRollupTest(TestCase):
+
+    def setUp(self):
+        categoria = Categoria.objects.create(nome='Cabelo', descricao='Cabelo', slug='cabelo')
+        marca = Marca.objects.create(nome='Natura', descricao='Natura', slug='natura')
+        self.produto = Produto.objects.create(
+            nome='Shampoo', descricao='x', preco=10, fabricacao=date(2024, 1, 1),
+            validade=date(2025, 1, 1), categoria=categoria, marca=marca, slug='shampoo'
+        )
+        cliente = Cliente.objects.create(nome='Ana', email='ana@ana.com', senha='x')
+        self.venda = Venda.objects.create(cliente=cliente)
+        self.itens = [
+            ItemVenda.objects.create(venda=self.venda, produto=self.produto, quantidade=n, preco=Decimal('10.50'))
+            for n in (1, 2)
+        ]
+        Pagamento.objects.create(venda=self.venda, valor=Decimal('31.50'))
+
+    def totals(self, model):
+        return list(model.objects.values_list('quantidade', 'receita'))
+
+    def test_incremental_rollups(self):
+        today = rollups.run()
+        self.assertEqual(len(today), 1)
+        self.assertEqual(self.totals(VendaDiariaProduto), [(3, Decimal('31.50'))])
+        self.assertEqual(self.totals(VendaDiariaCategoria), [(3, Decimal('31.50'))])
+        self.assertEqual(self.totals(VendaDiariaMarca), [(3, Decimal('31.50'))])
+        self.assertEqual(list(PagamentoDiario.objects.values_list('quantidade', 'total')), [(1, Decimal('31.50'))])
+
+        # Sem alterações, nenhum dia é recalculado
+        self.assertEqual(rollups.run(), [])
+
+        self.itens[0].delete()
+        self.assertEqual(rollups.run(), today)
+        self.assertEqual(self.totals(VendaDiariaProduto), [(2, Decimal('21.00'))])
+
+        ItemVenda.objects.filter(pk=self.itens[1].pk).update(quantidade=4)
+        rollups.run()
+        self.assertEqual(self.totals(VendaDiariaMarca), [(4, Decimal('42.00'))])
+
+        self.venda.delete()
+        self.assertEqual(rollups.run(), today)
+        self.assertFalse(VendaDiariaProduto.objects.exists())
+        self.assertFalse(PagamentoDiario.objects.exists())
+
+    def test_moved_rows_rebuild_the_old_day(self):
+        today = timezone.localdate()
+        yesterday = timezone.now() - timedelta(days=1)
+        outra = Venda.objects.create(cliente=self.venda.cliente)
+        Venda.objects.filter(pk=outra.pk).update(data=yesterday)
+        rollups.run()
+
+        def quantities():
+            return dict(VendaDiariaProduto.objects.values_list('dia', 'quantidade'))
+
+        self.itens[0].venda = outra
+        self.itens[0].save()
+        rollups.run()
+        self.assertEqual(quantities(), {today: 2, timezone.localdate(yesterday): 1})
+
+        Venda.objects.filter(pk=self.venda.pk).update(data=yesterday)
+        rollups.run()
+        self.assertEqual(quantities(), {timezone.localdate(yesterday): 3})
+
+    def test_cascade_marks_day_once(self):
+        ItemVenda.objects.bulk_create([
+            ItemVenda(venda=self.venda, produto=self.produto, quantidade=1, preco=Decimal('1.00')) for _ in range(20)
+        ])
+        with CaptureQueriesContext(connection) as context:
+            self.venda.delete()
+        marks = [query for query in context.captured_queries if 'app_rolluppendente' in query['sql']]
+        # Um dia marcado pela venda e outro pelo pagamento, nenhum pelos itens
+        self.assertEqual(len(marks), 2)
+        self.assertEqual(rollups.run(), [timezone.localdate()])
+
+    def test_dashboard(self):
+        call_command('rollup_sales', stdout=StringIO())
+        user = User.objects.create_superuser('admin', 'admin@admin.com', 'admin')
+        self.client.force_login(user)
+        response = self.client.get(reverse('admin:app_venda_dashboard'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['por_dia'][0]['receita'], Decimal('31.50'))
+        self.assertContains(response, 'Shampoo')
+
+
+# Garante que os totais das vendas acompanham itens, pagamentos e descontos
+class OrderTotalsTest(TestCase):
+
+    def setUp(self):
+        categoria = Categoria.objects.create(nome='Cabelo', descricao='Cabelo', slug='cabelo')
+        marca = Marca.objects.create(nome='Natura', descricao='Natura', slug='natura')
+        self.produto = Produto.objects.create(
+            nome='Shampoo', descricao='x', preco=10, fabricacao=date(2024, 1, 1),
+            validade=date(2025, 1, 1), categoria=categoria, marca=marca, slug='shampoo'
+        )
+        cliente = Cliente.objects.create(nome='Ana', email='ana@ana.com', senha='x')
+        self.vendas = [Venda.objects.create(cliente=cliente) for _ in range(2)]
+
+    def totals(self, venda):
+        venda.refresh_from_db()
+        return venda.subtotal, venda.desconto, venda.total, venda.valor_pago
+
+    def test_totals_follow_changes(self):
+        venda, outra = self.vendas
+        item = ItemVenda.objects.create(venda=venda, produto=self.produto, quantidade=2, preco=Decimal('10.50'))
+        ItemVenda.objects.bulk_create([ItemVenda(venda=venda, produto=self.produto, quantidade=1, preco=Decimal('5.00'))])
+        pagamento = Pagamento.objects.create(venda=venda, valor=Decimal('20.00'))
+        self.assertEqual(self.totals(venda), (Decimal('26.00'), 0, Decimal('26.00'), Decimal('20.00')))
+        self.assertEqual(list(totals.unpaid()), [venda])
+
+        # Um save com totais desatualizados em memória não os sobrescreve
+        venda.desconto = Decimal('6.00')
+        venda.subtotal = 0
+        venda.save()
+        self.assertEqual(self.totals(venda), (Decimal('26.00'), Decimal('6.00'), Decimal('20.00'), Decimal('20.00')))
+        self.assertEqual(list(totals.unpaid()), [])
+
+        item.quantidade = 3
+        item.save()
+        item.venda = outra
+        item.save()
+        self.assertEqual(self.totals(venda)[0], Decimal('5.00'))
+        self.assertEqual(self.totals(outra)[0], Decimal('31.50'))
+
+        ItemVenda.objects.filter(pk=item.pk).update(ativo=False)
+        Pagamento.objects.filter(pk=pagamento.pk).update(valor=Decimal('1.00'))
+        self.assertEqual(self.totals(outra)[0], 0)
+        self.assertEqual(self.totals(venda), (Decimal('5.00'), Decimal('6.00'), 0, Decimal('1.00')))
+
+        pagamento.refresh_from_db()
+        pagamento.delete()
+        self.assertEqual(self.totals(venda)[3], 0)
+
+        output = StringIO()
+        call_command('reconcile_order_totals', '--dry-run', stdout=output)
+        self.assertIn('0 venda(s)', output.getvalue())
+
+    def test_cascade_does_not_update_deleted_order(self):
+        venda = self.vendas[0]
+        ItemVenda.objects.bulk_create([
+            ItemVenda(venda=venda, produto=self.produto, quantidade=1, preco=Decimal('1.00')) for _ in range(10)
+        ])
+        Pagamento.objects.create(venda=venda, valor=Decimal('10.00'))
+        with CaptureQueriesContext(connection) as context:
+            venda.delete()
+        self.assertFalse([query for query in context.captured_queries if query['sql'].startswith('UPDATE "app_venda"')])
+
+    def test_export_includes_totals(self):
+        venda = self.vendas[0]
+        ItemVenda.objects.create(venda=venda, produto=self.produto, quantidade=2, preco=Decimal('10.50'))
+        row = json.loads(b''.join(exports.export_chunks(Venda.objects.filter(pk=venda.pk), 'jsonl')))
+        self.assertEqual((Decimal(row['subtotal']), Decimal(row['total'])), (Decimal('21.00'), Decimal('21.00')))
+
+
+# Garante que o carrinho em cache não consulta o banco e é gravado em lotes
+@override_settings(CACHES=MEMORY_CACHES)
+class CartServiceTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        cart.cache.clear()
+        categoria = Categoria.objects.create(nome='Cabelo', descricao='Cabelo', slug='cabelo')
+        marca = Marca.objects.create(nome='Natura', descricao='Natura', slug='natura')
+        self.produtos = [
+            Produto.objects.create(
+                nome=f'Produto {n}', descricao='x', preco=10, fabricacao=date(2024, 1, 1),
+                validade=date(2025, 1, 1), categoria=categoria, marca=marca, slug=f'produto-{n}'
+            ).pk
+            for n in range(3)
+        ]
+        self.clientes = [
+            Cliente.objects.create(nome=f'Cliente {n}', email=f'cliente{n}@teste.com', senha='x').pk
+            for n in range(3)
+        ]
+
+    def items(self, cliente_id):
+        return dict(
+            ItemCarrinho.objects.filter(carrinho__cliente_id=cliente_id, ativo=True)
+            .values_list('produto_id', 'quantidade')
+        )
+
+    def test_write_behind(self):
+        a, b, c = self.produtos
+        self.assertEqual(cart.get(self.clientes[0]), {})
+        with self.assertNumQueries(0):
+            cart.add(self.clientes[0], a)
+            cart.add(self.clientes[0], a, 2)
+            cart.update(self.clientes[0], b, 5)
+            self.assertEqual(cart.get(self.clientes[0]), {a: 3, b: 5})
+        for cliente_id in self.clientes[1:]:
+            cart.add(cliente_id, c)
+        self.assertFalse(ItemCarrinho.objects.filter(carrinho__cliente_id__in=self.clientes).exists())
+
+        self.assertEqual(cart.flush(), 3)
+        self.assertEqual(self.items(self.clientes[0]), {a: 3, b: 5})
+        self.assertEqual(self.items(self.clientes[2]), {c: 1})
+        self.assertEqual(Log.objects.filter(tabela='itemcarrinho', acao='SYNC').count(), 1)
+        self.assertEqual(cart.flush(), 0)
+
+        # Removidos são desativados e reativados pelo upsert ao voltar ao carrinho
+        cart.remove(self.clientes[0], a)
+        cart.update(self.clientes[0], b, 1)
+        cart.sync(self.clientes[0])
+        self.assertEqual(self.items(self.clientes[0]), {b: 1})
+        cart.add(self.clientes[0], a)
+        cart.flush()
+        self.assertEqual(self.items(self.clientes[0]), {a: 1, b: 1})
+        self.assertEqual(ItemCarrinho.objects.filter(carrinho__cliente_id=self.clientes[0]).count(), 2)
+
+        # Sem o cache, o carrinho é carregado do banco
+        cart.cache.clear()
+        self.assertEqual(cart.get(self.clientes[0]), {a: 1, b: 1})
+
+    def test_concurrent_changes_are_not_lost(self):
+        cliente_id, produto_id = self.clientes[0], self.produtos[0]
+        cart.get(cliente_id)
+        get = cart.get
+
+        # Leitura lenta: sem a trava, as threads gravariam por cima umas das outras
+        def slow_get(cliente_id):
+            items = get(cliente_id)
+            time.sleep(0.001)
+            return items
+
+        def add():
+            for _ in range(25):
+                cart.add(cliente_id, produto_id)
+
+        threads = [threading.Thread(target=add) for _ in range(8)]
+        with patch.object(cart, 'get', slow_get):
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(cart.get(cliente_id), {produto_id: 200})
+
+    def test_flush_queries_do_not_grow_with_carts(self):
+        a, b, c = self.produtos
+        for cliente_id in self.clientes:
+            cart.update(cliente_id, a, 1)
+            cart.update(cliente_id, b, 1)
+        cart.flush()
+
+        def flush_queries(cliente_ids):
+            for cliente_id in cliente_ids:
+                cart.remove(cliente_id, a)
+                cart.add(cliente_id, c)
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(cart.flush(), len(cliente_ids))
+            return len(queries)
+
+        self.assertEqual(flush_queries(self.clientes[:1]), flush_queries(self.clientes))
+        self.assertEqual(self.items(self.clientes[0]), {b: 1, c: 2})
+        self.assertEqual(self.items(self.clientes[2]), {b: 1, c: 1})
+
+    def test_flush_requires_shared_cache(self):
+        with self.assertRaisesMessage(CommandError, 'pertence a um único processo'):
+            call_command('flush_carts', stdout=StringIO())
+
+    def test_missing_queue_entry_is_retried_then_skipped(self):
+        cart.add(self.clientes[0], self.produtos[0])
+        cart.cache.incr(cart.QUEUE_END)
+        cart.add(self.clientes[1], self.produtos[0])
+        self.assertEqual(cart.flush(), 1)
+        self.assertEqual(cart.flush(), 1)
+        self.assertEqual(self.items(self.clientes[1]), {self.produtos[0]: 1})
+
+    # Com o DatabaseCache padrão, ao passar de MAX_ENTRIES as chaves são
+    # descartadas em ordem alfabética (carrinho:* antes de catalogo:*)
+    @override_settings(CACHES={
+        **settings.CACHES,
+        'default': {**settings.CACHES['default'], 'OPTIONS': {'MAX_ENTRIES': 10, 'CULL_FREQUENCY': 2}},
+    })
+    def test_carts_survive_a_full_default_cache(self):
+        self.assertFalse(caching.is_process_local(cart.CACHE_ALIAS))
+        cart.add(self.clientes[0], self.produtos[0])
+        for n in range(50):
+            cache.set(catalog.card_key(n), '{}')
+        self.assertLess(len(cache.get_many([catalog.card_key(n) for n in range(50)])), 50)
+
+        self.assertEqual(cart.flush(), 1)
+        self.assertEqual(self.items(self.clientes[0]), {self.produtos[0]: 1})
+
+
+# Garante que o checkout grava a venda completa e não grava nada quando falha
+class CheckoutTest(TestCase):
+
+    endereco = {'rua': 'Rua A', 'numero': '1', 'bairro': 'Centro', 'cidade': 'Campinas', 'estado': 'SP', 'cep': '13000-000'}
+
+    def setUp(self):
+        cache.clear()
+        coupons.invalidate()
+        categoria = Categoria.objects.create(nome='Cabelo', descricao='Cabelo', slug='cabelo')
+        marca = Marca.objects.create(nome='Natura', descricao='Natura', slug='natura')
+        self.produtos = [
+            Produto.objects.create(
+                nome=f'Produto {n}', descricao='x', preco=Decimal('10.00') * (n + 1), fabricacao=date(2024, 1, 1),
+                validade=date(2025, 1, 1), categoria=categoria, marca=marca, slug=f'produto-{n}'
+            )
+            for n in range(2)
+        ]
+        self.cliente = Cliente.objects.create(nome='Ana', email='ana@ana.com', senha='x')
+        Cupom.objects.create(codigo='DEZ', desconto=Decimal('10.00'))
+
+    def test_checkout(self):
+        cart.add(self.cliente.pk, self.produtos[0].pk, 2)
+        cart.add(self.cliente.pk, self.produtos[1].pk)
+        cart.sync(self.cliente.pk)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            venda = checkout(self.cliente.pk, self.endereco, cupom='DEZ')
+        venda.refresh_from_db()
+        self.assertEqual(
+            (venda.subtotal, venda.desconto, venda.total, venda.valor_pago),
+            (Decimal('40.00'), Decimal('10.00'), Decimal('30.00'), Decimal('30.00')),
+        )
+        self.assertEqual(venda.itemvenda_set.count(), 2)
+        self.assertEqual(venda.enderecoentrega_set.get().cidade, 'Campinas')
+        self.assertEqual(cart.get(self.cliente.pk), {})
+        self.assertFalse(Carrinho.objects.filter(cliente=self.cliente, ativo=True).exists())
+
+    def test_failed_checkout_changes_nothing(self):
+        cart.add(self.cliente.pk, self.produtos[0].pk)
+        cart.add(self.cliente.pk, self.produtos[1].pk)
+        Produto.objects.filter(pk=self.produtos[1].pk).update(ativo=False)
+        with self.assertRaises(CheckoutError):
+            checkout(self.cliente.pk, self.endereco)
+        with self.assertRaises(CheckoutError):
+            checkout(self.cliente.pk, self.endereco, cupom='INVALIDO', items={self.produtos[0].pk: 1})
+        self.assertFalse(Venda.objects.filter(cliente=self.cliente).exists())
+        self.assertEqual(len(cart.get(self.cliente.pk)), 2)
+
+
+# Garante que a validação de cupons usa o cache e que o limite de usos é respeitado
+class CouponTest(TestCase):
+
+    def setUp(self):
+        coupons.invalidate()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.cupom = Cupom.objects.create(codigo='Verao', desconto=Decimal('5.00'), limite_usos=2)
+
+    def test_validation_is_cached_and_invalidated(self):
+        self.assertEqual(coupons.validate('VERAO')['pk'], self.cupom.pk)
+        with self.assertRaises(coupons.CouponError):
+            coupons.validate('inverno')
+        with self.assertNumQueries(0):
+            self.assertEqual(coupons.validate(' verao ')['desconto'], Decimal('5.00'))
+            with self.assertRaises(coupons.CouponError):
+                coupons.validate('inverno')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.cupom.valido_ate = timezone.now() - timedelta(days=1)
+            self.cupom.save()
+        with self.assertRaisesMessage(coupons.CouponError, 'expirou'):
+            coupons.validate('verao')
+
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Cupom.objects.create(codigo='VERAO', desconto=1)
+
+    def test_usage_limit(self):
+        cupom = coupons.validate('verao')
+        coupons.redeem(cupom)
+        coupons.redeem(cupom)
+        with self.assertRaises(coupons.CouponError):
+            coupons.redeem(cupom)
+
+        # Salvar o cupom com o contador desatualizado em memória não o altera
+        self.cupom.desconto = Decimal('6.00')
+        self.cupom.save()
+        self.cupom.refresh_from_db()
+        self.assertEqual((self.cupom.usos, self.cupom.desconto), (2, Decimal('6.00')))
+
+
+# Garante que o envio de campanhas é feito em lotes, com um único log, e
+# que o contador de não lidas acompanha as notificações
+class NotificationTest(TestCase):
+
+    def setUp(self):
+        self.clientes = Cliente.objects.bulk_create([
+            Cliente(nome=f'Cliente {n}', email=f'cliente{n}@teste.com', senha='x', ativo=n != 4)
+            for n in range(5)
+        ])
+        self.campanha = Campanha.objects.create(nome='Verão', texto='Promoção de verão')
+
+    def test_campaign_fan_out(self):
+        logs = Log.objects.filter(tabela='notificacao').count()
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(notifications.send_campaign(self.campanha, batch_size=2), 4)
+        inserts = [query for query in queries if query['sql'].startswith('INSERT INTO "app_notificacao"')]
+        self.assertEqual(len(inserts), 2)
+        self.assertEqual(Notificacao.objects.filter(campanha=self.campanha).count(), 4)
+        self.assertEqual(Log.objects.filter(tabela='notificacao').count(), logs)
+        self.assertEqual(Log.objects.filter(tabela='campanha', acao='SEND').count(), 1)
+        self.campanha.refresh_from_db()
+        self.assertEqual((self.campanha.destinatarios, self.campanha.ultimo_cliente), (4, self.clientes[3].pk))
+
+        # Um novo envio só alcança clientes novos
+        novo = Cliente.objects.create(nome='Novo', email='novo@teste.com', senha='x')
+        self.assertEqual(notifications.send_campaign(self.campanha), 1)
+        self.assertEqual(notifications.unread_count(novo.pk), 1)
+
+    def test_unread_counter(self):
+        cliente = self.clientes[0].pk
+        notifications.send_campaign(self.campanha)
+        avulsa = Notificacao.objects.create(cliente_id=cliente, texto='Seu pedido foi enviado')
+        with self.assertNumQueries(1):
+            self.assertEqual(notifications.unread_count(cliente), 2)
+
+        avulsa.lida = True
+        avulsa.save()
+        self.assertEqual(notifications.unread_count(cliente), 1)
+        Notificacao.objects.filter(pk=avulsa.pk).update(lida=False)
+        self.assertEqual(notifications.unread_count(cliente), 2)
+
+        self.assertEqual(notifications.mark_read(cliente, [avulsa.pk]), 1)
+        self.assertEqual(list(notifications.unread(cliente).values_list('campanha', flat=True)), [self.campanha.pk])
+        self.assertEqual(notifications.mark_read(cliente), 1)
+        self.assertEqual(notifications.unread_count(cliente), 0)
+
+        Notificacao.objects.filter(cliente_id=self.clientes[1].pk).delete()
+        self.assertEqual(notifications.unread_count(self.clientes[1].pk), 0)
+
+
+# Garante que quedas de preço e produtos de volta avisam quem tem o produto na lista de desejos
+class WishlistWatcherTest(TestCase):
+
+    def setUp(self):
+        categoria = Categoria.objects.create(nome='Cabelo', descricao='Cabelo', slug='cabelo')
+        marca = Marca.objects.create(nome='Natura', descricao='Natura', slug='natura')
+        self.produtos = [
+            Produto.objects.create(
+                nome=f'Produto {n}', descricao='x', preco=Decimal('20.00'), fabricacao=date(2024, 1, 1),
+                validade=date(2025, 1, 1), categoria=categoria, marca=marca, slug=f'produto-{n}', ativo=n != 2
+            )
+            for n in range(3)
+        ]
+        self.clientes = [
+            Cliente.objects.create(nome=f'Cliente {n}', email=f'cliente{n}@teste.com', senha='x')
+            for n in range(2)
+        ]
+        for cliente in self.clientes:
+            desejo = Desejo.objects.create(cliente=cliente)
+            for produto in self.produtos:
+                ItemDesejo.objects.create(desejo=desejo, produto=produto, quantidade=1)
+        ItemDesejo.objects.filter(desejo__cliente=self.clientes[1], produto=self.produtos[1]).update(ativo=False)
+
+    def notifications(self):
+        return sorted(Notificacao.objects.filter(cliente__in=self.clientes).values_list('cliente', 'texto'))
+
+    def test_price_drops_and_restocks(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Produto.objects.filter(pk__in=[p.pk for p in self.produtos]).update(preco=Decimal('15.00'))
+        self.assertEqual(len(self.notifications()), 3)
+        self.assertIn('baixou de R$ 20.00 para R$ 15.00', self.notifications()[0][1])
+
+        Notificacao.objects.all().delete()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.produtos[0].refresh_from_db()
+            self.produtos[0].preco = Decimal('18.00')
+            self.produtos[0].save()
+            self.produtos[2].ativo = True
+            self.produtos[2].save()
+        self.assertEqual(
+            [texto.split(',')[0] for _, texto in self.notifications()],
+            ['Produto 2', 'Produto 2'],
+        )
+        self.assertEqual(notifications.unread_count(self.clientes[0].pk), 1)
+
+    def test_price_assigned_as_text(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.produtos[0].preco = '5.00'
+            self.produtos[0].save()
+        self.assertEqual(len(self.notifications()), 2)
+
+
+# Garante que os dados sintéticos são consistentes e gerados sem auditoria
+class SeedFakeTest(TestCase):
+
+    @patch.dict('app.management.commands.seed_fake.VOLUMES', {
+        'clientes': 20, 'produtos': 10, 'vendas': 30, 'avaliacoes': 40, 'logs': 50,
+    })
+    def test_seed_is_consistent(self):
+        logs, vendas = Log.objects.count(), Venda.objects.count()
+        call_command('seed_fake', '--lote', '7', '--dias', '5', stdout=StringIO())
+
+        # Apenas os logs sintéticos: nenhum log de auditoria por registro
+        self.assertEqual(Log.objects.count() - logs, 50)
+        self.assertEqual(Venda.objects.count() - vendas, 30)
+        self.assertEqual(
+            AvaliacaoResumo.objects.aggregate(total=Sum('total'))['total'],
+            Avaliacao.objects.filter(ativo=True).count(),
+        )
+        vendas = dict(Venda.objects.values_list('pk', 'subtotal'))
+        self.assertEqual({pk: values['subtotal'] for pk, values in totals.compute(list(vendas)).items()}, vendas)
+        for cliente in Cliente.objects.all():
+            self.assertEqual(notifications.unread_count(cliente.pk), notifications.unread(cliente.pk).count())
+        self.assertEqual(
+            sum(VendaDiariaProduto.objects.values_list('quantidade', flat=True)),
+            sum(ItemVenda.objects.values_list('quantidade', flat=True)),
+        )
+
+        with self.assertRaises(CommandError):
+            call_command('seed_fake', stdout=StringIO())
+
+
+# Garante que os benchmarks gravam a baseline e que uma query a mais em
+# relação a ela é tratada como regressão
+class BenchmarkSuiteTest(TestCase):
+
+    def test_baseline_comparison(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / 'baseline.json'
+            call_command(
+                'benchmark', 'orm: produto', 'carrinho', 'catálogo', 'admin: listagem de produto',
+                '--baseline', str(path), '--gravar', '--repeticoes', '1', stdout=StringIO(),
+            )
+            baseline = json.loads(path.read_text())
+            self.assertIn('admin: listagem de produto', baseline['benchmarks'])
+            self.assertEqual(baseline['benchmarks']['carrinho: produto adicionado']['queries'], 0)
+
+            call_command('benchmark', 'orm: produto', '--baseline', str(path), '--tolerancia', '100', stdout=StringIO())
+
+            baseline['benchmarks']['orm: produto alterado']['queries'] -= 1
+            path.write_text(json.dumps(baseline))
+            with self.assertRaisesMessage(CommandError, '1 benchmark(s) com regressão'):
+                call_command('benchmark', 'orm: produto', '--baseline', str(path), '--tolerancia', '100', stdout=StringIO())
+
+
+# Garante que o middleware mede as requisições da amostra, detecta queries
+# repetidas e expõe as métricas no formato do Prometheus
+@override_settings(METRICS_SAMPLE_RATE=1, METRICS_DUPLICATE_THRESHOLD=3, METRICS_SERVER_TIMING=True)
+class RequestMetricsTest(TestCase):
+
+    def setUp(self):
+        metrics.reset()
+        categoria = Categoria.objects.create(nome='Cabelo', descricao='Cabelo', slug='cabelo')
+        marca = Marca.objects.create(nome='Natura', descricao='Natura', slug='natura')
+        self.produtos = Produto.objects.bulk_create([
+            Produto(
+                nome=f'Produto {n}', descricao='x', preco=Decimal('20.00'), fabricacao=date(2024, 1, 1),
+                validade=date(2025, 1, 1), categoria=categoria, marca=marca, slug=f'produto-{n}'
+            )
+            for n in range(4)
+        ])
+
+    def test_duplicate_queries(self):
+        recorder = metrics.QueryRecorder()
+        with connection.execute_wrapper(recorder):
+            for produto in self.produtos:
+                Produto.objects.get(pk=produto.pk)
+            list(Produto.objects.filter(pk__in=[p.pk for p in self.produtos[:2]]))
+            list(Produto.objects.filter(pk__in=[p.pk for p in self.produtos]))
+        self.assertEqual(recorder.count, 6)
+        self.assertEqual(sorted(recorder.duplicates().values()), [3])
+
+    def test_request_metrics(self):
+        response = self.client.get(reverse('catalogo_produto', args=['produto-0']))
+        self.assertEqual(response.status_code, 200)
+        self.assertRegex(response['Server-Timing'], r'^app;dur=[\d.]+, db;dur=[\d.]+;desc="\d+ queries"$')
+
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response['Content-Type'], metrics.CONTENT_TYPE)
+        content = response.content.decode()
+        self.assertIn('app_http_requests_total{view="catalogo_produto",method="GET",status="200"} 1', content)
+        self.assertIn('app_db_queries_per_request_count{view="catalogo_produto"} 1', content)
+
+        self.assertEqual(self.client.get(reverse('metrics'), REMOTE_ADDR='10.0.0.1').status_code, 403)
+
+    # O Server-Timing segue a mesma regra de /metrics
+    def test_server_timing_is_restricted(self):
+        url = reverse('catalogo_produto', args=['produto-0'])
+        self.assertNotIn('Server-Timing', self.client.get(url, REMOTE_ADDR='10.0.0.1'))
+
+        self.client.force_login(User.objects.create_user('equipe', is_staff=True))
+        self.assertIn('Server-Timing', self.client.get(url, REMOTE_ADDR='10.0.0.1'))
+
+        with override_settings(METRICS_SERVER_TIMING=False):
+            self.assertNotIn('Server-Timing', self.client.get(url))
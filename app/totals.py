@@ -0,0 +1,138 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db.models import DecimalField, F, Q, Sum, Value
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .models import Venda, ItemVenda, Pagamento
+
+
+###########################################################################
+# TOTAIS DAS VENDAS (ATUALIZAÇÃO INCREMENTAL)                             #
+# Venda.subtotal é a soma de quantidade * preco dos itens ativos e        #
+# Venda.valor_pago a soma dos pagamentos ativos. Ao criar, alterar ou     #
+# excluir itens e pagamentos, o valor antigo é retirado e o novo é somado #
+# com um único UPDATE usando F(), sem ler a venda (sem corrida entre      #
+# leituras e gravações concorrentes). total = subtotal - desconto.        #
+###########################################################################
+
+
+# Vendas ativas ainda não pagas integralmente (condição do índice venda_em_aberto_idx)
+UNPAID = Q(ativo=True, valor_pago__lt=F('total'))
+
+ZERO = Value(Decimal('0.00'), output_field=DecimalField(max_digits=12, decimal_places=2))
+
+# Campo da venda mantido por cada modelo e campos usados no cálculo
+TRACKED = {
+    ItemVenda: ('subtotal', ['venda', 'quantidade', 'preco', 'ativo']),
+    Pagamento: ('valor_pago', ['venda', 'valor', 'ativo']),
+}
+
+# Vendas recalculadas por vez no comando reconcile_order_totals
+CHUNK_SIZE = 1000
+
+
+def decimal(value):
+    return value if isinstance(value, Decimal) else Decimal(str(value))
+
+
+# Venda e valor com que o item/pagamento conta nos totais (None se não conta)
+def contribution(model, values):
+    if not values['ativo']:
+        return None
+    if model is ItemVenda:
+        return values['venda'], values['quantidade'] * decimal(values['preco'])
+    return values['venda'], decimal(values['valor'])
+
+
+# Valores atuais dos campos usados no cálculo ({'venda': venda_id, ...})
+def current_values(model, instance):
+    _, fields = TRACKED[model]
+    return {name: getattr(instance, model._meta.get_field(name).attname) for name in fields}
+
+
+# Valores antes da alteração: os atuais, exceto os campos alterados, que
+# voltam ao valor antigo ({campo: [antigo, novo]})
+def old_values(values, fields):
+    values = dict(values)
+    for name, (old_value, _) in fields.items():
+        if name in values:
+            values[name] = old_value
+    return values
+
+
+# Soma as variações (a contribuição antiga é subtraída e a nova somada) e
+# aplica uma atualização por venda. changes: [(antiga, nova)]
+def apply_changes(model, changes):
+    deltas = defaultdict(Decimal)
+    for old, new in changes:
+        if old == new:
+            continue
+        for value, sign in ((old, -1), (new, 1)):
+            if value is not None:
+                venda_id, amount = value
+                deltas[venda_id] += sign * amount
+
+    field, _ = TRACKED[model]
+    for venda_id, delta in deltas.items():
+        if delta:
+            apply_delta(field, venda_id, delta)
+
+
+# Atualiza o campo da venda com a variação. O _base_manager não gera logs
+# (os totais são derivados dos itens e pagamentos, que já são auditados).
+def apply_delta(field, venda_id, delta):
+    values = {field: F(field) + delta, 'modificado_em': timezone.now()}
+    if field == 'subtotal':
+        values['total'] = Greatest(F('subtotal') + delta - F('desconto'), ZERO)
+    Venda._base_manager.filter(pk=venda_id).update(**values)
+
+
+# Recalcula o total das vendas após alterações no desconto
+def apply_discount(venda_ids):
+    Venda._base_manager.filter(pk__in=venda_ids).update(total=Greatest(F('subtotal') - F('desconto'), ZERO))
+
+
+# Após alterações em lote (update/bulk_update): os valores atuais são lidos
+# em uma consulta e os antigos vêm das alterações auditadas
+def apply_bulk_update(model, changes):
+    _, fields = TRACKED[model]
+    attnames = [model._meta.get_field(name).attname for name in fields]
+    rows = model._base_manager.filter(pk__in=list(changes)).values_list('pk', *attnames)
+    pairs = []
+    for pk, *row in rows:
+        values = dict(zip(fields, row))
+        pairs.append((contribution(model, old_values(values, changes[pk])), contribution(model, values)))
+    apply_changes(model, pairs)
+
+
+def apply_bulk_create(model, objs):
+    apply_changes(model, [(None, contribution(model, current_values(model, obj))) for obj in objs])
+
+
+###########################################################################
+# RECÁLCULO COMPLETO                                                      #
+###########################################################################
+
+
+# Subtotal e valor pago calculados a partir dos itens e pagamentos, para
+# as vendas informadas ({venda_id: {'subtotal': ..., 'valor_pago': ...}})
+def compute(venda_ids):
+    totals = {venda_id: {'subtotal': Decimal('0.00'), 'valor_pago': Decimal('0.00')} for venda_id in venda_ids}
+    items = (
+        ItemVenda._base_manager.filter(venda_id__in=venda_ids, ativo=True)
+        .values('venda_id').annotate(soma=Sum(F('quantidade') * F('preco'), output_field=DecimalField(max_digits=12, decimal_places=2)))
+    )
+    payments = (
+        Pagamento._base_manager.filter(venda_id__in=venda_ids, ativo=True)
+        .values('venda_id').annotate(soma=Sum('valor'))
+    )
+    for field, rows in (('subtotal', items), ('valor_pago', payments)):
+        for row in rows:
+            totals[row['venda_id']][field] = row['soma']
+    return totals
+
+
+def unpaid():
+    return Venda.objects.filter(UNPAID).order_by('-data')
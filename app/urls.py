@@ -1,8 +1,13 @@
 from django.urls import path
 from .views import (
-    IndexView,
+    IndexView, CatalogoListaView, MaisAvaliadosView, ProdutoDetalheView, MetricsView,
 )
 
 urlpatterns = [
     path('', IndexView.as_view(), name='index'),
+    path('catalogo/categoria/<slug:slug>/', CatalogoListaView.as_view(kind='categoria'), name='catalogo_categoria'),
+    path('catalogo/marca/<slug:slug>/', CatalogoListaView.as_view(kind='marca'), name='catalogo_marca'),
+    path('catalogo/mais-avaliados/', MaisAvaliadosView.as_view(), name='catalogo_mais_avaliados'),
+    path('catalogo/produto/<slug:slug>/', ProdutoDetalheView.as_view(), name='catalogo_produto'),
+    path('metrics', MetricsView.as_view(), name='metrics'),
 ]
@@ -1,5 +1,7 @@
+from django.http import Http404, HttpResponse, HttpResponseForbidden
 from django.shortcuts import render
 from django.views import View
+from . import catalog, metrics
 from .models import (
     Categoria, Marca, Produto, Cliente, Venda, ItemVenda, Pagamento,
     EnderecoEntrega, Avaliacao, Comentario, Cupom, Carrinho, 
@@ -18,4 +20,43 @@ class IndexView(View):
     
     def post(self, request):
         pass
-    
\ No newline at end of file
+
+
+# Resposta JSON com o conteúdo já serializado pelo catálogo (ver catalog.py)
+def json_response(content):
+    if content is None:
+        raise Http404
+    return HttpResponse(content, content_type='application/json')
+
+
+# Listagem dos produtos ativos de uma categoria ou marca, paginada (?pagina=N)
+class CatalogoListaView(View):
+    kind = None
+
+    def get(self, request, slug):
+        try:
+            page = max(int(request.GET.get('pagina', 1)), 1)
+        except ValueError:
+            page = 1
+        return json_response(catalog.listing_json(self.kind, slug, page))
+
+
+# Produtos mais bem avaliados
+class MaisAvaliadosView(View):
+    def get(self, request):
+        return json_response(catalog.top_rated_json())
+
+
+# Detalhe de um produto ativo
+class ProdutoDetalheView(View):
+    def get(self, request, slug):
+        return json_response(catalog.product_json(slug))
+
+
+# Métricas das requisições no formato do Prometheus (ver metrics.py), para
+# os IPs de METRICS_ALLOWED_IPS ou usuários da equipe
+class MetricsView(View):
+    def get(self, request):
+        if not metrics.can_view(request):
+            return HttpResponseForbidden()
+        return HttpResponse(metrics.render(), content_type=metrics.CONTENT_TYPE)
@@ -0,0 +1,95 @@
+from django.db import transaction
+
+from . import audit
+from .models import ItemDesejo, Notificacao, Produto
+
+
+###########################################################################
+# AVISOS DA LISTA DE DESEJOS (PREÇO MENOR E PRODUTO DE VOLTA)             #
+# Quando o preço de produtos cai ou um produto volta a ficar ativo (em um #
+# save ou em uma alteração em lote), os clientes que têm o produto em um  #
+# desejo ativo são encontrados com uma única consulta por lote de         #
+# produtos (junção ItemDesejo -> Desejo -> Produto, pelo índice           #
+# item_desejo_produto_idx) e as notificações são criadas com bulk_create, #
+# depois do commit da alteração dos produtos.                             #
+###########################################################################
+
+
+# Produtos consultados por vez e notificações criadas por INSERT
+CHUNK_SIZE = 500
+BATCH_SIZE = 1000
+
+
+# Eventos a partir das alterações auditadas dos produtos ({pk: {campo:
+# [antigo, novo]}}): {produto_id: preço antigo} para quedas de preço e
+# {produto_id: None} para produtos que voltaram a ficar ativos. Os valores
+# são convertidos pelo campo do modelo: o valor novo é o atribuído ao
+# objeto antes do save (ex: o preço '5.00', em texto).
+def events(changes):
+    ativo, preco = Produto._meta.get_field('ativo'), Produto._meta.get_field('preco')
+    found = {}
+    for pk, fields in changes.items():
+        if not fields:
+            continue
+        if 'ativo' in fields:
+            old, new = (ativo.to_python(value) for value in fields['ativo'])
+            if not old and new:
+                found[pk] = None
+                continue
+        if 'preco' in fields:
+            old, new = (preco.to_python(value) for value in fields['preco'])
+            if new < old:
+                found[pk] = old
+    return found
+
+
+# Agenda os avisos para depois do commit (a alteração dos produtos não
+# espera pela criação das notificações)
+def watch(changes):
+    found = events(changes)
+    if found:
+        transaction.on_commit(lambda: notify(found))
+
+
+# Texto do aviso para o produto (preço antigo None: produto de volta)
+def message(nome, old_price, price):
+    if old_price is None:
+        return f'{nome}, da sua lista de desejos, está disponível novamente por R$ {price}.'
+    return f'{nome}, da sua lista de desejos, baixou de R$ {old_price} para R$ {price}.'
+
+
+# Cria os avisos para os clientes com os produtos em desejos ativos e
+# retorna a quantidade de notificações criadas
+def notify(found):
+    produto_ids = sorted(found)
+    notificacoes = []
+    for start in range(0, len(produto_ids), CHUNK_SIZE):
+        rows = (
+            ItemDesejo._base_manager
+            .filter(
+                produto_id__in=produto_ids[start:start + CHUNK_SIZE], ativo=True,
+                desejo__ativo=True, produto__ativo=True,
+            )
+            .values_list('desejo__cliente_id', 'produto_id', 'produto__nome', 'produto__preco')
+            .distinct()
+        )
+        notificacoes += [
+            Notificacao(cliente_id=cliente_id, texto=message(nome, found[produto_id], preco))
+            for cliente_id, produto_id, nome, preco in rows
+            # O preço pode ter subido de novo antes do commit
+            if found[produto_id] is None or preco < found[produto_id]
+        ]
+    if not notificacoes:
+        return 0
+
+    # O _base_manager não gera um log por notificação: os avisos são
+    # registrados em um único log e o sinal de criação em lote mantém os
+    # contadores de não lidas e a busca atualizados
+    with transaction.atomic():
+        objs = Notificacao._base_manager.bulk_create(notificacoes, batch_size=BATCH_SIZE)
+        audit.post_bulk_create.send(sender=Notificacao, objs=objs, using=Notificacao.objects.db)
+        audit.write_log(audit.make_batch_log(Notificacao, 'WISHLIST', {
+            'produtos': len(produto_ids),
+            'notificacoes': len(objs),
+        }, audit.get_audit_user_id()))
+    return len(objs)
@@ -23,12 +23,14 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'app.middleware.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'app.middleware.AuditUserMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -66,6 +68,54 @@ DATABASES = {
     }
 }
 
+# No SQLite, as transações travam o banco para escrita já no início
+# (BEGIN IMMEDIATE) e esperam até 20 s pela trava: uma transação que lê e
+# depois escreve não falha na hora com "database is locked" quando outra
+# está escrevendo (ex: checkouts concorrentes, ver checkout.py)
+if DATABASES['default']['ENGINE'] == 'django.db.backends.sqlite3':
+    DATABASES['default']['OPTIONS'] = {'transaction_mode': 'IMMEDIATE', 'timeout': 20}
+
+# Cache compartilhado entre os processos (workers do gunicorn e comandos
+# como flush_carts): o usuário padrão dos logs (audit.py) depende dele, e
+# os carrinhos (cart.py) do cache 'carrinhos', configurado da mesma forma
+# (CART_CACHE_*). O catálogo usa o cache 'catalogo' (abaixo). O padrão é a tabela
+# app_cache do próprio banco (criada pela migração 0016_tabela_cache);
+# em produção, prefira o Redis (CACHE_BACKEND=django.core.cache.backends.redis.RedisCache
+# e CACHE_LOCATION=redis://host:6379, com o pacote redis instalado). O
+# LocMemCache pertence a um único processo e não deve ser usado com mais de
+# um processo (ver app/caching.py).
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.db.DatabaseCache'),
+        'LOCATION': config('CACHE_LOCATION', default='app_cache'),
+    },
+    # Carrinhos e fila de gravação do flush_carts (ver cart.py), em um cache
+    # próprio que não descarta entradas: ao passar de MAX_ENTRIES, o
+    # DatabaseCache apaga chaves pela ordem alfabética, e as chaves
+    # carrinho:* seriam apagadas antes de serem gravadas no banco. A tabela
+    # app_cache_carrinhos é criada pela migração 0017_tabela_cache_carrinhos
+    # e as entradas expiradas saem dela quando são lidas. No Redis, use uma
+    # instância (ou banco) com maxmemory-policy noeviction.
+    'carrinhos': {
+        'BACKEND': config('CART_CACHE_BACKEND', default='django.core.cache.backends.db.DatabaseCache'),
+        'LOCATION': config('CART_CACHE_LOCATION', default='app_cache_carrinhos'),
+    },
+    # Catálogo (catalog.py), lido a cada requisição da API: fica fora do
+    # banco, para que as leituras em cache não façam nenhuma consulta (no
+    # DatabaseCache, cada leitura do cache é uma consulta ao banco). O padrão
+    # é o LocMemCache de cada processo, com o tempo curto
+    # CATALOG_LOCAL_CACHE_TIMEOUT, já que as invalidações não chegam aos
+    # outros processos; em produção, use o Redis (CATALOG_CACHE_BACKEND e
+    # CATALOG_CACHE_LOCATION), compartilhado por todos os processos.
+    'catalogo': {
+        'BACKEND': config('CATALOG_CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CATALOG_CACHE_LOCATION', default='catalogo'),
+    },
+}
+
+if CACHES['carrinhos']['BACKEND'] == 'django.core.cache.backends.db.DatabaseCache':
+    CACHES['carrinhos']['OPTIONS'] = {'MAX_ENTRIES': 10 ** 12}
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -96,3 +146,63 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'app/static')
 STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Auditoria: com AUDIT_LOG_ASYNC, os logs são gravados em lotes por uma
+# thread de fundo após o commit da transação (ver app/audit.py)
+AUDIT_LOG_ASYNC = config('AUDIT_LOG_ASYNC', default=False, cast=bool)
+
+AUDIT_LOG_BATCH_SIZE = config('AUDIT_LOG_BATCH_SIZE', default=500, cast=int)
+
+AUDIT_LOG_FLUSH_INTERVAL = config('AUDIT_LOG_FLUSH_INTERVAL', default=1.0, cast=float)
+
+AUDIT_LOG_QUEUE_SIZE = config('AUDIT_LOG_QUEUE_SIZE', default=10000, cast=int)
+
+# Tempo (em segundos) do usuário padrão dos logs no cache (ver app/audit.py)
+AUDIT_DEFAULT_USER_CACHE_TIMEOUT = config('AUDIT_DEFAULT_USER_CACHE_TIMEOUT', default=300, cast=int)
+
+# Meses de logs mantidos na tabela e diretório dos arquivos gerados pelo
+# comando archive_logs
+AUDIT_LOG_RETENTION_MONTHS = config('AUDIT_LOG_RETENTION_MONTHS', default=12, cast=int)
+
+AUDIT_LOG_ARCHIVE_DIR = config('AUDIT_LOG_ARCHIVE_DIR', default=os.path.join(BASE_DIR, 'logs_arquivados'))
+
+# Tempo (em segundos) dos cartões e listagens do catálogo no cache. As
+# entradas também são invalidadas pelos sinais quando os dados mudam, mas
+# só no cache compartilhado as invalidações chegam a todos os processos:
+# com o LocMemCache (o padrão de CACHES['catalogo']) vale o tempo curto
+# CATALOG_LOCAL_CACHE_TIMEOUT.
+CATALOG_CACHE_TIMEOUT = config('CATALOG_CACHE_TIMEOUT', default=60 * 60 * 24, cast=int)
+
+CATALOG_LOCAL_CACHE_TIMEOUT = config('CATALOG_LOCAL_CACHE_TIMEOUT', default=30, cast=int)
+
+# Tempo (em segundos) dos carrinhos no cache e carrinhos gravados por lote
+# pelo comando flush_carts (ver cart.py). O tempo deve ser bem maior que o
+# intervalo entre as execuções do flush_carts.
+CART_CACHE_TIMEOUT = config('CART_CACHE_TIMEOUT', default=60 * 60 * 24 * 7, cast=int)
+
+CART_FLUSH_BATCH_SIZE = config('CART_FLUSH_BATCH_SIZE', default=500, cast=int)
+
+# Cupons mantidos no cache em memória de cada processo e tempo (em
+# segundos) de cada entrada (ver coupons.py)
+COUPON_CACHE_SIZE = config('COUPON_CACHE_SIZE', default=1024, cast=int)
+
+COUPON_CACHE_TTL = config('COUPON_CACHE_TTL', default=60, cast=int)
+
+# Notificações criadas por lote no envio de campanhas (ver notifications.py)
+NOTIFICATION_BATCH_SIZE = config('NOTIFICATION_BATCH_SIZE', default=1000, cast=int)
+
+# Arquivo com a baseline dos benchmarks (comando benchmark). Os tempos
+# dependem da máquina: grave a baseline na mesma máquina que vai comparar.
+BENCHMARK_BASELINE = config('BENCHMARK_BASELINE', default=os.path.join(BASE_DIR, 'benchmarks.json'))
+
+# Métricas das requisições (ver app/metrics.py): fração das requisições
+# com as queries medidas, execuções da mesma query em uma requisição para
+# contar como repetida (N+1), cabeçalho Server-Timing nas respostas e IPs
+# que podem ler /metrics sem login de staff
+METRICS_SAMPLE_RATE = config('METRICS_SAMPLE_RATE', default=0.01, cast=float)
+
+METRICS_DUPLICATE_THRESHOLD = config('METRICS_DUPLICATE_THRESHOLD', default=3, cast=int)
+
+METRICS_SERVER_TIMING = config('METRICS_SERVER_TIMING', default=False, cast=bool)
+
+METRICS_ALLOWED_IPS = config('METRICS_ALLOWED_IPS', default='127.0.0.1').split(',')